@@ -2,9 +2,9 @@ import setuptools
 
 setuptools.setup(
     name = 'yagv',
-    version = '0.7.0',        # -- check ./yagv & Makefile too
+    version = '0.7.0',        # -- check src/__init__.py & Makefile too
     description = 'Yet Another Gcode Viewer (3D Printing Format)',
-    packages = setuptools.find_packages(),
+    packages = setuptools.find_packages(exclude=['tests']),
     package_dir = {'':'.'},
     # package_data = {'': [ "icon.png", "data/hana_swimsuit_fv_solid_v1.gcode" ] },
     # include_package_data = True,
@@ -15,11 +15,16 @@ setuptools.setup(
       "Topic :: Multimedia :: Graphics :: Viewers"
     ],
     data_files = [ ( 'data', ['data/hana_swimsuit_fv_solid_v1.gcode'] ), ('icons', ['icon.png']) ],
-    py_modules = ['gcodeParser'],
-    scripts = ['yagv'],
+    py_modules = ['yagv'],
+    entry_points = { 'console_scripts': [ 'yagv = yagv:main' ] },
     python_requires='>3.6',
     install_requires=[
         'setuptools',
+        'numpy',
         'pyglet>=1.4.10, <2'
-    ]
+    ],
+    # zstd compressed programs, gzip & xz need nothing beyond Python
+    extras_require={
+        'zstd': ['zstandard']
+    }
 )
@@ -0,0 +1,29 @@
+# yagv core: G-code parsing, the segment model and its analysis.
+#
+# Nothing here needs a display; the OpenGL viewer lives in src.viewer and is
+# only imported when a window is created. Submodules are loaded on first use
+# so `import src` stays cheap.
+
+import importlib
+
+YAGV_VERSION = "0.7.0"        # -- check Makefile and setup.py too
+
+_exports = {
+	"GcodeParser": "src.gcodeParser",
+	"GcodeModel": "src.gcodeParser",
+	"ChannelProgram": "src.channels",
+	"ProgramDiff": "src.programDiff",
+	"BlockCache": "src.programDiff",
+	"export_model": "src.export",
+	"CycleTime": "src.cycletime",
+	"MachineProfile": "src.cycletime",
+	"ToolFilter": "src.toolfilter",
+	"Workspace": "src.workspace",
+}
+
+__all__ = ["YAGV_VERSION"] + list(_exports)
+
+def __getattr__(name):
+	if name in _exports:
+		return getattr(importlib.import_module(_exports[name]), name)
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
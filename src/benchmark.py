@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+# Render benchmark: the viewer replays the same scripted orbit, zoom and layer
+# sweep over a loaded program and records what every frame cost, so that
+# rendering changes can be compared on the same machine. Nothing here touches
+# OpenGL; the viewer measures and this module scripts and summarizes.
+
+import json
+import math
+from collections import deque
+
+import numpy as np
+
+DEFAULT_FRAMES = 300
+PERCENTILES = (50, 95, 99)
+
+def camera_script(frames, layers):
+	"""(RX, RZ, zoom, layerIdx) of every frame.
+
+	Two turns around the part, tilting up and down, while zooming in and back
+	out once and sweeping the active layer from the first to the last.
+	"""
+	t = np.arange(frames) / max(frames - 1, 1)
+	RX = 30 * np.sin(2 * math.pi * t)
+	RZ = 720 * t
+	zoom = 1 + 3 * (.5 - .5 * np.cos(2 * math.pi * t))
+	layerIdx = np.rint(t * max(layers - 1, 0)).astype(int)
+	return [(float(rx), float(rz), float(z), int(l)) for rx, rz, z, l in zip(RX, RZ, zoom, layerIdx)]
+
+def distribution(values):
+	"""Percentiles, mean and max of a list of numbers, None when empty."""
+	if not len(values):
+		return None
+	values = np.asarray(values, dtype=float)
+	result = {"p%d" % p: float(np.percentile(values, p)) for p in PERCENTILES}
+	result.update(mean=float(values.mean()), max=float(values.max()))
+	return result
+
+class FrameStats:
+	"""CPU & GPU milliseconds, draw calls and vertices of every frame.
+
+	With `window`, only the last `window` frames are kept (the HUD overlay).
+	GPU times arrive a few frames late and may be missing altogether when
+	the driver has no timer queries.
+	"""
+
+	def __init__(self, window=None):
+		self.cpu = deque(maxlen=window)
+		self.gpu = deque(maxlen=window)
+		self.draws = deque(maxlen=window)
+		self.vertices = deque(maxlen=window)
+
+	def add(self, cpu, draws=0, vertices=0):
+		self.cpu.append(cpu)
+		self.draws.append(draws)
+		self.vertices.append(vertices)
+
+	def add_gpu(self, gpu):
+		self.gpu.append(gpu)
+
+	def __len__(self):
+		return len(self.cpu)
+
+	def summary(self):
+		return {
+			"frames": len(self),
+			"cpu_ms": distribution(self.cpu),
+			"gpu_ms": distribution(self.gpu),
+			"draw_calls": distribution(self.draws),
+			"vertices": distribution(self.vertices),
+		}
+
+	def report(self):
+		"""Lines of text, one per measure."""
+		summary = self.summary()
+		result = ["%-10s %s" % ("%d frames" % summary["frames"], " ".join("%8s" % name for name in
+			["p%d" % p for p in PERCENTILES] + ["mean", "max"]))]
+		for name in ("cpu_ms", "gpu_ms", "draw_calls", "vertices"):
+			values = summary[name]
+			if values is None:
+				result.append("%-10s %s" % (name, "n/a"))
+			else:
+				result.append("%-10s %s" % (name, " ".join("%8.2f" % values[key] for key in
+					["p%d" % p for p in PERCENTILES] + ["mean", "max"])))
+		return result
+
+	def write(self, path, **info):
+		"""The summary as JSON, with `info` (program, frame count, ...) added."""
+		with open(path, "w") as f:
+			json.dump(dict(self.summary(), **info), f, indent=2)
+
+	def overlay(self):
+		# one line for the HUD
+		cpu, gpu = distribution(self.cpu), distribution(self.gpu)
+		if cpu is None:
+			return ""
+		text = "frame cpu %.1f ms (p95 %.1f)" % (cpu["p50"], cpu["p95"])
+		if gpu is not None:
+			text += ", gpu %.1f ms (p95 %.1f)" % (gpu["p50"], gpu["p95"])
+		return text + ", %d draws, %d vertices" % (self.draws[-1], self.vertices[-1])
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+# Multi-channel programs: Citizen machines run the main ($1) and back-spindle
+# ($2) channels at the same time. Every channel is parsed on its own, in
+# parallel, and the '!nLm' waits are used to put them on a shared timeline.
+
+import re
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+from src.gcodeParser import GcodeParser
+from src.cycletime import CycleTime, MachineProfile, segment_times
+
+# below this many lines, starting worker processes costs more than it saves
+PARALLEL_MIN_LINES = 20000
+
+def split_channels(code):
+	"""Splits a program into its $n sections.
+
+	Returns a dict channel -> (lines, lineNbs). Lines before any header belong
+	to channel 1; the $0 section holds common variables and is prepended to
+	every channel.
+	"""
+	sections = {}
+	channel = 1
+	for lineNb, line in enumerate(code, 1):
+		m = re.match(r"\$(\d+)\s*$", line.strip())
+		if m:
+			channel = int(m.group(1))
+		lines, lineNbs = sections.setdefault(channel, ([], []))
+		lines.append(line)
+		lineNbs.append(lineNb)
+	common = sections.pop(0, ([], []))
+	if not sections:
+		sections[1] = ([], [])
+	return {channel: (common[0] + lines, common[1] + lineNbs) for channel, (lines, lineNbs) in sections.items()}
+
+def parse_channel(lines, lineNbs, options={}):
+	parser = GcodeParser(**options)
+	model = parser.parseCode(lines, lineNbs)
+	model.postProcess()
+	return model
+
+def chain(source, target):
+	# passes the outcome of a worker's future on to another future
+	def done(future):
+		if future.exception() is not None:
+			target.set_exception(future.exception())
+		else:
+			target.set_result(future.result())
+	source.add_done_callback(done)
+
+class Timeline:
+	"""Start and end time of every segment of every channel on a shared clock.
+
+	`durations` maps channel -> time of each segment. Channels run freely
+	between waits; a wait '!2L10' in $1 and '!1L10' in $2 releases both
+	channels once the later of the two has arrived.
+	"""
+
+	def __init__(self, models, durations):
+		self.channels = sorted(models)
+		self.starts = {}
+		self.ends = {}
+		self.unmatched = []
+
+		# time since channel start at which every segment ends, without waits
+		elapsed = {ch: np.concatenate(([0.], np.cumsum(durations[ch]))) for ch in self.channels}
+		syncs = {ch: models[ch].syncs for ch in self.channels}
+		# idle time added at every wait of a channel
+		delays = {ch: np.zeros(len(syncs[ch])) for ch in self.channels}
+		cursor = {ch: 0 for ch in self.channels}
+		delay = {ch: 0. for ch in self.channels}
+
+		def arrival(ch):
+			_, _, at = syncs[ch][cursor[ch]]
+			return elapsed[ch][at] + delay[ch]
+
+		def release(ch, time):
+			idle = time - arrival(ch)
+			delays[ch][cursor[ch]] = idle
+			delay[ch] += idle
+			cursor[ch] += 1
+
+		waiting = [ch for ch in self.channels if cursor[ch] < len(syncs[ch])]
+		while waiting:
+			progressed = False
+			for ch in waiting:
+				if cursor[ch] >= len(syncs[ch]):
+					continue
+				partner, wait, _ = syncs[ch][cursor[ch]]
+				if partner in cursor and cursor[partner] < len(syncs[partner]) and syncs[partner][cursor[partner]][:2] == (ch, wait):
+					time = max(arrival(ch), arrival(partner))
+					release(ch, time)
+					release(partner, time)
+					progressed = True
+			waiting = [ch for ch in self.channels if cursor[ch] < len(syncs[ch])]
+			if waiting and not progressed:
+				# no pair can meet: let the earliest waiting channel pass alone
+				ch = min(waiting, key=arrival)
+				self.unmatched.append((ch,) + syncs[ch][cursor[ch]][:2])
+				release(ch, arrival(ch))
+				waiting = [ch for ch in self.channels if cursor[ch] < len(syncs[ch])]
+
+		for ch in self.channels:
+			n = len(durations[ch])
+			at = np.array([sync[2] for sync in syncs[ch]], dtype=np.int64)
+			# total delay before every segment
+			accumulated = np.concatenate(([0.], np.cumsum(delays[ch])))
+			before = accumulated[np.searchsorted(at, np.arange(n), side='right')]
+			self.starts[ch] = elapsed[ch][:-1] + before
+			self.ends[ch] = elapsed[ch][1:] + before
+
+		self.duration = max([ends[-1] for ends in self.ends.values() if len(ends)] or [0.])
+
+	def segmentsAt(self, time):
+		"""Index of the segment each channel is executing at `time` (-1 before its first)."""
+		active = {}
+		for ch in self.channels:
+			idx = int(np.searchsorted(self.ends[ch], time, side='left'))
+			active[ch] = min(idx, len(self.ends[ch]) - 1) if time >= 0 else -1
+		return active
+
+class ChannelProgram:
+	"""The channels of a program, each parsed into its own model, plus their timeline.
+
+	`options` are passed on to every GcodeParser, e.g. coords_dtype=np.float32
+	or mapped_dir='/scratch' for memory-mapped columns. `profile` is the
+	MachineProfile the segment times are estimated with. A `pool` and a
+	`cache` (src/workspace.py) are shared with other programs: the channels
+	are parsed by the pool's workers, and channels parsed before, or being
+	parsed for another program, are not parsed again.
+	"""
+
+	def __init__(self, code, parallel=None, profile=None, pool=None, cache=None, **options):
+		self.options = options
+		self.profile = profile or MachineProfile()
+		sections = split_channels(code)
+		if parallel is None:
+			# mapped columns would come back from the workers as copies in memory
+			parallel = (len(sections) > 1 or pool is not None) and len(code) >= PARALLEL_MIN_LINES and options.get("mapped_dir") is None
+		# the channels this program parses itself, the others come from the cache
+		futures = {}
+		parsing = {}
+		keys = {}
+		for ch, section in sections.items():
+			if cache is None:
+				futures[ch] = parsing[ch] = Future()
+			else:
+				keys[ch] = cache.key(*section, options)
+				futures[ch], owner = cache.claim(keys[ch])
+				if owner:
+					parsing[ch] = futures[ch]
+		if parallel and parsing:
+			if pool is not None:
+				for ch in parsing:
+					chain(pool.submit(parse_channel, *sections[ch], options), parsing[ch])
+			else:
+				with ProcessPoolExecutor(max_workers=len(parsing)) as own:
+					for ch in parsing:
+						chain(own.submit(parse_channel, *sections[ch], options), parsing[ch])
+		else:
+			for ch in parsing:
+				try:
+					parsing[ch].set_result(parse_channel(*sections[ch], options))
+				except Exception as e:
+					parsing[ch].set_exception(e)
+		try:
+			self.models = {ch: future.result() for ch, future in futures.items()}
+		except Exception:
+			if cache is not None:
+				# a program that fails to parse is not cached
+				for ch in parsing:
+					cache.discard(keys[ch])
+			raise
+		self.channels = sorted(self.models)
+		self.timeline = Timeline(self.models, {ch: self.durations(ch) for ch in self.channels})
+
+	def durations(self, channel):
+		# estimated times; travel distance stands in for them in programs without any feed
+		model = self.models[channel]
+		if model.feeds:
+			return segment_times(model, self.profile)
+		if model.distances is None:
+			return np.zeros(model.columns.count)
+		return model.distances
+
+	def line_cache_stats(self):
+		"""Hits, misses & argument replays of the channels' line caches, summed."""
+		totals = {"hits": 0, "misses": 0, "replays": 0}
+		for model in self.models.values():
+			for name in totals:
+				totals[name] += getattr(model.parser.line_cache, name)
+		return totals
+
+	def cycle_times(self):
+		"""CycleTime of every channel; with waits, `timeline.duration` is the program's."""
+		return {ch: CycleTime(self.models[ch], self.profile) for ch in self.channels}
+
+	def merged(self):
+		"""A single model holding the segments of all channels, channel after channel.
+
+		`offsets[channel]` is the index of the channel's first segment in it.
+		"""
+		parser = GcodeParser(**self.options)
+		model = parser.model
+		self.offsets = {}
+		for ch in self.channels:
+			columns = self.models[ch].columns
+			n = columns.count
+			self.offsets[ch] = model.columns.count
+			model.columns.extend(columns.type[:n], columns.coords[:n], columns.tool[:n], columns.lineNb[:n], -1)
+			model.lines.update(self.models[ch].lines)
+			# every channel starts without a feed
+			model.addFeed(0., True, 0., False)
+			model.feeds.extend((self.offsets[ch] + state[0],) + state[1:] for state in self.models[ch].feeds)
+			model.diagnostics.merge(self.models[ch].diagnostics)
+			if model.index is not None:
+				model.index.merge(self.models[ch].index)
+		model.postProcess()
+		return model
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# Rapid clearance: how close every G0 move comes to the cutting moves and to
+# solid envelopes such as the guide bushing. Cutting moves are cut into short
+# pieces hashed into a uniform grid, so every rapid is only compared with the
+# pieces in the cells around it instead of with every segment of the program.
+#
+# Distances are measured in mm on every axis: X, programmed as a diameter,
+# is halved into a radius.
+
+import numpy as np
+
+RAPID = 0
+
+# pieces of rapid moves looked up in the grid in one go, and the number of
+# candidate pairs whose distances are computed at once
+CHUNK = 1 << 14
+MAX_PAIRS = 1 << 20
+
+def scaled(points):
+	points = np.array(points, dtype=float)
+	points[..., 0] /= 2
+	return points
+
+def segment_distances(p1, q1, p2, q2):
+	"""Minimum distance between segments p1-q1 and p2-q2, row by row."""
+	d1 = q1 - p1
+	d2 = q2 - p2
+	r = p1 - p2
+	a = (d1*d1).sum(axis=1)
+	e = (d2*d2).sum(axis=1)
+	b = (d1*d2).sum(axis=1)
+	c = (d1*r).sum(axis=1)
+	f = (d2*r).sum(axis=1)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		denom = a*e - b*b
+		s = np.where(denom > 1e-12, np.clip((b*f - c*e) / denom, 0, 1), 0.)
+		t = np.where(e > 1e-12, (b*s + f) / e, 0.)
+		# t outside the second segment: clamp it and find s again
+		s = np.where(t < 0, np.where(a > 1e-12, np.clip(-c / a, 0, 1), 0.), s)
+		s = np.where(t > 1, np.where(a > 1e-12, np.clip((b - c) / a, 0, 1), 0.), s)
+	t = np.clip(t, 0, 1)
+	gap = (p1 + d1*s[:, None]) - (p2 + d2*t[:, None])
+	return np.sqrt((gap*gap).sum(axis=1))
+
+def split_segments(starts, ends, length):
+	"""Cuts segments into pieces no longer than `length`. Returns piece starts, ends and segment indices."""
+	n = np.maximum(np.ceil(np.sqrt(((ends - starts)**2).sum(axis=1)) / length), 1).astype(np.int64)
+	idx = np.repeat(np.arange(len(starts)), n)
+	# position of every piece within its segment
+	k = np.arange(len(idx)) - np.repeat(np.cumsum(n) - n, n)
+	t0 = (k / n[idx])[:, None]
+	t1 = ((k + 1) / n[idx])[:, None]
+	d = ends[idx] - starts[idx]
+	return starts[idx] + d*t0, starts[idx] + d*t1, idx
+
+class Cylinder:
+	"""A solid around the Z axis, e.g. the guide bushing or the bar stock.
+
+	`diameter` in program units (like X), between `zmin` and `zmax`.
+	"""
+
+	def __init__(self, diameter, zmin, zmax):
+		self.radius = diameter / 2
+		self.zmin = zmin
+		self.zmax = zmax
+
+	def distance(self, points):
+		# signed distance of scaled points to the surface, negative inside;
+		# halving the diameter X makes it a radius already
+		r = np.sqrt((points[:, :2]**2).sum(axis=1)) - self.radius
+		z = np.maximum(self.zmin - points[:, 2], points[:, 2] - self.zmax)
+		outside = np.sqrt(np.maximum(r, 0)**2 + np.maximum(z, 0)**2)
+		return np.where((r < 0) & (z < 0), np.maximum(r, z), outside)
+
+	def __str__(self):
+		return "<Cylinder: d=%g, z=%g..%g>" % (self.radius*2, self.zmin, self.zmax)
+
+class SegmentGrid:
+	"""Segments cut into pieces and bucketed into a uniform grid of cells.
+
+	Pieces closer than `threshold` have midpoints within threshold + piece
+	length of each other, so with cells that size the 27 cells around a
+	query piece hold every candidate. Each cell also keeps the bounding box
+	of its pieces to skip cells that are in reach on the grid but not really.
+	"""
+
+	offsets = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)])
+
+	def __init__(self, starts, ends, segments, length, threshold):
+		self.size = threshold + length
+		starts, ends, idx = split_segments(starts, ends, length)
+		keys = self.cellKeys(self.cellOf(starts, ends))
+		order = np.argsort(keys, kind='stable')
+		self.starts, self.ends = starts[order], ends[order]
+		self.segments = segments[idx[order]]
+		# per occupied cell: key, first piece, piece count & bounding box
+		self.keys, self.first, self.count = np.unique(keys[order], return_index=True, return_counts=True)
+		self.mins = np.minimum.reduceat(np.minimum(self.starts, self.ends), self.first)
+		self.maxs = np.maximum.reduceat(np.maximum(self.starts, self.ends), self.first)
+
+	def cellOf(self, starts, ends):
+		return np.floor((starts + ends) / 2 / self.size).astype(np.int64)
+
+	@staticmethod
+	def cellKeys(cells):
+		# one sortable integer per cell, 21 bits per axis
+		cells = cells + (1 << 20)
+		return (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+
+	def candidates(self, starts, ends, threshold):
+		"""First piece & piece count of each of the 27 neighbour cells of every query piece, 0 when out of reach."""
+		keys = self.cellKeys((self.cellOf(starts, ends)[:, None, :] + self.offsets[None, :, :]).reshape(-1, 3))
+		cell = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+		found = self.keys[cell] == keys
+		# gap between the bounding boxes of query piece & cell
+		mins = np.repeat(np.minimum(starts, ends), len(self.offsets), axis=0)
+		maxs = np.repeat(np.maximum(starts, ends), len(self.offsets), axis=0)
+		gap = np.maximum(np.maximum(self.mins[cell] - maxs, mins - self.maxs[cell]), 0)
+		near = found & ((gap*gap).sum(axis=1) < threshold*threshold)
+		return self.first[cell], np.where(near, self.count[cell], 0)
+
+class ClearanceCheck:
+	"""Minimum distance of every rapid move to the cutting moves and envelopes.
+
+	Near its end points a rapid naturally meets the path it leaves or
+	approaches, so the cutting moves right before and after a run of
+	rapids are not checked against it (e.g. a drill retracting through the
+	hole it just made). Every other cutting move is, along the whole rapid:
+	a short plunge into the part is the crash to find.
+
+	`rapids` holds the segment indices of the checked rapids, `distances`
+	their minimum distance and `nearest` the closest cutting segment (-1 for
+	an envelope). Distances are exact below the threshold; above it, they
+	are only known not to be below it (inf when nothing was in reach).
+	"""
+
+	def __init__(self, model, threshold=0.5, envelopes=()):
+		self.model = model
+		self.threshold = threshold
+		self.envelopes = list(envelopes)
+
+		n = model.columns.count
+		types = model.columns.type[:n]
+		starts = scaled(model.segmentStarts())
+		ends = scaled(model.columns.coords[:n])
+
+		# the cutting moves right before and after every rapid
+		rapid = types == RAPID
+		index = np.arange(n)
+		before = np.maximum.accumulate(np.where(rapid, -1, index)) if n else index
+		after = np.minimum.accumulate(np.where(rapid, n, index)[::-1])[::-1] if n else index
+
+		checked = np.flatnonzero(rapid)
+		rapidStarts = starts[checked]
+		rapidEnds = ends[checked]
+
+		self.rapids = checked
+		self.distances = np.full(len(checked), np.inf)
+		self.nearest = np.full(len(checked), -1, dtype=np.int64)
+		if not len(checked):
+			return
+
+		cutting = np.flatnonzero(~rapid)
+		if len(cutting):
+			self.checkCutting(starts[cutting], ends[cutting], cutting, before[checked], after[checked], rapidStarts, rapidEnds)
+		if self.envelopes:
+			self.checkEnvelopes(rapidStarts, rapidEnds)
+
+	def pieceLength(self, starts, ends):
+		# short pieces keep the candidates exact, but not so short that a
+		# tiny threshold on a large part explodes the piece count
+		extent = np.ptp(np.vstack((starts, ends)), axis=0).max() if len(starts) else 0.
+		return max(self.threshold, extent / 4096, 1e-6)
+
+	def checkCutting(self, starts, ends, segments, before, after, rapidStarts, rapidEnds):
+		length = self.pieceLength(starts, ends)
+		grid = SegmentGrid(starts, ends, segments, length, self.threshold)
+		pieceStarts, pieceEnds, pieceIdx = split_segments(rapidStarts, rapidEnds, length)
+
+		for i in range(0, len(pieceIdx), CHUNK):
+			lo, counts = grid.candidates(pieceStarts[i:i+CHUNK], pieceEnds[i:i+CHUNK], self.threshold)
+			# candidate pairs per rapid piece, compared in batches of about MAX_PAIRS
+			neighbours = len(grid.offsets)
+			perPiece = counts.reshape(-1, neighbours).sum(axis=1)
+			batch = np.cumsum(perPiece) // MAX_PAIRS
+			bounds = np.concatenate(([0], np.flatnonzero(np.diff(batch)) + 1, [len(perPiece)]))
+			for b0, b1 in zip(bounds[:-1], bounds[1:]):
+				if not perPiece[b0:b1].sum():
+					continue
+				c = counts[b0*neighbours:b1*neighbours]
+				pair = i + b0 + np.repeat(np.arange(len(c)) // neighbours, c)
+				cand = np.repeat(lo[b0*neighbours:b1*neighbours] - np.cumsum(c) + c, c) + np.arange(c.sum())
+				# skip the cutting moves the rapid's run of rapids leaves and approaches
+				rapid = pieceIdx[pair]
+				keep = (grid.segments[cand] != before[rapid]) & (grid.segments[cand] != after[rapid])
+				pair, cand = pair[keep], cand[keep]
+				if len(pair):
+					d = segment_distances(pieceStarts[pair], pieceEnds[pair], grid.starts[cand], grid.ends[cand])
+					self.update(pieceIdx[pair], d, grid.segments[cand])
+
+	def checkEnvelopes(self, rapidStarts, rapidEnds):
+		# sample every rapid finely enough to miss at most a quarter threshold
+		starts, ends, idx = split_segments(rapidStarts, rapidEnds, max(self.threshold / 2, 1e-6))
+		for envelope in self.envelopes:
+			d = np.minimum(envelope.distance(starts), envelope.distance(ends))
+			self.update(idx, d, np.full(len(idx), -1, dtype=np.int64))
+
+	def update(self, rows, distances, segments):
+		# keep the minimum distance (and what it was measured to) per rapid,
+		# `rows` are sorted
+		firsts = np.concatenate(([0], np.flatnonzero(rows[1:] != rows[:-1]) + 1))
+		mins = np.minimum.reduceat(distances, firsts)
+		group = np.cumsum(np.concatenate(([0], rows[1:] != rows[:-1])))
+		# first pair of every row that reaches the minimum
+		at = np.flatnonzero(distances == mins[group])
+		at = at[np.concatenate(([True], group[at][1:] != group[at][:-1]))]
+		rows = rows[firsts]
+		closer = mins < self.distances[rows]
+		self.distances[rows[closer]] = mins[closer]
+		self.nearest[rows[closer]] = segments[at][closer]
+
+	@property
+	def violations(self):
+		"""Segment indices of the rapids closer than the threshold."""
+		return self.rapids[self.distances < self.threshold]
+
+	def summary(self):
+		result = []
+		for i in np.flatnonzero(self.distances < self.threshold):
+			segment = self.model.segments[int(self.rapids[i])]
+			target = "line %d" % self.model.columns.lineNb[self.nearest[i]] if self.nearest[i] >= 0 else "envelope"
+			result.append("line %d: rapid %.3f from %s (%s)" % (segment.lineNb, self.distances[i], target, segment.line.strip()))
+		return result
+
+	def __str__(self):
+		return "<ClearanceCheck: %d rapids, %d closer than %g>" % (len(self.rapids), len(self.violations), self.threshold)
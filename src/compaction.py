@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Polyline compaction: within a tool layer every segment starts where the
+# previous one ends, so a layer is drawn as one line strip through the end
+# points of its segments. Zero-length segments (retract/restore, modal M
+# lines) add nothing to it, and neither do the inner points of collinear
+# runs; compaction keeps only the segments whose end points are needed, within
+# a tolerance. A dropped segment is covered by the next kept one, so every
+# drawn line still maps back to its source segments and lines.
+
+import numpy as np
+from src.mapped import chunks
+
+# mm a dropped point may lie off the drawn line
+DEFAULT_TOLERANCE = 1e-3
+
+def line_distance(points, a, b):
+	"""Distance of every point from the line through a and b (from a where a == b)."""
+	ab = b - a
+	length = np.sqrt((ab**2).sum(axis=1))
+	cross = np.sqrt((np.cross(ab, points - a)**2).sum(axis=1))
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return np.where(length > 0, cross / length, np.sqrt(((points - a)**2).sum(axis=1)))
+
+def compact_chunk(points, types, start, tolerance):
+	"""Indices of the points of a polyline from `start` that are kept, the last one always."""
+	n = len(points)
+	previous = np.concatenate(([start], points[:-1]))
+	# zero-length segments are dropped whatever their type
+	candidates = np.flatnonzero((points != previous).any(axis=1))
+	if not len(candidates):
+		candidates = np.array([n - 1])
+	# trailing zero-length segments end where the last moving one does
+	candidates[-1] = n - 1
+	vertices = points[candidates]
+	before = np.concatenate(([start], vertices[:-1]))
+	after = np.concatenate((vertices[1:], vertices[-1:]))
+	# an inner point goes if it lies on the line from its neighbours, without
+	# turning back, and the segments on both sides are of the same type
+	ahead = ((vertices - before) * (after - vertices)).sum(axis=1) > 0
+	sameType = np.append(types[candidates[1:]] == types[candidates[:-1]], False)
+	kept = ~(ahead & sameType & (line_distance(vertices, before, after) <= tolerance))
+	kept[-1] = True
+	# every dropped point must also lie on the line that replaces its run:
+	# the farthest one of every run that strays is kept, until none does
+	anchors = np.concatenate(([start], vertices))
+	index = np.arange(1, len(vertices) + 1)
+	while True:
+		first = np.maximum.accumulate(np.where(np.concatenate(([True], kept)), np.arange(len(anchors)), 0))[:-1]
+		last = np.minimum.accumulate(np.where(kept, index, len(anchors))[::-1])[::-1]
+		distance = line_distance(vertices, anchors[first], anchors[last])
+		strays = np.flatnonzero(~kept & (distance > tolerance))
+		if not len(strays):
+			break
+		run = first[strays]
+		order = np.lexsort((-distance[strays], run))
+		kept[strays[order][np.concatenate(([True], run[order][1:] != run[order][:-1]))]] = True
+	return candidates[kept]
+
+def compact_rows(coords, types, start, first, last, tolerance=DEFAULT_TOLERANCE):
+	"""Rows first..last-1 of a layer starting at `start` whose end points are kept.
+
+	Sorted; the last row of the layer is always kept. Works a chunk at a
+	time, the last row of every chunk is kept as well.
+	"""
+	rows = []
+	previous = np.asarray(start, dtype=float)
+	for lo, hi in chunks(first, last):
+		rows.append(compact_chunk(coords[lo:hi], types[lo:hi], previous, tolerance) + lo)
+		previous = coords[hi - 1]
+	return np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+
+def covering(rows, segment):
+	"""Index of the drawn line covering a segment, given the kept rows."""
+	return int(np.searchsorted(rows, segment))
+
+def covered(rows, index, first):
+	"""The segments drawn as line `index`: first row after the previous kept one up to its row."""
+	begin = first if index == 0 else int(rows[index - 1]) + 1
+	return range(begin, int(rows[index]) + 1)
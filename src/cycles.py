@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+# Canned-cycle expansion: every cycle is expanded into one batch of segment
+# end points with NumPy, instead of building a Python object per peck.
+
+import math
+import numpy as np
+
+# move types of the expanded segments (indices into SEGMENT_TYPES)
+RAPID = 0
+FEED = 1
+
+def peck_drill(start, axis, r_level, bottom, peck, clearance):
+	"""Expands a peck drilling cycle along `axis` (0=X, 1=Y, 2=Z).
+
+	The tool starts at `start`, rapids to the R level, and then feeds `peck`
+	deeper on every pass, retracting to the R level and rapidly approaching to
+	`clearance` short of the previous depth in between. After the last peck
+	it returns to the start level. Returns the end points as an (n, 3) array
+	and the move type of each point.
+	"""
+	start = np.asarray(start, dtype=float)
+	depth = abs(bottom - r_level)
+	direction = 1.0 if bottom >= r_level else -1.0
+	if peck <= 0 or peck >= depth:
+		npecks = 1
+	else:
+		npecks = int(math.ceil(depth / peck - 1e-9))
+	depths = r_level + direction * np.minimum(np.arange(1, npecks + 1) * peck, depth)
+	if npecks == 1:
+		depths[0] = bottom
+
+	# per peck: feed to depth, rapid out to R, rapid back in short of the depth
+	passes = np.empty((npecks, 3))
+	passes[:, 0] = depths
+	passes[:, 1] = r_level
+	passes[:, 2] = depths - direction * clearance
+	# approach R, all passes except the last re-approach, back to start level
+	values = np.concatenate(([r_level], passes.ravel()[:-1], [start[axis]]))
+	types = np.concatenate((
+		[RAPID],
+		np.tile(np.array([FEED, RAPID, RAPID], dtype=np.int8), npecks)[:-1],
+		[RAPID])).astype(np.int8)
+
+	points = np.repeat(start[np.newaxis, :], len(values), axis=0)
+	points[:, axis] = values
+	return points, types
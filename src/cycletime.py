@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+# Cycle time estimation: the time of every segment from the modal feed state
+# the parser records (F, G98/G99, S, G96/G97) and the rapid traverse rates of
+# a machine profile, worked out with array operations over all segments and
+# summed per tool layer, per tool and per channel.
+
+import json
+import math
+
+import numpy as np
+from src.gcodeParser import tool_name
+from src.mapped import chunks
+
+RAPID = 0
+
+class MachineProfile:
+	"""Rates of a machine: rapid traverse per axis (mm/min) and the spindle speed limit (rpm).
+
+	Optionally the radii of its axial tools (mm) for the stock simulation,
+	and the guide bushing (diameter & Z of its face) for the clearance check.
+	`load()` reads them from JSON, e.g. {"rapid": [24000, 24000, 32000],
+	"max_rpm": 10000, "tool_radii": {"T21": 2.5}, "guide_bushing": [20, -40]}.
+	"""
+
+	def __init__(self, rapid=(24000., 24000., 32000.), max_rpm=10000., tool_radii=None, guide_bushing=None):
+		self.rapid = np.asarray(rapid, dtype=float)
+		self.max_rpm = float(max_rpm)
+		# tool numbers -> radius, 'T21' or 21
+		self.tool_radii = {int(str(tool).lstrip("Tt")): float(radius) for tool, radius in (tool_radii or {}).items()}
+		self.guide_bushing = tuple(map(float, guide_bushing)) if guide_bushing else None
+
+	@classmethod
+	def load(cls, path):
+		with open(path) as f:
+			return cls(**json.load(f))
+
+	def __str__(self):
+		return "<MachineProfile: rapid=%s mm/min, max_rpm=%g>" % (self.rapid.tolist(), self.max_rpm)
+
+def feed_state(model, first, last):
+	"""F, per revolution, S & constant surface speed of the segments first..last, as arrays."""
+	feeds = model.feeds or [(0, 0., True, 0., False)]
+	starts = np.array([state[0] for state in feeds])
+	at = np.searchsorted(starts, np.arange(first, last), side='right') - 1
+	# segments before the first state have no feed
+	at = np.maximum(at, 0)
+	known = starts[at] <= np.arange(first, last)
+	values = [np.array([state[i] for state in feeds])[at] for i in range(1, 5)]
+	values[0] = np.where(known, values[0], 0.)
+	return values
+
+def segment_times(model, profile=None):
+	"""Seconds of every segment; rapids at the profile's rates, feeds at the programmed feedrate.
+
+	X is programmed as a diameter, a move along it travels half as far.
+	Feed moves without a feedrate (no F, or G99 without spindle speed)
+	take no time, `unknown_feeds()` counts them.
+	"""
+	profile = profile or MachineProfile()
+	n = model.columns.count
+	times = model.columns.allocate(n, np.float64)
+	scale = np.array([.5, 1., 1.])
+	for lo, hi in chunks(0, n):
+		ends = model.columns.coords[lo:hi]
+		travel = np.abs(ends - model.segmentStarts(lo, hi)) * scale
+		rapid = model.columns.type[lo:hi] == RAPID
+		feed, per_rev, spindle, css = feed_state(model, lo, hi)
+		# G96: spindle speed from the surface speed (m/min) at the end point's diameter
+		diameter = np.maximum(np.abs(ends[:, 0]), 1e-3)
+		rpm = np.minimum(np.where(css, spindle * 1000. / (math.pi * diameter), spindle), profile.max_rpm)
+		rate = np.where(per_rev, feed * rpm, feed)
+		length = np.sqrt((travel**2).sum(axis=1))
+		with np.errstate(divide='ignore', invalid='ignore'):
+			feeding = np.where(rate > 0, length / rate, 0.)
+		# the axes of a rapid move run at their own rates, the slowest one decides
+		times[lo:hi] = 60. * np.where(rapid, (travel / profile.rapid).max(axis=1), feeding)
+	return times
+
+class CycleTime:
+	"""Estimated machining time of a model, in seconds: per segment, tool layer and tool."""
+
+	def __init__(self, model, profile=None):
+		self.model = model
+		self.profile = profile or MachineProfile()
+		n = model.columns.count
+		self.times = segment_times(model, self.profile)
+		rapid = model.columns.type[:n] == RAPID
+		self.rapid = float(self.times[:n][rapid].sum())
+		self.total = float(self.times[:n].sum())
+		self.cutting = self.total - self.rapid
+		self.layers = np.zeros(len(model.layers or []))
+		if n and model.layers:
+			self.layers = np.add.reduceat(self.times[:n], [layer.first for layer in model.layers])
+		numbers, which = np.unique(model.columns.tool[:n], return_inverse=True)
+		self.tools = {tool_name(int(number)): float(time)
+			for number, time in zip(numbers, np.bincount(which, weights=self.times[:n], minlength=len(numbers)))}
+		# feed moves without a feedrate
+		self.unknown = int(((self.times[:n] == 0) & ~rapid & (model.distances[:n] > 0)).sum()) if model.distances is not None else 0
+
+	def report(self):
+		"""Lines of text: the total, then every tool layer and every tool."""
+		result = ["cycle time %s (cutting %s, rapid %s)" % (clock(self.total), clock(self.cutting), clock(self.rapid))]
+		if self.unknown:
+			result.append("%d feed moves without a feedrate are not counted" % self.unknown)
+		for i, layer in enumerate(self.model.layers or []):
+			result.append("  layer %d %-5s %s" % (i, layer.tool, clock(self.layers[i])))
+		for tool, time in sorted(self.tools.items(), key=lambda item: -item[1]):
+			result.append("  tool %-5s %s" % (tool, clock(time)))
+		return result
+
+	def __str__(self):
+		return "<CycleTime: %.1f s, %d layers, %d tools>" % (self.total, len(self.layers), len(self.tools))
+
+def clock(seconds):
+	# 'm:ss.s'
+	return "%d:%04.1f" % divmod(seconds, 60)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Parser diagnostics: warnings are counted per message instead of printed as
+# they happen. A program with an unsupported M-code on every other line would
+# otherwise spend more time writing to the terminal than parsing.
+
+import sys
+
+# line numbers remembered per kind of warning
+MAX_LINES = 5
+
+class Diagnostics:
+	"""Counts warnings by message and keeps the first `max_lines` occurrences of each.
+
+	`counts[(level, msg)]` is the number of occurrences, `lines[(level, msg)]`
+	the (lineNb, text) of the first ones, in order of appearance.
+	"""
+
+	def __init__(self, max_lines=MAX_LINES):
+		self.max_lines = max_lines
+		self.counts = {}
+		self.lines = {}
+
+	def add(self, level, msg, lineNb, line):
+		kind = (level, msg)
+		count = self.counts.get(kind, 0)
+		self.counts[kind] = count + 1
+		if count < self.max_lines:
+			self.lines.setdefault(kind, []).append((lineNb, line))
+
+	def merge(self, other, lineOffset=0):
+		"""Adds the diagnostics of `other`, shifting its line numbers by `lineOffset`."""
+		for kind, count in other.counts.items():
+			self.counts[kind] = self.counts.get(kind, 0) + count
+			kept = self.lines.setdefault(kind, [])
+			for lineNb, line in other.lines.get(kind, []):
+				if len(kept) >= self.max_lines:
+					break
+				kept.append((lineNb + lineOffset, line))
+
+	def shifted(self, lineOffset):
+		result = Diagnostics(self.max_lines)
+		result.merge(self, lineOffset)
+		return result
+
+	@property
+	def total(self):
+		return sum(self.counts.values())
+
+	def count(self, level=None):
+		return sum(n for (l, _), n in self.counts.items() if level is None or l == level)
+
+	def __len__(self):
+		return len(self.counts)
+
+	def summary(self):
+		"""One line per kind of warning, most frequent first."""
+		result = []
+		for kind, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+			level, msg = kind
+			lineNbs = ", ".join(str(lineNb) for lineNb, _ in self.lines.get(kind, []))
+			more = ", ..." if count > len(self.lines.get(kind, [])) else ""
+			result.append("[%s] %s: %d times (lines %s%s)" % (level, msg, count, lineNbs, more))
+		return result
+
+	def report(self, out=None):
+		out = out or sys.stdout
+		if not self.counts:
+			return
+		out.write("%d warnings of %d kinds:\n" % (self.total, len(self)))
+		for line in self.summary():
+			out.write("  %s\n" % line)
+
+	def __str__(self):
+		return "<Diagnostics: %d warnings of %d kinds>" % (self.total, len(self))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+# Toolpath export: writers stream a model's segments tool layer by tool layer,
+# converting at most CHUNK points at a time, so the output is never held in
+# memory as a whole.
+#
+#   .scr  AutoCAD (LT) script, one 3D polyline per tool layer
+#   .ybin compact little-endian binary, header + layer table + per-layer arrays
+#   .glb  binary glTF, one LINE_STRIP mesh per tool layer
+
+import json
+import struct
+import numpy as np
+
+CHUNK = 1 << 16
+
+BINARY_MAGIC = b"YAGV"
+BINARY_VERSION = 1
+# magic, version, layer count, segment count, bbox min xyz, bbox max xyz
+BINARY_HEADER = struct.Struct("<4sHxxIQ6d")
+# tool, first segment, segment count, start xyz, data offset
+BINARY_LAYER = struct.Struct("<hxxxxxxQQ3dQ")
+
+def layer_points(model, layer):
+	# the path of a layer: its start point followed by every segment end point
+	start = np.array([[layer.start["X"], layer.start["Y"], layer.start["Z"]]])
+	return start, model.columns.coords[layer.first:layer.first+layer.count]
+
+def write_script(model, out):
+	"""Writes an AutoCAD script drawing each tool layer as a 3DPOLY on a layer named after the tool."""
+	for idx, layer in enumerate(model.layers):
+		name = "%s_%d" % (layer.tool or "T0", idx)
+		out.write("-LAYER\nM\n%s\n\n" % name)
+		start, points = layer_points(model, layer)
+		out.write("_3DPOLY\n%.4f,%.4f,%.4f\n" % tuple(start[0]))
+		for i in range(0, len(points), CHUNK):
+			chunk = points[i:i+CHUNK]
+			out.write("\n".join("%.4f,%.4f,%.4f" % tuple(p) for p in chunk.tolist()))
+			out.write("\n")
+		out.write("\n")
+
+def write_binary(model, out):
+	"""Writes the compact binary format.
+
+	After the header and the layer table, every layer holds its segment end
+	points (float32 xyz), source line numbers (uint32) and move types (uint8).
+	"""
+	layers = model.layers
+	n = model.columns.count
+	bbox = model.bbox
+	# a program without segments has no bbox, a zero one is written
+	extent = (bbox.xmin, bbox.ymin, bbox.zmin, bbox.xmax, bbox.ymax, bbox.zmax) if bbox is not None else (0.,) * 6
+	out.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(layers), n, *extent))
+	offset = BINARY_HEADER.size + BINARY_LAYER.size * len(layers)
+	for layer in layers:
+		tool = int(layer.tool[1:]) if layer.tool else -1
+		out.write(BINARY_LAYER.pack(tool, layer.first, layer.count,
+			layer.start["X"], layer.start["Y"], layer.start["Z"], offset))
+		offset += layer.count * (12 + 4 + 1)
+	columns = model.columns
+	for layer in layers:
+		first, last = layer.first, layer.first + layer.count
+		for column, dtype in ((columns.coords, "<f4"), (columns.lineNb, "<u4"), (columns.type, "u1")):
+			for i in range(first, last, CHUNK):
+				out.write(column[i:min(i+CHUNK, last)].astype(dtype).tobytes())
+
+def read_binary(path):
+	"""Reads a file written by write_binary into a dict of header fields and per-layer arrays."""
+	with open(path, "rb") as f:
+		magic, version, nlayers, nsegments, *bbox = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+		if magic != BINARY_MAGIC or version != BINARY_VERSION:
+			raise ValueError("not a yagv binary toolpath: %s" % path)
+		table = [BINARY_LAYER.unpack(f.read(BINARY_LAYER.size)) for _ in range(nlayers)]
+		layers = []
+		for tool, first, count, x, y, z, offset in table:
+			f.seek(offset)
+			layers.append({
+				"tool": tool, "first": first, "start": (x, y, z),
+				"coords": np.frombuffer(f.read(count*12), dtype="<f4").reshape(count, 3),
+				"lineNb": np.frombuffer(f.read(count*4), dtype="<u4"),
+				"type": np.frombuffer(f.read(count), dtype="u1"),
+			})
+	return {"segments": nsegments, "bbox": bbox, "layers": layers}
+
+def write_glb(model, out):
+	"""Writes binary glTF 2.0 with one LINE_STRIP mesh per tool layer."""
+	accessors, views, meshes, nodes = [], [], [], []
+	offset = 0
+	for idx, layer in enumerate(model.layers):
+		count = layer.count + 1
+		views.append({"buffer": 0, "byteOffset": offset, "byteLength": count*12})
+		# float32 rounding is monotonic, so the bbox gives the exact min/max
+		bbox = layer.bbox
+		accessors.append({"bufferView": idx, "componentType": 5126, "count": count, "type": "VEC3",
+			"min": np.array([bbox.xmin, bbox.ymin, bbox.zmin], dtype=np.float32).tolist(),
+			"max": np.array([bbox.xmax, bbox.ymax, bbox.zmax], dtype=np.float32).tolist()})
+		meshes.append({"name": layer.tool or "T0", "primitives": [{"attributes": {"POSITION": idx}, "mode": 3}]})
+		nodes.append({"name": "%s_%d" % (layer.tool or "T0", idx), "mesh": idx})
+		offset += count*12
+	document = {
+		"asset": {"version": "2.0", "generator": "yagv"},
+		"scene": 0,
+		"scenes": [{"nodes": list(range(len(nodes)))}],
+		"nodes": nodes, "meshes": meshes, "accessors": accessors, "bufferViews": views,
+		"buffers": [{"byteLength": offset}],
+	}
+	text = json.dumps(document, separators=(",", ":")).encode()
+	text += b" " * (-len(text) % 4)
+	total = 12 + 8 + len(text) + 8 + offset
+	out.write(struct.pack("<4sII", b"glTF", 2, total))
+	out.write(struct.pack("<I4s", len(text), b"JSON"))
+	out.write(text)
+	out.write(struct.pack("<I4s", offset, b"BIN\0"))
+	for layer in model.layers:
+		start, points = layer_points(model, layer)
+		out.write(start.astype("<f4").tobytes())
+		for i in range(0, len(points), CHUNK):
+			out.write(points[i:i+CHUNK].astype("<f4").tobytes())
+
+WRITERS = {
+	".scr": (write_script, "w"),
+	".ybin": (write_binary, "wb"),
+	".glb": (write_glb, "wb"),
+}
+
+def export_model(model, path):
+	"""Exports a post-processed model, the format is chosen by the file extension."""
+	for extension, (writer, mode) in WRITERS.items():
+		if path.lower().endswith(extension):
+			with open(path, mode) as out:
+				writer(model, out)
+			return
+	raise ValueError("unknown export format '%s', use one of %s" % (path, ", ".join(WRITERS)))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+# Fixed-point coordinates: Citizen controls work in 0.0001 mm (or 0.001 mm)
+# units, the `$0` x10000 variable scaling shows it. Stored as int32 counts of
+# such units, a coordinate takes 4 bytes instead of 8 and is exact: points
+# that are the same on the machine compare equal, whatever arithmetic the
+# program did to reach them (incremental U/W moves, macro expressions).
+
+import numpy as np
+
+# units per mm: 0.0001 mm
+DEFAULT_SCALE = 10000
+INT32_MAX = np.iinfo(np.int32).max
+
+def quantize(values, scale):
+	"""int32 counts of 1/`scale` mm nearest to `values` (mm); OverflowError beyond the int32 range."""
+	counts = np.rint(np.asarray(values, dtype=np.float64) * scale)
+	if counts.size and np.abs(counts).max() > INT32_MAX:
+		raise OverflowError("coordinate beyond %g mm cannot be stored in 1/%d mm units" % (INT32_MAX / scale, scale))
+	return counts.astype(np.int32)
+
+class FixedPointArray:
+	"""An int32 array of machine units (`raw`) that reads and writes as float64 mm.
+
+	Reading divides by `scale`, so a count reads as the float closest to
+	its decimal value (123456 as 12.3456). Supports the indexing the
+	segment columns use; `raw` is the array itself, e.g. to be memory-mapped.
+	"""
+
+	dtype = np.dtype(np.float64)
+
+	def __init__(self, raw, scale=DEFAULT_SCALE):
+		self.raw = raw
+		self.scale = scale
+
+	@property
+	def shape(self):
+		return self.raw.shape
+
+	@property
+	def nbytes(self):
+		return self.raw.nbytes
+
+	def __len__(self):
+		return len(self.raw)
+
+	def __getitem__(self, key):
+		return self.raw[key] / self.scale
+
+	def __setitem__(self, key, values):
+		self.raw[key] = quantize(values, self.scale)
+
+	def __array__(self, dtype=None, copy=None):
+		values = self.raw / self.scale
+		return values if dtype is None else values.astype(dtype)
+
+	def __str__(self):
+		return "<FixedPointArray: %s, 1/%d mm>" % (self.raw.shape, self.scale)
@@ -3,7 +3,28 @@
 import math
 import re
 import numpy as np
-import re
+from array import array
+from collections import OrderedDict
+from src.cycles import peck_drill
+from src.diagnostics import Diagnostics
+from src.search import SearchIndex
+from src.section import SectionIndex
+from src.reader import program_lines
+from src.mapped import MappedStore, chunks
+from src.fixedpoint import DEFAULT_SCALE, FixedPointArray
+
+# move types stored in the segment type column
+SEGMENT_TYPES = ["G0", "G1", "G2", "G3", "G32"]
+
+# distinct command texts whose compiled form is kept, see LineCache
+LINE_CACHE_SIZE = 10000
+
+# modal feed codes: (parser attribute, value); G98/G99 feed per minute/per
+# revolution, G96/G97 constant surface speed/spindle speed
+FEED_CODES = {
+	"G98": ("per_rev", False), "G99": ("per_rev", True),
+	"G96": ("css", True), "G97": ("css", False),
+}
 
 def preg_match(rex,s,m,opts={}):
    _m = re.search(rex,s)
@@ -14,102 +35,535 @@ def preg_match(rex,s,m,opts={}):
       return True
    return False
 
+def tool_number(tool):
+	# 'T21' -> 21, None -> -1
+	return int(tool[1:]) if tool else -1
+
+def tool_name(number):
+	return "T%d" % number if number >= 0 else None
+
+def is_tool_number(command):
+	# 'T0101', not 'T#1' or 'T[#1]'
+	return command[1:].isdigit()
+
+def selected_tool(command):
+	# 'T0101' -> 'T01', 'T123' -> 'T1', 'T0' -> None
+	if command == "T0":
+		return None
+	digits = command[1:]
+	return "T" + (digits[0] if len(digits) == 3 else digits[:2])
+
+# macro words recognised in control-flow expressions, with their Python equivalents
+MACRO_WORDS = {
+	"EQ": "==", "NE": "!=", "GT": ">", "LT": "<", "GE": ">=", "LE": "<=",
+	"AND": " and ", "OR": " or ", "XOR": "^", "MOD": "%",
+	"SQRT": "_f.sqrt", "ABS": "abs", "SIN": "_f.sin", "COS": "_f.cos",
+	"TAN": "_f.tan", "ATAN": "_f.atan", "ROUND": "round", "FIX": "_f.floor", "FUP": "_f.ceil",
+}
+
+class MacroFunctions:
+	# trigonometry on the control works in degrees
+	sqrt = staticmethod(math.sqrt)
+	floor = staticmethod(math.floor)
+	ceil = staticmethod(math.ceil)
+	sin = staticmethod(lambda a: math.sin(math.radians(a)))
+	cos = staticmethod(lambda a: math.cos(math.radians(a)))
+	tan = staticmethod(lambda a: math.tan(math.radians(a)))
+	atan = staticmethod(lambda a: math.degrees(math.atan(a)))
+
+macro_token = re.compile(r"#(\d+)|(\d+\.?\d*|\.\d+)|(SQRT|ABS|SIN|COS|ATAN|TAN|ROUND|FIX|FUP|EQ|NE|GT|LT|GE|LE|AND|XOR|OR|MOD)")
+
+def compile_expression(text):
+	"""Compiles a macro expression (e.g. '[#1LT10]') once into a code object.
+
+	Variables are looked up through `_v[number]` and macro functions through `_f`
+	when the code object is evaluated.
+	"""
+	def replace(m):
+		if m.group(1):
+			return "_v[%s]" % m.group(1)
+		if m.group(2):
+			return repr(float(m.group(2)))
+		return MACRO_WORDS[m.group(3)]
+	expr = text.replace("[", "(").replace("]", ")")
+	expr = macro_token.sub(replace, expr)
+	return compile(expr, "<macro>", "eval")
+
+class VariableTable:
+	"""Macro variables #0..#size-1, stored in a flat array indexed by number."""
+
+	def __init__(self, size=10000):
+		self.values = array('d', bytes(8 * size))
+
+	def __len__(self):
+		return len(self.values)
+
+	def __getitem__(self, number):
+		return self.values[int(number)]
+
+	def __setitem__(self, number, value):
+		self.values[int(number)] = value
+
+	def get(self, number, default=0.0):
+		number = int(number)
+		if 0 <= number < len(self.values):
+			return self.values[number]
+		return default
+
+# a condition that never holds, for control statements whose expression does not compile
+NEVER = compile("False", "<macro>", "eval")
+# errors of conditions & GOTO targets at run time, IndexError for a variable out of range
+CONDITION_ERRORS = (ValueError, TypeError, NameError, IndexError, ArithmeticError)
+
+class ExpressionError(ValueError):
+	"""An argument expression that cannot be compiled or evaluated."""
+
+class ArgumentTemplate:
+	"""Argument text compiled once into a constant, a variable slot or an expression.
+
+	`evaluate()` raises ExpressionError for text that does not compile
+	('[1/0]') or reads a variable out of range.
+	"""
+	__slots__ = ("text", "constant", "literal", "slot", "code", "error")
+
+	def __init__(self, text):
+		self.text = text
+		self.constant = None
+		self.literal = False
+		self.slot = None
+		self.code = None
+		self.error = None
+		m = re.fullmatch(r"#(\d+)", text)
+		if m:
+			self.slot = int(m.group(1))
+			return
+		try:
+			if "#" in text:
+				self.code = compile_expression(text)
+				return
+			try:
+				self.constant = float(text)
+				self.literal = True
+			except ValueError:
+				self.constant = float(eval(compile_expression(text), {"_f": MacroFunctions}))
+		except (SyntaxError, ValueError, TypeError, NameError, KeyError, ArithmeticError) as e:
+			self.error = e
+
+	def evaluate(self, namespace):
+		if self.constant is not None:
+			return self.constant
+		try:
+			if self.slot is not None:
+				return namespace["_v"][self.slot]
+			if self.code is not None:
+				return float(eval(self.code, namespace))
+			error = self.error
+		except (ValueError, TypeError, NameError, IndexError, ArithmeticError) as e:
+			error = e
+		raise ExpressionError("Cannot evaluate '%s': %s" % (self.text, error))
+
+class Arguments(list):
+	"""Argument words of a command; `parsed` holds their values once known not to change."""
+	# unset until then, read with getattr()
+	__slots__ = ("parsed",)
+
+class LineCache:
+	"""Compiled statements by comment-stripped text, the `size` most recently used ones.
+
+	Swiss programs repeat the same lines ('G1U-.5', 'G0X20.', 'T0') many
+	thousand times; each distinct text is tokenized once, its tokens are
+	shared by every line with that text, and the argument values of lines
+	without variables are worked out once (see parseArgs).
+	"""
+
+	def __init__(self, size=LINE_CACHE_SIZE):
+		self.size = size
+		self.commands = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		# argument dicts replayed instead of evaluated
+		self.replays = 0
+
+	def get(self, text):
+		stmt = self.commands.get(text)
+		if stmt is None:
+			self.misses += 1
+			return None
+		self.commands.move_to_end(text)
+		self.hits += 1
+		return stmt
+
+	def add(self, text, stmt):
+		self.commands[text] = stmt
+		if len(self.commands) > self.size:
+			self.commands.popitem(last=False)
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		return {"hits": self.hits, "misses": self.misses, "replays": self.replays,
+			"hit_rate": self.hits / lookups if lookups else 0., "size": len(self.commands)}
+
+	def __getstate__(self):
+		# commands hold compiled code objects, only the statistics travel
+		return {"size": self.size, "hits": self.hits, "misses": self.misses, "replays": self.replays}
+
+	def __setstate__(self, state):
+		self.__init__(state["size"])
+		self.hits, self.misses, self.replays = state["hits"], state["misses"], state["replays"]
+
+	def __str__(self):
+		return "<LineCache: %(hits)d hits, %(misses)d misses, %(replays)d replays, %(size)d commands>" % self.stats()
+
+class Statement:
+	"""A program line, tokenized once so that loops can execute it many times."""
+
+	def __init__(self, lineNb, line):
+		self.lineNb = lineNb
+		self.line = line
+		self.command = ""
+		self.comment = None
+		self.unterminated = False
+		self.label = None
+		self.words = []
+		self.tail = None
+		self.assignment = None
+		# control flow: 'while', 'end', 'goto' or 'if'
+		self.control = None
+		self.condition = None
+		self.loop = None
+		self.goto = None
+		self.then = None
+		# resolved jump target (statement index)
+		self.target = None
+		# channel synchronisation: (partner channel, wait id)
+		self.sync = None
+		# F & S words and feed codes, modal state rather than move arguments
+		self.feed = None
+
+class CompiledProgram:
+	"""Statements of a program with resolved jump targets."""
+
+	def __init__(self, statements, labels):
+		self.statements = statements
+		self.labels = labels
+
 class GcodeParser:
 	
-	def __init__(self):
+	def __init__(self, coords_dtype=np.float64, keep_lines=True, index=True, mapped_dir=None, coords_scale=DEFAULT_SCALE):
+		# cheaper model representations: float32 or int32 fixed-point coordinates (in
+		# 1/coords_scale mm), no source lines, no search index, columns memory-mapped
+		# from files below `mapped_dir`
 		self.model = GcodeModel(self)
+		self.model.columns = SegmentColumns(coords_dtype=coords_dtype, directory=mapped_dir, coords_scale=coords_scale)
+		self.model.keep_lines = keep_lines
+		self.model.index = SearchIndex() if index else None
 		self.current_type = None
 		self.layer_count = None
 		self.layer_current = None
 		self.current_tool = None
-		self.variables = dict()
+		self.variables = VariableTable()
+		self.var_multiplier = 1
+		# evaluation namespace of compiled expressions, and argument templates by text
+		self.namespace = {"_f": MacroFunctions, "_v": self.variables.values}
+		self.templates = {}
+		self.line_cache = LineCache()
+		# iterations after which a WHILE loop or backwards GOTO is considered runaway
+		self.max_loop_iterations = 100000
+		self.lineNb = 0
+		self.line = ""
+		# modal parameters of the active canned cycle
+		self.cycle = {}
+		# warnings, counted per message rather than printed per line
+		self.diagnostics = Diagnostics()
+		# modal feed state: F, per revolution (G99, the lathe default) or per
+		# minute (G98), S and whether S is a surface speed (G96)
+		self.feed = 0.
+		self.per_rev = True
+		self.spindle = 0.
+		self.css = False
 
 
 	def file_to_lines_array(self, file_path):
-		"""Reads a file and returns an array of its lines."""
+		"""Reads a file and returns an array of its lines, decompressing gzip, xz & zstd files on the fly."""
 		try:
-			with open(file_path, 'r') as file:
-				lines = file.readlines()
-			return lines
+			return program_lines(file_path)
 		except FileNotFoundError:
 			return f"Error: File not found at {file_path}"
 	
 
-	def parseCode(self, code):
+	def __getstate__(self):
+		# compiled code objects do not pickle, they are rebuilt on demand
+		state = dict(self.__dict__)
+		for name in ("templates", "namespace"):
+			state.pop(name, None)
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.templates = {}
+		self.namespace = {"_f": MacroFunctions, "_v": self.variables.values}
+
+	def parseCode(self, code, lineNbs=None):
+		self.prescanVariables(code)
+
+		# tokenize once & resolve jumps, then execute
+		self.runProgram(self.compileProgram(code, lineNbs))
+		# plain numbers are one template per distinct text, not worth keeping
+		self.templates = {text: t for text, t in self.templates.items() if not t.literal}
+			
+		return self.model
+
+	def prescanVariables(self, code):
 		# read the gcode file for initial variable assignments
 		var_multiplier = 1
 		for line in code:
-			if line == "$0":
-				var_multiplier = 10000
+			line = line.strip()
+			if line.startswith("$"):
+				var_multiplier = 10000 if line == "$0" else 1
 			match = re.match(r"#(\d+)=(-?\d*\.?\d*)", line)
-			if match and match.group(1) and match.group(2):
-				self.variables[match.group(1)] = float(match.group(2)) / var_multiplier
+			if match and match.group(1) and match.group(2) and int(match.group(1)) < len(self.variables):
+				# out of range ones are reported when their line runs
+				self.assign(match.group(1), float(match.group(2)) / var_multiplier)
 
+	def compileProgram(self, code, lineNbs=None):
+		# lineNbs: source line numbers, when `code` is a section of a file
+		statements = []
+		labels = {}
+		loops = []
+		if lineNbs is None:
+			lineNbs = range(1, len(code) + 1)
+		index = self.model.index
+		for lineNb, line in zip(lineNbs, code):
+			stmt = self.compileLine(lineNb, line.rstrip())
+			if index is not None:
+				tool = selected_tool(stmt.command) if stmt.command.startswith("T") and is_tool_number(stmt.command) else None
+				index.addLine(lineNb, stmt.command, stmt.label, tool and tool_number(tool))
+			if stmt.label is not None:
+				labels.setdefault(stmt.label, len(statements))
+			if stmt.control == "while":
+				loops.append((stmt.loop, len(statements)))
+			elif stmt.control == "end":
+				if loops and loops[-1][0] == stmt.loop:
+					_, start = loops.pop()
+					stmt.target = start
+					statements[start].target = len(statements) + 1
+				else:
+					self.lineNb, self.line = stmt.lineNb, stmt.line
+					self.warn("END%d without matching DO%d" % (stmt.loop, stmt.loop))
+					stmt.control = None
+			statements.append(stmt)
+		for loop, start in loops:
+			stmt = statements[start]
+			self.lineNb, self.line = stmt.lineNb, stmt.line
+			self.warn("DO%d without matching END%d" % (loop, loop))
+			stmt.control = None
+		# resolve constant GOTO targets now, computed ones at run time
+		for stmt in statements:
+			if stmt.control is not None and stmt.goto is not None and stmt.goto.co_names == ():
+				self.lineNb, self.line = stmt.lineNb, stmt.line
+				label = self.condition(stmt.goto)
+				if label is None:
+					# reported, the line does nothing
+					stmt.control = None
+					continue
+				stmt.target = labels.get(int(label))
+		return CompiledProgram(statements, labels)
 
-		# init line counter
-		self.lineNb = 0
-		# for all lines
-		for line in code:
-			# inc line counter
-			self.lineNb += 1
-			# remove trailing linefeed
-			self.line = line.rstrip()
-			# parse a line
-			self.parseLine()
-			
-		return self.model
-		
-	def parseLine(self):
+	def compileLine(self, lineNb, line):
+		stmt = Statement(lineNb, line)
 		# strip comments:
 		## first handle round brackets
-		command = re.sub("\([^)]*\)", "", self.line)
+		command = re.sub(r"\([^)]*\)", "", line)
 		## then semicolons
 		idx = command.find(';')
 		if idx >= 0:                            # -- any comment to parse?
-			m = []
-			if preg_match(r'TYPE:\s*(\w+)',command,m):
-				self.current_type = m[1].lower()
-			elif preg_match(r'; (skirt|perimeter|infill|support)',command,m):
-				self.current_type = m[1]
-			elif not self.layer_count and re.search(r'LAYER_COUNT:',command):
-				self.layer_count = 1
-			elif preg_match(r'LAYER:\s*(\d+)',command,m):   # -- we have actual LAYER: counter! let's use it
-				self.layer_count = 1
-				self.layer_current = int(m[1])
-			#elif preg_match(r'; (\w+):\s*"?(\d+)"?',command,m): 
-			#	self.metadata[m[1]] = m[2]
+			stmt.comment = command[idx:]
 			command = command[0:idx].strip()
 		## detect unterminated round bracket comments, just in case
 		idx = command.find('(')
 		if idx >= 0:
-			self.warn("Stripping unterminated round-bracket comment")
+			stmt.unterminated = True
 			command = command[0:idx].strip()
-		
-		# TODO strip logical line number & checksum
-		
-		# If line is a variable calculation, update the variable
-		if self.is_variable_calc(command):
-			self.update_variable(command)
+		command = command.strip()
+
+		# strip logical line number, which doubles as GOTO label
+		# TODO strip checksum
+		m = re.match(r"N(\d+)\s*", command)
+		if m:
+			stmt.label = int(m.group(1))
+			command = command[m.end():]
+		stmt.command = command
 
-		if self.is_tool_line(command):
-			self.update_current_tool(command)
+		# the same text compiles to the same tokens
+		cached = self.line_cache.get(command)
+		if cached is not None:
+			stmt.sync, stmt.assignment, stmt.words, stmt.tail, stmt.feed = \
+				cached.sync, cached.assignment, cached.words, cached.tail, cached.feed
+			return stmt
+
+		# control flow
+		flat = command.replace(" ", "")
+		m = re.match(r"WHILE(\[.*\])DO(\d+)$", flat) or re.match(r"()DO(\d+)$", flat)
+		if m:
+			stmt.control = "while"
+			stmt.condition = self.compileCondition(stmt, m.group(1)) if m.group(1) else None
+			stmt.loop = int(m.group(2))
+			return stmt
+		m = re.match(r"END(\d+)$", flat)
+		if m:
+			stmt.control = "end"
+			stmt.loop = int(m.group(1))
+			return stmt
+		m = re.match(r"(?:IF(\[.*\]))?GOTO(.+)$", flat)
+		if m:
+			stmt.control = "if" if m.group(1) else "goto"
+			stmt.condition = self.compileCondition(stmt, m.group(1)) if m.group(1) else None
+			stmt.goto = self.compileCondition(stmt, m.group(2))
+			if stmt.goto is NEVER:
+				# no target to jump to, the line does nothing
+				stmt.control = None
+			return stmt
+		m = re.match(r"IF(\[.*\])THEN(.+)$", flat)
+		if m:
+			stmt.control = "if"
+			stmt.condition = self.compileCondition(stmt, m.group(1))
+			stmt.then = self.compileLine(lineNb, m.group(2))
+			return stmt
+
+		# channel synchronisation, e.g. '!2L10': wait for $2 to reach its '!1L10'
+		m = re.match(r"!(\d)L(\d+)$", flat)
+		if m:
+			stmt.sync = (int(m.group(1)), int(m.group(2)))
+		else:
+			self.compileCommand(stmt, command)
+		self.line_cache.add(command, stmt)
+		return stmt
+
+	def compileCommand(self, stmt, command):
+		# If line is a variable assignment, remember target & expression
+		m = re.match(r"#(\d+)=(.*)", command)
+		if m:
+			stmt.assignment = (int(m.group(1)), self.template(m.group(2)))
+			return
 
 		# code is first word, then args
 		splits = re.split(r"([A-z][^A-Z]+)", command)
-		splits = [s.strip() for s in splits if len(s) > 0]
-		comm = splits
-		
-		if len(comm) > 0:
-			if comm[0][0] == 'G':
-				code = comm[0] if (len(comm)>0) else None
-				args = comm[1:] if (len(comm)>1) else None
-			elif comm[0][0] == '$' or comm[0][0] == 'T':
-				code = None
-				args = None
-				self.current_type = None
-			else:
-				code = self.current_type
-				args = comm
+		words = [s.strip() for s in splits if len(s) > 0]
+		feed = [word for word in words if word[0] in "FS" or word in FEED_CODES]
+		if feed:
+			stmt.feed = feed
+			words = [word for word in words if not (word[0] in "FS" or word in FEED_CODES)]
+		stmt.words = Arguments(words)
+		if len(words) > 1:
+			stmt.tail = Arguments(words[1:])
+
+	def runProgram(self, program):
+		statements = program.statements
+		# iterations of the loops & backwards jumps currently active
+		counts = {}
+		pc = 0
+		while pc < len(statements):
+			stmt = statements[pc]
+			pc += 1
+			if stmt.control is None:
+				self.executeStatement(stmt)
+				continue
+			self.lineNb = stmt.lineNb
+			self.line = stmt.line
+			if stmt.control == "while":
+				if stmt.condition is None or self.condition(stmt.condition):
+					counts[pc] = counts.get(pc, 0) + 1
+					if counts[pc] <= self.max_loop_iterations:
+						continue
+					self.warn("Loop DO%d stopped after %d iterations" % (stmt.loop, self.max_loop_iterations))
+				counts.pop(pc, None)
+				pc = stmt.target
+			elif stmt.control == "end":
+				pc = stmt.target
+			elif stmt.condition is None or self.condition(stmt.condition):
+				if stmt.then is not None:
+					self.executeStatement(stmt.then)
+					continue
+				target = stmt.target
+				if target is None:
+					label = self.condition(stmt.goto)
+					if label is None:
+						# reported, the jump is skipped
+						continue
+					target = program.labels.get(int(label))
+				if target is None:
+					self.warn("GOTO target not found, stopping")
+					break
+				if target < pc:
+					counts[pc] = counts.get(pc, 0) + 1
+					if counts[pc] > self.max_loop_iterations:
+						self.warn("GOTO stopped after %d backward jumps" % self.max_loop_iterations)
+						counts.pop(pc)
+						continue
+				pc = target
+
+	def evaluate(self, code):
+		try:
+			return eval(code, self.namespace)
+		except CONDITION_ERRORS as e:
+			raise ExpressionError(str(e))
+
+	def compileCondition(self, stmt, text):
+		# a condition or GOTO target; NEVER, with a warning, for text that does not compile
+		try:
+			return compile_expression(text)
+		except (SyntaxError, ValueError, KeyError) as e:
+			self.lineNb, self.line = stmt.lineNb, stmt.line
+			self.warn("Cannot compile '%s': %s" % (text, e))
+			return NEVER
+
+	def template(self, text):
+		template = self.templates.get(text)
+		if template is None:
+			template = self.templates[text] = ArgumentTemplate(text)
+		return template
+
+	def parseLine(self):
+		self.executeStatement(self.compileLine(self.lineNb, self.line))
+
+	def executeStatement(self, stmt):
+		self.lineNb = stmt.lineNb
+		self.line = stmt.line
+		if stmt.comment:
+			self.parseComment(stmt.comment)
+		if stmt.unterminated:
+			self.warn("Stripping unterminated round-bracket comment")
+		if stmt.control is not None:
+			self.warn("Control statement outside of a compiled program")
+			return
+		if stmt.assignment:
+			self.set_variable(*stmt.assignment)
+			return
+		if stmt.sync:
+			self.model.addSync(*stmt.sync)
+			return
+		if stmt.feed:
+			# 'G50 S4000' limits the spindle speed rather than setting it
+			self.set_feed(stmt.feed, limit=stmt.words[:1] == ["G50"])
+
+		comm = stmt.words
+		if len(comm) == 0:
+			return
+
+		if self.is_tool_line(stmt.command):
+			self.update_current_tool(stmt.command)
+
+		if comm[0][0] == 'G':
+			code = comm[0]
+			args = stmt.tail
+		elif comm[0][0] == '$' or comm[0][0] == 'T':
+			code = None
+			if comm[0][0] == '$':
+				self.var_multiplier = 10000 if comm[0] == "$0" else 1
+			self.current_type = None
+		else:
+			code = self.current_type
+			args = comm
 		
 		if code:
 			if hasattr(self, "parse_"+code):
@@ -117,35 +571,47 @@ class GcodeParser:
 				getattr(self, "parse_"+code)(args, tool=self.current_tool)
 			else:
 				self.warn("Unknown code '%s'"%code)
+
+	def parseComment(self, command):
+		m = []
+		if preg_match(r'TYPE:\s*(\w+)',command,m):
+			self.current_type = m[1].lower()
+		elif preg_match(r'; (skirt|perimeter|infill|support)',command,m):
+			self.current_type = m[1]
+		elif not self.layer_count and re.search(r'LAYER_COUNT:',command):
+			self.layer_count = 1
+		elif preg_match(r'LAYER:\s*(\d+)',command,m):   # -- we have actual LAYER: counter! let's use it
+			self.layer_count = 1
+			self.layer_current = int(m[1])
+		#elif preg_match(r'; (\w+):\s*"?(\d+)"?',command,m): 
+		#	self.metadata[m[1]] = m[2]
 		
 	def parseArgs(self, args):
+		parsed = getattr(args, "parsed", None)
+		if parsed is not None:
+			# the words have constant values, worked out before
+			self.line_cache.replays += 1
+			return dict(parsed)
 		dic = {}
+		constant = True
 		if args:
 			for bit in args:
-				if "#" in bit:
-					bit = self.sub_variable_string(bit)
-				letter = bit[0]
+				template = self.template(bit[1:])
 				try:
-					arg_string = bit[1:]
-					if self.is_calc_arg(arg_string):
-						coord = self.parse_calc(arg_string)
-					else:
-						coord = float(arg_string)
-				except ValueError:
-					coord = 1
-				dic[letter] = coord
+					dic[bit[0]] = template.evaluate(self.namespace)
+				except ExpressionError as e:
+					self.warn(str(e))
+					dic[bit[0]] = 1
+				constant = constant and template.constant is not None
+		if constant and isinstance(args, Arguments):
+			args.parsed = dict(dic)
 		return dic
 
 	def is_calc_arg(self, arg_string):
 		return re.search(r"-?\d*\.\d*[+-/*]\d*\.\d*", arg_string)
 	
 	def sub_variable_string(self, var_string):
-		var = re.match(r".*#(\d+)", var_string)
-		if var:
-			replacement = self.variables.get(var.group(1), 0.0)
-		else:
-			replacement = 0.0
-		return re.sub(r"#\d+", str(replacement), var_string)
+		return re.sub(r"#(\d+)", lambda m: str(self.variables.get(m.group(1))), var_string)
 
 	def parse_calc(self, calc_string):
 		subbed_string = calc_string.replace("[", "(").replace("]", ")")
@@ -156,31 +622,67 @@ class GcodeParser:
 
 	def update_variable(self, code_line):
 		match = re.match(r"#(\d+)=(.*)", code_line)
-		calc_string = match.group(2)
-		if "#" in calc_string:
-			calc_string = self.sub_variable_string(calc_string)
-		new_value = self.parse_calc(calc_string)
-		self.variables[match.group(1)] = new_value
+		self.set_variable(match.group(1), self.template(match.group(2)))
+
+	def value(self, template):
+		# 1 for an expression that cannot be evaluated, with a warning
+		try:
+			return template.evaluate(self.namespace)
+		except ExpressionError as e:
+			self.warn(str(e))
+			return 1
+
+	def condition(self, code):
+		# a condition or computed GOTO target; None, with a warning, when it cannot be evaluated
+		try:
+			return self.evaluate(code)
+		except ExpressionError as e:
+			self.warn("Cannot evaluate control statement: %s" % e)
+			return None
+
+	def set_variable(self, number, template):
+		value = self.value(template)
+		if template.literal:
+			value /= self.var_multiplier
+		self.assign(number, value)
+
+	def assign(self, number, value):
+		try:
+			self.variables[number] = value
+		except IndexError:
+			self.warn("Variable #%s out of range" % number)
+
+	def set_feed(self, words, limit=False):
+		for word in words:
+			if word in FEED_CODES:
+				setattr(self, *FEED_CODES[word])
+				continue
+			if word[0] == "S" and limit:
+				continue
+			# 'S1=2000': speed of spindle 1
+			value = self.value(self.template(word[1:].split("=")[-1]))
+			if word[0] == "F":
+				self.feed = value
+			else:
+				self.spindle = value
+		self.model.addFeed(self.feed, self.per_rev, self.spindle, self.css)
 
 	def is_tool_line(self, command):
 		return command[0] == "T"
 
 	def update_current_tool(self, command: str):
-		if command == "T0":
-			self.current_tool = None
-		else:
-			tool_number = command[1:]
-			if len(tool_number) == 3:
-				self.current_tool = "T" + tool_number[0]
-			else:
-				self.current_tool = "T" + tool_number[:2]
+		if not is_tool_number(command):
+			# a macro tool word is not evaluated, the moves stay with the current tool
+			self.warn("Tool word is not a tool number, current tool kept")
+			return
+		self.current_tool = selected_tool(command)
 
 
 
 	def parse_G0(self, args, tool=None):
 		# G0: Rapid move
 		# same as a controlled move for us (& reprap FW)
-		self.parse_G1(args, "G0")
+		self.parse_G1(args, "G0", tool=tool)
 		
 	def parse_G1(self, args, type="G1", tool=None):
 		# G1: Controlled move
@@ -194,36 +696,77 @@ class GcodeParser:
 		# G3: Arc move
 		self.model.do_G2(self.parseArgs(args), type, tool=tool)
 		
-	def parse_G20(self, args):
+	def parse_G32(self, args, type="G32", tool=None):
+		# G32: Thread cutting, one feed move synchronised to the spindle per pass
+		self.model.do_G1(self.parseArgs(args), type, tool=tool)
+
+	def parse_G80(self, args, tool=None):
+		# G80: Canned cycle cancel
+		self.cycle = {}
+
+	def parse_G83(self, args, tool=None):
+		# G83: Face (Z axis) peck drilling cycle
+		self.parse_cycle(args, 2, tool=tool)
+
+	def parse_G87(self, args, tool=None):
+		# G87: Side (X axis) peck drilling cycle
+		self.parse_cycle(args, 0, tool=tool)
+
+	def parse_cycle(self, args, axis, tool=None):
+		words = self.parseArgs(args)
+		# Q without decimal point is given in micrometers
+		for bit in args or []:
+			if bit[0] == 'Q' and '.' not in bit and '#' not in bit:
+				words['Q'] = words['Q'] / 1000
+		# drilling axis, depths and feed are modal, hole positions are not
+		drill_axis = "XYZ"[axis]
+		position = {}
+		for letter, value in words.items():
+			if letter in (drill_axis, "UVW"[axis]):
+				self.cycle.pop(drill_axis, None)
+				self.cycle.pop("UVW"[axis], None)
+				self.cycle[letter] = value
+			elif letter in "XYZUVW":
+				position[letter] = value
+			elif letter in "CH":
+				pass
+			else:
+				self.cycle[letter] = value
+		# blocks without any axis word do not trigger the cycle
+		if len(position) == 0 and not any(letter in words for letter in "XYZUVWCH"):
+			return
+		self.model.do_peck_cycle({**self.cycle, **position}, axis, tool=tool)
+
+	def parse_G20(self, args, tool=None):
 		# G20: Set Units to Inches
 		self.error("Unsupported & incompatible: G20: Set Units to Inches")
 		
-	def parse_G21(self, args):
+	def parse_G21(self, args, tool=None):
 		# G21: Set Units to Millimeters
 		# Default, nothing to do
 		pass
 		
-	def parse_G28(self, args):
+	def parse_G28(self, args, tool=None):
 		# G28: Move to Origin
 		self.model.do_G28(self.parseArgs(args))
 		
-	def parse_G90(self, args):
+	def parse_G90(self, args, tool=None):
 		# G90: Set to Absolute Positioning
 		self.model.setRelative(False)
 		
-	def parse_G91(self, args):
+	def parse_G91(self, args, tool=None):
 		# G91: Set to Relative Positioning
 		self.model.setRelative(True)
 		
-	def parse_G92(self, args):
+	def parse_G92(self, args, tool=None):
 		# G92: Set Position
 		self.model.do_G92(self.parseArgs(args))
 		
 	def warn(self, msg):
-		print("[WARN] Line %d: %s (Text:'%s')" % (self.lineNb, msg, self.line))
+		self.diagnostics.add("WARN", msg, self.lineNb, self.line.strip())
 		
 	def error(self, msg):
-		print("[ERROR] Line %d: %s (Text:'%s')" % (self.lineNb, msg, self.line))
+		self.diagnostics.add("ERROR", msg, self.lineNb, self.line.strip())
 		raise Exception("[ERROR] Line %d: %s (Text:'%s')" % (self.lineNb, msg, self.line))
 
 class BBox(object):
@@ -232,6 +775,12 @@ class BBox(object):
 		self.xmin = self.xmax = coords["X"]
 		self.ymin = self.ymax = coords["Y"]
 		self.zmin = self.zmax = coords["Z"]
+
+	@classmethod
+	def fromRange(cls, mins, maxs):
+		bbox = cls({"X": float(mins[0]), "Y": float(mins[1]), "Z": float(mins[2])})
+		bbox.extend({"X": float(maxs[0]), "Y": float(maxs[1]), "Z": float(maxs[2])})
+		return bbox
 		
 	def dx(self):
 		return self.xmax - self.xmin
@@ -309,8 +858,22 @@ class GcodeModel:
 					**{f"T{n}":"back" for n in range(31,35)}}
 		# if true, args for move (G1) are given relatively (default: absolute)
 		self.isRelative = False
-		# the segments
-		self.segments = []
+		# the segments, stored column-wise; `segments` gives per-segment views
+		self.columns = SegmentColumns()
+		self.lines = {}
+		self.keep_lines = True
+		# tokens -> lines, see search()
+		self.index = None
+		# segment extents per axis, see section()
+		self.sections = None
+		self.inLayerIdx = None
+		self.distances = None
+		# waits for other channels: (partner channel, wait id, segment index)
+		self.syncs = []
+		# feed state from a segment on, see addFeed() & src/cycletime.py
+		self.feeds = []
+		# rapid approach stops this far short of the previous peck depth
+		self.peck_clearance = 0.2
 		self.layers = None
 		self.distance = None
 		self.extrudate = None
@@ -334,11 +897,35 @@ class GcodeModel:
 			"Y": self.offset["Y"] + coords["Y"],
 			"Z": self.offset["Z"] + coords["Z"],
 		}
-		seg = Segment(type, absolute, self.parser.lineNb, self.parser.line, tool=tool)
-		self.addSegment(seg)
+		self.addSegment(type, absolute, tool=tool)
 		# update model coords
 		self.position = coords
 
+	def do_peck_cycle(self, args, axis, tool=None):
+		# G83/G87: peck drilling along `axis`, expanded in one batch
+		coords = dict(self.position)
+		bottom = dict(self.position)
+		drill_axis = "XYZ"[axis]
+		for letter, value in args.items():
+			if letter in "XYZ":
+				target = coords if letter != drill_axis else bottom
+				target[letter] = value
+			elif letter in self.relative:
+				target = coords if self.relative[letter] != drill_axis else bottom
+				target[self.relative[letter]] += value
+		# R, Q and the clearance are radius values, X is programmed as diameter
+		scale = 2.0 if axis == 0 else 1.0
+		start = [coords["X"], coords["Y"], coords["Z"]]
+		r_level = start[axis] + args.get("R", 0.0) * scale
+		points, types = peck_drill(start, axis, r_level, bottom[drill_axis],
+			args.get("Q", 0.0) * scale, self.peck_clearance * scale)
+		# rapid to the hole position first
+		points = np.vstack(([start], points))
+		types = np.concatenate(([types[0]], types))
+		points += [self.offset["X"], self.offset["Y"], self.offset["Z"]]
+		self.addSegments(types, points, tool=tool)
+		self.position = coords
+
 	def do_G2(self, args, type, tool=None):
 		# G2 & G3: Arc move
 		coords = dict(self.position)           # -- clone previous coords
@@ -384,8 +971,7 @@ class GcodeModel:
 					"F": coords["F"],	# no feedrate offset
 					"E": self.offset["E"] + coords["E"]
 				}
-				seg = Segment(type, absolute, self.parser.lineNb, self.parser.line, tool=tool)
-				self.addSegment(seg)
+				self.addSegment(type, absolute, tool=tool)
 				# update model coords
 				self.position = coords
 		
@@ -412,11 +998,37 @@ class GcodeModel:
 	def setRelative(self, isRelative):
 		self.isRelative = isRelative
 		
-	def addSegment(self, segment):
-		if self.parser.layer_count:
-			segment.layerIdx = self.parser.layer_current
-		self.segments.append(segment)
-		#print segment
+	@property
+	def segments(self):
+		return SegmentList(self, 0, None)
+
+	@property
+	def diagnostics(self):
+		return self.parser.diagnostics
+
+	def addSegment(self, type, coords, tool=None):
+		layerIdx = self.parser.layer_current if self.parser.layer_count else -1
+		self.columns.append(SEGMENT_TYPES.index(type), coords["X"], coords["Y"], coords["Z"],
+			tool_number(tool), self.parser.lineNb, layerIdx)
+		if self.keep_lines:
+			self.lines[self.parser.lineNb] = self.parser.line
+
+	def addSync(self, channel, wait):
+		self.syncs.append((channel, wait, self.columns.count))
+
+	def addFeed(self, feed, per_rev, spindle, css):
+		# (segment index, F, per revolution, S, constant surface speed)
+		state = (self.columns.count, feed, per_rev, spindle, css)
+		if self.feeds and self.feeds[-1][0] == state[0]:
+			self.feeds[-1] = state
+		else:
+			self.feeds.append(state)
+
+	def addSegments(self, types, points, tool=None):
+		layerIdx = self.parser.layer_current if self.parser.layer_count else -1
+		self.columns.extend(types, points, tool_number(tool), self.parser.lineNb, layerIdx)
+		if self.keep_lines:
+			self.lines[self.parser.lineNb] = self.parser.line
 		
 	def warn(self, msg):
 		self.parser.warn(msg)
@@ -426,24 +1038,23 @@ class GcodeModel:
 		
 		
 	def classifySegments(self):
-		# apply intelligence, to classify segment layers
-			
-		# first layer at Z=0
-		currentLayerIdx = 0
-		currentLayerTool = self.segments[0].tool
-		currentInLayerIdx = 0
-
-		for seg in self.segments:
-			if seg.tool != currentLayerTool:
-				currentLayerTool = seg.tool
-				currentLayerIdx += 1
-				currentInLayerIdx = 0
-			
-			if not self.parser.layer_count:
-				seg.layerIdx = currentLayerIdx
-				seg.inLayerIdx = currentInLayerIdx
-				currentInLayerIdx += 1
-			
+		# apply intelligence, to classify segment layers: a new layer on every tool change
+		n = self.columns.count
+		if n == 0 or self.parser.layer_count:
+			return
+		self.inLayerIdx = self.columns.allocate(n, np.int64)
+		# carried from chunk to chunk: the current layer, its first segment and tool
+		layer, first, previous = 0, 0, self.columns.tool[0]
+		for lo, hi in chunks(0, n):
+			tools = self.columns.tool[lo:hi]
+			change = np.empty(hi - lo, dtype=bool)
+			change[0] = tools[0] != previous
+			change[1:] = tools[1:] != tools[:-1]
+			changes = np.cumsum(change)
+			layerFirst = np.concatenate(([first], np.flatnonzero(change) + lo))
+			self.columns.layerIdx[lo:hi] = layer + changes
+			self.inLayerIdx[lo:hi] = np.arange(lo, hi) - layerFirst[changes]
+			layer, first, previous = layer + changes[-1], layerFirst[-1], tools[-1]
 			
 	def splitLayers(self):
 		# split segments into previously detected layers
@@ -451,22 +1062,17 @@ class GcodeModel:
 		# init layer store
 		self.layers = []
 		
-		currentLayerIdx = -1
-		
-		# for all segments
-		for seg in self.segments:
-			# next layer
-			if currentLayerIdx != seg.layerIdx:
-				coords = self.tool_position_points[self.tool_dict.get(seg.tool,"T1")]
-				layer = Layer(seg.tool)
-				layer.start = coords
-				self.layers.append(layer)
-				currentLayerIdx = seg.layerIdx
-			
-			layer.segments.append(seg)
-			
-			# execute segment
-			coords = seg.coords
+		n = self.columns.count
+		layerIdx = self.columns.layerIdx
+		firsts = [np.flatnonzero(layerIdx[lo:hi] != layerIdx[lo - 1:hi - 1]) + lo for lo, hi in chunks(1, n)]
+		bounds = np.concatenate([[0]] + firsts + [[n]]) if n else []
+		
+		# for all layers
+		for first, last in zip(bounds[:-1], bounds[1:]):
+			tool = tool_name(int(self.columns.tool[first]))
+			layer = Layer(tool, self, int(first), int(last - first))
+			layer.start = self.tool_position_points[self.tool_dict.get(tool, "gang")]
+			self.layers.append(layer)
 		
 		self.topLayer = len(self.layers)-1
 		
@@ -476,55 +1082,80 @@ class GcodeModel:
 		
 		# init model bbox
 		self.bbox = None
-		
-		# extender helper
-		def extend(bbox, coords):
-			if bbox is None:
-				return BBox(coords)
-			else:
-				bbox.extend(coords)
-				return bbox
-		
-		# for all layers
-		for layer in self.layers:
-			# start at layer start
-			coords = layer.start
-			
-			# init distances and extrudate
-			layer.distance = 0
-			#layer.range = { }
-			#for k in ['X','Y','Z']: layer.range[k] = { }
-			layer.bbox = extend(layer.bbox, coords)
-
-			# include start point
-			self.bbox = extend(self.bbox, coords)
-
-			# for all segments
-			for seg in layer.segments:
-				# calc XYZ distance
-				d  = (seg.coords["X"]-coords["X"])**2
-				d += (seg.coords["Y"]-coords["Y"])**2
-				d += (seg.coords["Z"]-coords["Z"])**2
-				seg.distance = math.sqrt(d)
-
-				#for k in ['X','Y','Z']:
-				#	if layer.range[k].max < coords[k]: layer.range[k].max = coords[k]
-				#	if layer.range[k].min > coords[k]: layer.range[k].min = coords[k]
-	
-				# accumulate layer metrics
-				layer.distance += seg.distance
-				
-				# execute segment
-				coords = seg.coords
-				
-				# include end point
-				extend(self.bbox, coords)
 
-			layer.end = coords			
+		n = self.columns.count
+		if n == 0 or not self.layers:
+			return
+		coords = self.columns.coords
+		firsts, starts = self.layerStarts()
+		self.distances = self.columns.allocate(n, np.float64)
+
+		# accumulate layer metrics, chunk by chunk
+		distances = np.zeros(len(firsts))
+		mins, maxs = starts.copy(), starts.copy()
+		for lo, hi in chunks(0, n):
+			points = coords[lo:hi]
+			self.distances[lo:hi] = np.sqrt(((points - self.segmentStarts(lo, hi))**2).sum(axis=1))
+			# the layers in this chunk and where each begins in it
+			a = np.searchsorted(firsts, lo, side='right') - 1
+			b = np.searchsorted(firsts, hi, side='left')
+			bounds = np.maximum(firsts[a:b], lo) - lo
+			distances[a:b] += np.add.reduceat(self.distances[lo:hi], bounds)
+			mins[a:b] = np.minimum(mins[a:b], np.minimum.reduceat(points, bounds))
+			maxs[a:b] = np.maximum(maxs[a:b], np.maximum.reduceat(points, bounds))
+		for i, layer in enumerate(self.layers):
+			layer.distance = float(distances[i])
+			layer.bbox = BBox.fromRange(mins[i], maxs[i])
+			x, y, z = coords[layer.first + layer.count - 1]
+			layer.end = {"X": float(x), "Y": float(y), "Z": float(z)}
 
-			# accumulate total metrics
-			self.distance += layer.distance
+		# accumulate total metrics
+		self.distance = float(distances.sum())
+		self.bbox = BBox.fromRange(mins.min(axis=0), maxs.max(axis=0))
 		
+	def layerStarts(self):
+		# first segment & start point of every layer
+		firsts = np.array([layer.first for layer in self.layers], dtype=np.int64)
+		starts = np.array([[layer.start["X"], layer.start["Y"], layer.start["Z"]] for layer in self.layers]).reshape(-1, 3)
+		return firsts, starts
+
+	def segmentStarts(self, first=0, last=None):
+		# every segment starts at the previous end point, or at its layer start
+		last = self.columns.count if last is None else last
+		coords = self.columns.coords
+		previous = np.empty((last - first, 3), dtype=coords.dtype)
+		if last == first:
+			return previous
+		previous[1:] = coords[first:last - 1]
+		if first > 0:
+			previous[0] = coords[first - 1]
+		firsts, starts = self.layerStarts()
+		inRange = (firsts >= first) & (firsts < last)
+		previous[firsts[inRange] - first] = starts[inRange]
+		return previous
+
+	def segmentStartsAt(self, indices):
+		# start points of the given segments only, see segmentStarts()
+		indices = np.asarray(indices, dtype=np.int64)
+		previous = np.array(self.columns.coords[np.maximum(indices - 1, 0)])
+		firsts, starts = self.layerStarts()
+		at = np.minimum(np.searchsorted(firsts, indices), max(len(firsts) - 1, 0))
+		isFirst = (firsts[at] == indices) if len(firsts) else np.zeros(len(indices), dtype=bool)
+		previous[isFirst] = starts[at[isFirst]]
+		return previous
+
+	def section(self, axis, value):
+		"""Segments crossing the plane `axis` = `value`, e.g. ('Z', -2.5), and where (see src/section.py)."""
+		if self.sections is None or self.sections.count != self.columns.count:
+			self.sections = SectionIndex(self)
+		return self.sections.query(axis, value)
+
+	def search(self, text):
+		"""Lines & segments matching a query such as '#814', 'G1 Z<-20' or 'T21' (see src/search.py)."""
+		if self.index is None:
+			raise ValueError("the program was parsed without a search index")
+		return self.index.query(self, text)
+
 	def postProcess(self):
 		self.classifySegments()
 		self.splitLayers()
@@ -532,29 +1163,169 @@ class GcodeModel:
 
 	def __str__(self):
 		return "<GcodeModel: len(segments)=%d, len(layers)=%d, distance=%f, bbox=%s>"%(len(self.segments), len(self.layers), self.distance, self.bbox)
+
+class SegmentColumns:
+	"""Growable segment storage, one NumPy array per attribute.
+
+	With a `directory`, the arrays are memory-mapped files in a scratch
+	directory below it (see src/mapped.py), for programs larger than RAM.
+	An integer `coords_dtype` stores the coordinates as fixed-point counts of
+	1/`coords_scale` mm (see src/fixedpoint.py); they still read as mm.
+	"""
+
+	fields = ("coords", "type", "tool", "lineNb", "layerIdx")
+
+	def __init__(self, capacity=1024, coords_dtype=np.float64, directory=None, coords_scale=DEFAULT_SCALE):
+		self.count = 0
+		self.store = None if directory is None else MappedStore(directory)
+		self.coords = self.allocate((capacity, 3), coords_dtype)
+		if np.issubdtype(coords_dtype, np.integer):
+			self.coords = FixedPointArray(self.coords, coords_scale)
+		self.type = self.allocate(capacity, np.int8)
+		self.tool = self.allocate(capacity, np.int16)
+		self.lineNb = self.allocate(capacity, np.int32)
+		self.layerIdx = self.allocate(capacity, np.int32)
+
+	def __len__(self):
+		return self.count
+
+	@property
+	def mapped(self):
+		return self.store is not None
+
+	def allocate(self, shape, dtype):
+		"""An array for per-segment data, mapped like the columns."""
+		if self.store is None:
+			return np.empty(shape, dtype=dtype)
+		return self.store.array(shape, dtype)
+
+	def reserve(self, n):
+		needed = self.count + n
+		capacity = len(self.type)
+		if needed <= capacity:
+			return
+		capacity = max(needed, capacity * 2)
+		for name in self.fields:
+			column = getattr(self, name)
+			old = column.raw if isinstance(column, FixedPointArray) else column
+			if self.store is not None:
+				new = self.store.resize(old, capacity)
+			else:
+				new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+				new[:self.count] = old[:self.count]
+			setattr(self, name, FixedPointArray(new, column.scale) if old is not column else new)
+
+	def append(self, type, x, y, z, tool, lineNb, layerIdx):
+		self.reserve(1)
+		i = self.count
+		self.coords[i] = (x, y, z)
+		self.type[i] = type
+		self.tool[i] = tool
+		self.lineNb[i] = lineNb
+		self.layerIdx[i] = layerIdx
+		self.count += 1
+
+	def extend(self, types, points, tool, lineNb, layerIdx):
+		n = len(points)
+		self.reserve(n)
+		i, j = self.count, self.count + n
+		self.coords[i:j] = points
+		self.type[i:j] = types
+		self.tool[i:j] = tool
+		self.lineNb[i:j] = lineNb
+		self.layerIdx[i:j] = layerIdx
+		self.count = j
+
+class SegmentList:
+	"""Sequence of Segment views over a range of the model's segment columns."""
+
+	def __init__(self, model, start, stop):
+		self.model = model
+		self.start = start
+		# None: up to the current end of the columns
+		self.stop = stop
+
+	def __len__(self):
+		stop = self.model.columns.count if self.stop is None else self.stop
+		return stop - self.start
+
+	def __getitem__(self, i):
+		n = len(self)
+		if i < 0:
+			i += n
+		if not 0 <= i < n:
+			raise IndexError("segment index out of range")
+		return Segment(self.model, self.start + i)
+
+	def __iter__(self):
+		for i in range(self.start, self.start + len(self)):
+			yield Segment(self.model, i)
 	
 class Segment:
-	def __init__(self, type, coords, lineNb, line, tool=None):
-		self.type = type
-		self.coords = coords
-		self.lineNb = lineNb
-		self.line = line
-		self.tool = tool
-		self.layerIdx = None
-		self.inLayerIdx = None
-		self.distance = None
+	"""View of one row of the model's segment columns."""
+	__slots__ = ("model", "index")
+
+	def __init__(self, model, index):
+		self.model = model
+		self.index = index
+
+	@property
+	def type(self):
+		return SEGMENT_TYPES[self.model.columns.type[self.index]]
+
+	@property
+	def coords(self):
+		x, y, z = self.model.columns.coords[self.index]
+		return {"X": float(x), "Y": float(y), "Z": float(z)}
+
+	@property
+	def lineNb(self):
+		return int(self.model.columns.lineNb[self.index])
+
+	@property
+	def line(self):
+		return self.model.lines.get(self.lineNb, "")
+
+	@property
+	def tool(self):
+		return tool_name(int(self.model.columns.tool[self.index]))
+
+	@property
+	def layerIdx(self):
+		layerIdx = int(self.model.columns.layerIdx[self.index])
+		return layerIdx if layerIdx >= 0 else None
+
+	@property
+	def inLayerIdx(self):
+		if self.model.inLayerIdx is None:
+			return None
+		return int(self.model.inLayerIdx[self.index])
+
+	@property
+	def distance(self):
+		if self.model.distances is None:
+			return None
+		return float(self.model.distances[self.index])
+
 	def __str__(self):
 		return "<Segment: type=%s, lineNb=%d, tool=%s, layerIdx=%d, distance=%f>"%(self.type, self.lineNb, self.tool, self.layerIdx, self.distance)
 		
 class Layer:
-	def __init__(self, tool):
+	def __init__(self, tool, model=None, first=0, count=0):
 		self.tool = tool
-		self.segments = []
+		# segments of the layer: a range of the model's segment columns
+		self.model = model
+		self.first = first
+		self.count = count
 		self.distance = None
 		self.bbox = None
 
+	@property
+	def segments(self):
+		return SegmentList(self.model, self.first, self.first + self.count)
+
 	def __str__(self):
-		return "<Layer: Z=%f, len(segments)=%d, distance=%f>"%(self.Z, len(self.segments), self.distance)
+		return "<Layer: tool=%s, len(segments)=%d, distance=%f>"%(self.tool, len(self.segments), self.distance)
 		
 		
 if __name__ == '__main__':
@@ -565,3 +1336,4 @@ if __name__ == '__main__':
 	model = parser.parseCode(code)
 	model.postProcess()
 	print(model)
+	model.diagnostics.report()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# Out-of-core storage: arrays backed by files in a scratch directory and mapped
+# into memory, for programs larger than RAM. The OS pages in only the parts in
+# use (the rows being parsed or post-processed, the layers being uploaded) and
+# writes them back instead of swapping. Work over whole columns goes through
+# `chunks()` so that no temporary is as large as a column.
+
+import os
+import shutil
+import weakref
+import tempfile
+
+import numpy as np
+
+# rows processed at a time
+CHUNK = 1 << 20
+
+def chunks(first, last, size=None):
+	"""(lo, hi) row ranges of at most `size` (CHUNK) rows covering first..last."""
+	size = size or CHUNK
+	for lo in range(first, last, size):
+		yield lo, min(lo + size, last)
+
+def chunk_rows(rows, lo, hi):
+	"""Entries lo..hi of a row selection, a slice or an index array."""
+	if isinstance(rows, slice):
+		return slice(rows.start + lo, rows.start + hi)
+	return rows[lo:hi]
+
+class MappedStore:
+	"""Memory-mapped arrays in a private directory, removed with the store."""
+
+	def __init__(self, directory=None):
+		self.path = tempfile.mkdtemp(prefix="yagv-", dir=directory)
+		self.files = 0
+		# removed with the store; arrays still mapped keep their pages
+		self.finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+	def array(self, shape, dtype):
+		"""A new zero-filled array, mapped from its own file."""
+		if int(np.prod(shape)) == 0:
+			# a file cannot map zero bytes
+			return np.zeros(shape, dtype=dtype)
+		self.files += 1
+		name = os.path.join(self.path, "%d.bin" % self.files)
+		return np.memmap(name, dtype=dtype, mode="w+", shape=shape)
+
+	def resize(self, array, rows):
+		"""`array` grown to `rows` rows, keeping its content; the file is extended in place."""
+		if not isinstance(array, np.memmap):
+			grown = self.array((rows,) + array.shape[1:], array.dtype)
+			grown[:len(array)] = array
+			return grown
+		shape = (rows,) + array.shape[1:]
+		array.flush()
+		os.truncate(array.filename, int(np.prod(shape)) * array.dtype.itemsize)
+		return np.memmap(array.filename, dtype=array.dtype, mode="r+", shape=shape)
+
+	def __str__(self):
+		return "<MappedStore: %s, %d files>" % (self.path, self.files)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+# Memory accounting: where the bytes of a loaded program go, per load stage
+# (tracemalloc & RSS) and per data structure, and a budget mode choosing
+# cheaper representations before a large program is loaded.
+
+import os
+import sys
+import math
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+MB = 1 << 20
+
+def rss():
+	"""Resident set size of this process in bytes, 0 where it cannot be read."""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, AttributeError):
+		pass
+	try:
+		import resource
+		# peak rather than current, in KB on Linux and bytes on macOS
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return peak if sys.platform == "darwin" else peak * 1024
+	except ImportError:
+		return 0
+
+def footprint(obj, seen=None):
+	"""Approximate bytes held by an object: arrays, containers and the strings in them."""
+	if seen is None:
+		seen = set()
+	if id(obj) in seen:
+		return 0
+	seen.add(id(obj))
+	if isinstance(obj, np.ndarray):
+		# a view holds its base alive, which is counted once
+		return obj.nbytes if obj.base is None else footprint(obj.base, seen)
+	size = sys.getsizeof(obj)
+	if isinstance(obj, dict):
+		size += sum(footprint(k, seen) + footprint(v, seen) for k, v in obj.items())
+	elif isinstance(obj, (list, tuple, set)):
+		size += sum(footprint(item, seen) for item in obj)
+	return size
+
+def model_footprint(model):
+	"""Bytes per data structure of a model, as a dict name -> bytes."""
+	sizes = {}
+	def add(name, array):
+		# memory-mapped arrays are file-backed, not counted against RAM by the OS;
+		# fixed-point coordinates are counted by their int32 array
+		mapped = isinstance(getattr(array, "raw", array), np.memmap)
+		sizes[name + (" (mapped)" if mapped else "")] = 0 if array is None else array.nbytes
+	for name in model.columns.fields:
+		add("columns." + name, getattr(model.columns, name))
+	sizes["lines"] = footprint(model.lines)
+	if model.index is not None:
+		sizes["index"] = footprint(model.index.tokens)
+	for name in ("inLayerIdx", "distances"):
+		add(name, getattr(model, name))
+	return sizes
+
+class MemoryProfile:
+	"""Traced allocations and RSS growth of every stage run in `stage(name)`."""
+
+	def __init__(self):
+		self.stages = []
+		self.started = not tracemalloc.is_tracing()
+		if self.started:
+			tracemalloc.start()
+
+	@contextmanager
+	def stage(self, name):
+		before, _ = tracemalloc.get_traced_memory()
+		tracemalloc.reset_peak()
+		rssBefore = rss()
+		try:
+			yield
+		finally:
+			after, peak = tracemalloc.get_traced_memory()
+			self.stages.append((name, after - before, peak - before, rss() - rssBefore))
+
+	def stop(self):
+		if self.started:
+			tracemalloc.stop()
+			self.started = False
+
+	def report(self, segments, structures):
+		"""Lines of text: every stage, then every structure, with bytes per segment."""
+		per = lambda nbytes: nbytes / segments if segments else 0.
+		result = ["%-24s %10s %10s %10s %10s" % ("stage", "kept MB", "peak MB", "rss MB", "B/segment")]
+		for name, kept, peak, grown in self.stages:
+			result.append("%-24s %10.1f %10.1f %10.1f %10.1f" % (name, kept / MB, peak / MB, grown / MB, per(kept)))
+		result.append("%-24s %10s %32s" % ("structure", "MB", "B/segment"))
+		for name, nbytes in sorted(structures.items(), key=lambda item: -item[1]):
+			result.append("%-24s %10.1f %32.1f" % (name, nbytes / MB, per(nbytes)))
+		return result
+
+# estimated bytes per segment of every representation, columns grow by doubling
+COLUMN_BYTES = {"coords": 24, "type": 1, "tool": 2, "lineNb": 4, "layerIdx": 4}
+METRIC_BYTES = 16          # inLayerIdx & distances
+INDEX_BYTES = 16           # search index, about 4 tokens per line
+LINE_BYTES = 110           # dict entry & int key per line kept, the text is counted on its own
+VIEW_BYTES = 3*4 + 2 + 3*4    # per strip vertex: float32 position, tool index, 3 color copies
+
+def estimate(segments, lineBytes, coords_dtype=np.float64, keep_lines=True, lod=1, mapped=False):
+	"""Estimated bytes to load `segments` segments whose source text is `lineBytes` long.
+
+	Memory-mapped columns, metrics and vertex buffers (`mapped`) are paged
+	by the OS and not counted.
+	"""
+	columns = sum(COLUMN_BYTES.values()) - 24 + 3 * np.dtype(coords_dtype).itemsize
+	model = segments * (INDEX_BYTES if mapped else 2 * columns + METRIC_BYTES + INDEX_BYTES)
+	lines = (segments * LINE_BYTES + lineBytes) if keep_lines else 0
+	view = 0 if mapped else segments * VIEW_BYTES / lod
+	return int(model + lines + view)
+
+def choose_representation(code, budget, mapped=False):
+	"""Cheaper representations, in this order, until the estimate for `code` fits `budget` bytes.
+
+	float32 coordinates, then no source lines, then a decimated view
+	(every lod-th segment end drawn). Returns the chosen options and
+	warnings describing them.
+	"""
+	segments = sum(1 for line in code if line.strip())
+	lineBytes = sum(sys.getsizeof(line) for line in code)
+	options = {"coords_dtype": np.float64, "keep_lines": True, "lod": 1}
+	warnings = []
+	needed = estimate(segments, lineBytes, mapped=mapped, **options)
+	if needed <= budget:
+		return options, warnings
+	warnings.append("estimated %.0f MB exceed the memory budget of %.0f MB" % (needed / MB, budget / MB))
+	for name, value, what in (("coords_dtype", np.float32, "float32 coordinates"), ("keep_lines", False, "source lines dropped")):
+		options[name] = value
+		needed = estimate(segments, lineBytes, mapped=mapped, **options)
+		warnings.append("%s: %.0f MB" % (what, needed / MB))
+		if needed <= budget:
+			return options, warnings
+	if mapped:
+		# a decimated view saves nothing that is held in memory
+		warnings.append("the model alone does not fit the budget")
+		return options, warnings
+	# the rest of the budget goes to the view
+	rest = budget - estimate(segments, lineBytes, lod=float("inf"), **{k: options[k] for k in ("coords_dtype", "keep_lines")})
+	options["lod"] = int(math.ceil(segments * VIEW_BYTES / rest)) if rest > 0 else max(segments, 1)
+	needed = estimate(segments, lineBytes, **options)
+	warnings.append("drawing every %d. segment: %.0f MB" % (options["lod"], needed / MB))
+	if needed > budget:
+		warnings.append("the model alone does not fit the budget")
+	return options, warnings
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# Toolpath playback: a cursor over the segments of the whole program, moved
+# forward by the clock at a chosen speed. The viewer draws every layer buffer
+# only up to the cursor with a ranged draw (first/count), so playing costs no
+# vertex uploads, whatever the size of the program.
+
+import numpy as np
+
+# segments per second
+DEFAULT_SPEED = 100.
+MIN_SPEED = 1.
+MAX_SPEED = 1e7
+
+class Playback:
+	"""A cursor over `count` segments, in segments from the start of the program.
+
+	At cursor c the segments before int(c) are done and the tool is a
+	fraction c - int(c) along segment int(c). `advance(dt)` moves it on by
+	`speed` segments per second while playing and stops at the end.
+	"""
+
+	def __init__(self, count, speed=DEFAULT_SPEED):
+		self.count = count
+		self.speed = speed
+		self.cursor = 0.
+		self.playing = False
+
+	def play(self):
+		if self.cursor >= self.count:
+			self.cursor = 0.
+		self.playing = self.count > 0
+
+	def pause(self):
+		self.playing = False
+
+	def toggle(self):
+		if self.playing:
+			self.pause()
+		else:
+			self.play()
+
+	def seek(self, cursor):
+		self.cursor = float(max(0, min(cursor, self.count)))
+
+	def faster(self, factor=2.):
+		self.speed = max(MIN_SPEED, min(self.speed * factor, MAX_SPEED))
+
+	def slower(self, factor=2.):
+		self.faster(1 / factor)
+
+	def advance(self, dt):
+		"""Moves the cursor on by dt seconds of playing; False when it did not move."""
+		if not self.playing:
+			return False
+		self.seek(self.cursor + self.speed * dt)
+		if self.cursor >= self.count:
+			self.playing = False
+		return True
+
+	@property
+	def segment(self):
+		# the segment the tool is on, the last one once the program is done
+		return min(int(self.cursor), self.count - 1)
+
+	@property
+	def fraction(self):
+		return min(self.cursor - self.segment, 1.)
+
+	def position(self, start, end):
+		"""The tool position, given the start and end point of its segment."""
+		start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+		return start + (end - start) * self.fraction
+
+	def __str__(self):
+		return "<Playback: %.1f/%d segments, %g/s, %s>" % (self.cursor, self.count, self.speed,
+			"playing" if self.playing else "paused")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+# Program diff: a program is cut into tool blocks (the layers of splitLayers),
+# every block is hashed together with the parser state it starts from, and
+# only blocks without cached geometry are parsed again.
+
+import re
+import hashlib
+import difflib
+import numpy as np
+from array import array
+from src.gcodeParser import GcodeParser
+
+# segment status in a diff
+UNCHANGED = 0
+ADDED = 1
+CHANGED = 2
+
+def split_blocks(code):
+	"""Splits a program at tool and channel lines into (lines, lineNbs) blocks."""
+	blocks = []
+	lines, lineNbs = [], []
+	for lineNb, line in enumerate(code, 1):
+		command = line.strip()
+		if lines and (re.match(r"T[1-9]", command) or re.match(r"\$\d+$", command)):
+			blocks.append((lines, lineNbs))
+			lines, lineNbs = [], []
+		lines.append(line)
+		lineNbs.append(lineNb)
+	if lines:
+		blocks.append((lines, lineNbs))
+	return blocks
+
+def block_text_hash(lines):
+	return hashlib.sha1("\n".join(line.rstrip() for line in lines).encode()).hexdigest()
+
+class ParserState:
+	"""Modal parser & model state at a block boundary."""
+
+	def __init__(self, parser):
+		model = parser.model
+		self.position = dict(model.position)
+		self.offset = dict(model.offset)
+		self.isRelative = model.isRelative
+		self.current_type = parser.current_type
+		self.current_tool = parser.current_tool
+		self.var_multiplier = parser.var_multiplier
+		self.cycle = dict(parser.cycle)
+		self.feed = (parser.feed, parser.per_rev, parser.spindle, parser.css)
+		self.variables = bytes(parser.variables.values)
+
+	def key(self):
+		return hashlib.sha1(repr((sorted(self.position.items()), sorted(self.offset.items()),
+			self.isRelative, self.current_type, self.current_tool, self.var_multiplier,
+			sorted(self.cycle.items()), self.feed)).encode() + self.variables).hexdigest()
+
+	def restore(self, parser):
+		model = parser.model
+		model.position = dict(self.position)
+		model.offset = dict(self.offset)
+		model.isRelative = self.isRelative
+		parser.current_type = self.current_type
+		parser.current_tool = self.current_tool
+		parser.var_multiplier = self.var_multiplier
+		parser.cycle = dict(self.cycle)
+		parser.feed, parser.per_rev, parser.spindle, parser.css = self.feed
+		parser.variables.values[:] = array('d', self.variables)
+		model.addFeed(*self.feed)
+
+class BlockGeometry:
+	"""Parsed segments of one block, line numbers relative to the block's first line."""
+
+	def __init__(self, model, firstLineNb, entry, exit):
+		n = model.columns.count
+		self.types = model.columns.type[:n].copy()
+		self.coords = model.columns.coords[:n].copy()
+		self.tools = model.columns.tool[:n].copy()
+		self.lineOffsets = model.columns.lineNb[:n] - firstLineNb
+		self.lines = {lineNb - firstLineNb: line for lineNb, line in model.lines.items()}
+		self.feeds = list(model.feeds)
+		self.diagnostics = model.diagnostics.shifted(-firstLineNb)
+		self.index = model.index.shifted(-firstLineNb) if model.index is not None else None
+		# absolute position the first segment starts from
+		self.entryPoint = np.array([entry.offset[axis] + entry.position[axis] for axis in "XYZ"])
+		self.exit = exit
+
+	def segmentKeys(self):
+		# rounded (start, end) of every segment, to compare blocks move by move
+		starts = np.vstack(([self.entryPoint], self.coords[:-1])) if len(self.coords) else self.coords
+		rows = np.round(np.hstack((starts, self.coords)), 4)
+		return [tuple(row) for row in rows.tolist()]
+
+class BlockCache:
+	"""Block geometry keyed by block text and entry state, shared between parses."""
+
+	def __init__(self):
+		self.blocks = {}
+		self.hits = 0
+		self.misses = 0
+
+	def parse(self, code):
+		"""Parses `code` block by block, reusing cached blocks. Returns [(hash, geometry)]."""
+		parser = GcodeParser()
+		parser.prescanVariables(code)
+		state = ParserState(parser)
+		result = []
+		for lines, lineNbs in split_blocks(code):
+			textHash = block_text_hash(lines)
+			key = textHash + state.key()
+			geometry = self.blocks.get(key)
+			if geometry is None:
+				self.misses += 1
+				geometry = self.parseBlock(lines, lineNbs, state)
+				self.blocks[key] = geometry
+			else:
+				self.hits += 1
+			result.append((textHash, geometry))
+			state = geometry.exit
+		return result
+
+	def parseBlock(self, lines, lineNbs, state):
+		parser = GcodeParser()
+		state.restore(parser)
+		parser.runProgram(parser.compileProgram(lines, lineNbs))
+		return BlockGeometry(parser.model, lineNbs[0], state, ParserState(parser))
+
+def assemble(blocks, lineOffsets):
+	"""Builds a post-processed model from block geometry placed at the given first line numbers."""
+	parser = GcodeParser()
+	model = parser.model
+	for geometry, firstLineNb in zip(blocks, lineOffsets):
+		model.feeds.extend((model.columns.count + state[0],) + state[1:] for state in geometry.feeds)
+		model.columns.extend(geometry.types, geometry.coords, geometry.tools, geometry.lineOffsets + firstLineNb, -1)
+		model.lines.update({offset + firstLineNb: line for offset, line in geometry.lines.items()})
+		model.diagnostics.merge(geometry.diagnostics, firstLineNb)
+		if model.index is not None and geometry.index is not None:
+			model.index.merge(geometry.index, firstLineNb)
+	model.postProcess()
+	return model
+
+class ProgramDiff:
+	"""Differences between two revisions of a program.
+
+	`model` is the new revision, `status` holds UNCHANGED, ADDED or CHANGED
+	for each of its segments, and `removed` the (start, end) points of old
+	segments that are gone.
+	"""
+
+	def __init__(self, oldCode, newCode, cache=None):
+		self.cache = cache if cache is not None else BlockCache()
+		old = self.cache.parse(oldCode)
+		new = self.cache.parse(newCode)
+		newFirstLines = [lineNbs[0] for _, lineNbs in split_blocks(newCode)]
+		self.model = assemble([geometry for _, geometry in new], newFirstLines)
+
+		# segment range of every new block in the model
+		counts = [len(geometry.coords) for _, geometry in new]
+		firsts = np.concatenate(([0], np.cumsum(counts)))
+		self.status = np.full(self.model.columns.count, UNCHANGED, dtype=np.int8)
+		removed = []
+
+		matcher = difflib.SequenceMatcher(None, [h for h, _ in old], [h for h, _ in new], autojunk=False)
+		for op, i1, i2, j1, j2 in matcher.get_opcodes():
+			if op == "insert":
+				self.status[firsts[j1]:firsts[j2]] = ADDED
+			elif op == "delete":
+				removed.extend(key for _, geometry in old[i1:i2] for key in geometry.segmentKeys())
+			elif op == "replace":
+				removed.extend(self.compare(old[i1:i2], new, range(j1, j2), firsts))
+			else:
+				# same text may still move differently when entered from another state
+				for i, j in zip(range(i1, i2), range(j1, j2)):
+					if old[i][1] is not new[j][1]:
+						removed.extend(self.compare(old[i:i+1], new, [j], firsts))
+		self.removed = np.array(removed, dtype=float).reshape(-1, 2, 3)
+
+	def compare(self, oldBlocks, new, newRange, firsts):
+		# marks new segments not found in the old blocks as CHANGED, returns the old ones not found in the new blocks
+		oldKeys = set(key for _, geometry in oldBlocks for key in geometry.segmentKeys())
+		newKeys = set()
+		for j in newRange:
+			keys = new[j][1].segmentKeys()
+			newKeys.update(keys)
+			changed = np.array([key not in oldKeys for key in keys], dtype=bool)
+			self.status[firsts[j]:firsts[j + 1]][changed] = CHANGED
+		return [key for _, geometry in oldBlocks for key in geometry.segmentKeys() if key not in newKeys]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# Program files, plain or compressed. Compressed programs (gzip, xz, zstd) are
+# recognised by their magic bytes, whatever their name, and decompressed in
+# chunks while their lines are read: nothing is written to disk, and neither
+# the compressed nor the decompressed bytes are held in memory as a whole.
+
+import io
+import gzip
+import lzma
+import codecs
+import locale
+
+# bytes decompressed per read
+CHUNK = 1 << 20
+
+MAGIC = {
+	b"\x1f\x8b": "gzip",
+	b"\xfd7zXZ\x00": "xz",
+	b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+def compression(head):
+	"""'gzip', 'xz' or 'zstd' from the first bytes of a file, None for plain text."""
+	for magic, name in MAGIC.items():
+		if head.startswith(magic):
+			return name
+	return None
+
+def zstd_reader(raw):
+	# the zstandard package, or the standard library from Python 3.14 on
+	try:
+		import zstandard
+	except ImportError:
+		try:
+			from compression import zstd
+		except ImportError:
+			raise ImportError("reading zstd compressed programs needs the 'zstandard' package")
+		return zstd.ZstdFile(raw)
+	return zstandard.ZstdDecompressor().stream_reader(raw, read_size=CHUNK, read_across_frames=True, closefd=False)
+
+def decompressed(raw):
+	"""A binary stream of the content of an open binary file, decompressed if it is compressed."""
+	if not isinstance(raw, io.BufferedReader):
+		raw = io.BufferedReader(raw, CHUNK)
+	kind = compression(raw.peek(8)[:8])
+	if kind is None:
+		return raw
+	if kind == "gzip":
+		stream = gzip.GzipFile(fileobj=raw)
+	elif kind == "xz":
+		stream = lzma.LZMAFile(raw)
+	else:
+		stream = zstd_reader(raw)
+	return io.BufferedReader(stream, CHUNK)
+
+def read_lines(stream, encoding=None):
+	"""Lines of a binary stream, decoded and split one CHUNK at a time, as open(path, 'r') reads them."""
+	decoder = codecs.getincrementaldecoder(encoding or locale.getpreferredencoding(False))()
+	# universal newlines: '\r\n' and '\r' become '\n'
+	decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+	rest = ""
+	while True:
+		chunk = stream.read(CHUNK)
+		lines = io.StringIO(rest + decoder.decode(chunk, final=not chunk)).readlines()
+		# the last line of a chunk continues in the next one
+		rest = lines.pop() if chunk and lines and not lines[-1].endswith("\n") else ""
+		yield from lines
+		if not chunk:
+			break
+
+def program_lines(path):
+	"""The lines of a program file, plain or compressed."""
+	with open(path, "rb") as raw:
+		stream = decompressed(raw)
+		if stream is raw:
+			return io.TextIOWrapper(raw).readlines()
+		return list(read_lines(stream))
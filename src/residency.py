@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# GPU buffer residency: layers are uploaded on demand and kept under a byte
+# budget, evicting the least recently used ones. The manager only tracks keys
+# and sizes; creating and freeing the actual buffers is up to the callbacks.
+
+from collections import OrderedDict
+
+class ResidencyManager:
+	"""LRU set of resident objects under a budget in bytes.
+
+	`upload(key)` creates the object for a key, `release(obj)` frees it.
+	"""
+
+	def __init__(self, budget, upload, release):
+		self.budget = budget
+		self.upload = upload
+		self.release = release
+		# key -> (object, bytes), least recently used first
+		self.entries = OrderedDict()
+		self.used = 0
+		self.uploads = 0
+		self.evictions = 0
+		# the keys the last select() left out, not drawn until the priorities change
+		self.left_out = []
+
+	def __contains__(self, key):
+		return key in self.entries
+
+	def select(self, keys, size):
+		"""The leading keys of a priority ordered list that fit the budget together; `left_out` holds the others."""
+		keys = list(keys)
+		total = 0
+		selected = []
+		for key in keys:
+			nbytes = size(key)
+			if selected and total + nbytes > self.budget:
+				break
+			total += nbytes
+			selected.append(key)
+		self.left_out = keys[len(selected):]
+		return selected
+
+	def get(self, key):
+		"""The resident object of `key`, marked as used, or None."""
+		entry = self.entries.get(key)
+		if entry is None:
+			return None
+		self.entries.move_to_end(key)
+		return entry[0]
+
+	def require(self, key, nbytes, pinned=()):
+		"""The object of `key`, uploaded if needed after evicting unpinned LRU entries."""
+		obj = self.get(key)
+		if obj is not None:
+			return obj
+		for old in list(self.entries):
+			if self.used + nbytes <= self.budget:
+				break
+			if old not in pinned:
+				self.evict(old)
+		obj = self.upload(key)
+		self.entries[key] = (obj, nbytes)
+		self.used += nbytes
+		self.uploads += 1
+		return obj
+
+	def evict(self, key):
+		obj, nbytes = self.entries.pop(key)
+		self.used -= nbytes
+		self.evictions += 1
+		self.release(obj)
+
+	def clear(self):
+		for key in list(self.entries):
+			self.evict(key)
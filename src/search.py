@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+# Program search: an inverted index from the tokens of a program (word letters,
+# G/M codes, tools, macro variables, sequence numbers) to the lines using them,
+# filled while the parser compiles the program, plus the segment end points
+# sorted per axis for range queries. A query such as `#814` or `G1 Z<-20`
+# finds its lines and segments without going through the text again.
+
+import re
+from array import array
+
+import numpy as np
+
+# single letters, not part of a macro word (WHILE, GOTO, SQRT ...), with their value
+WORD = re.compile(r"(?<![A-Z])([A-Z])(?![A-Z])\s*(-?\d+\.?\d*|-?\.\d+)?|#(\d+)")
+# letters whose value names a code rather than a coordinate; tools are added
+# by the parser, by the number it selects ('T0101' is T1)
+CODE_LETTERS = "GMN"
+# axis ranges, 'Z<-20'; a bare 'X5' is 'X=5'
+RANGE = re.compile(r"^([XYZ])(<=|>=|<|>|=)?(-?\d+\.?\d*|-?\.\d+)$")
+TOOL = re.compile(r"^T(\d+)$")
+# modal motion codes, and the letters of a move that repeats them ('X5.' after 'G1')
+MOTION = ("G0", "G1", "G2", "G3")
+MOVE_LETTERS = "XYZUVW"
+AXES = "XYZ"
+# tolerance of `=` in range queries
+EPSILON = 1e-6
+
+def token(letter, value=None):
+	"""The key of a word in the index: 'Z', 'G1' (for G01), 'M5', 'T21', 'G92.1'."""
+	if value is None:
+		return letter
+	return "%s%g" % (letter, float(value))
+
+def tokens(command):
+	"""The tokens of a command, in order of appearance, with repeats."""
+	result = []
+	for letter, value, variable in WORD.findall(command.upper()):
+		if variable:
+			result.append("#" + variable)
+			continue
+		result.append(letter)
+		if value and letter in CODE_LETTERS:
+			result.append(token(letter, value))
+	return result
+
+class SearchResult:
+	"""Sorted line numbers and segment indices matching a query."""
+
+	def __init__(self, lines, segments):
+		self.lines = lines
+		self.segments = segments
+
+	def __len__(self):
+		return len(self.lines)
+
+	def __str__(self):
+		return "<SearchResult: %d lines, %d segments>" % (len(self.lines), len(self.segments))
+
+class SearchIndex:
+	"""Line numbers of every token of a program.
+
+	`addLine()` is called by the parser for every compiled line. A move
+	without a G code is indexed under the motion code last seen in the text
+	(jumps aside, the one in effect). The segments of a line and the
+	per-axis order of the segment end points are worked out from the
+	model's columns on the first query that needs them.
+	"""
+
+	def __init__(self):
+		self.tokens = {}
+		self.modal = None
+		self.count = None
+		self.byLine = None
+		self.byAxis = {}
+
+	def addLine(self, lineNb, command, label=None, tool=None):
+		if label is not None:
+			self.add(token("N", label), lineNb)
+		if tool is not None:
+			self.add(token("T", tool), lineNb)
+		keys = tokens(command)
+		for key in keys:
+			self.add(key, lineNb)
+			if key in MOTION:
+				self.modal = key
+		if self.modal is not None and "G" not in keys and any(key in MOVE_LETTERS for key in keys):
+			self.add(self.modal, lineNb)
+
+	def add(self, key, lineNb):
+		lines = self.tokens.get(key)
+		if lines is None:
+			lines = self.tokens[key] = array('i')
+		# a token repeated on a line is kept once
+		if not lines or lines[-1] != lineNb:
+			lines.append(lineNb)
+
+	def merge(self, other, lineOffset=0):
+		"""Adds the lines of another index, e.g. of another channel, shifting them by `lineOffset`."""
+		for key, lines in other.tokens.items():
+			if lineOffset:
+				lines = array('i', (np.frombuffer(lines, dtype=np.int32) + lineOffset).tobytes())
+			self.tokens.setdefault(key, array('i')).extend(lines)
+
+	def shifted(self, lineOffset):
+		result = SearchIndex()
+		result.merge(self, lineOffset)
+		return result
+
+	def __getstate__(self):
+		# derived arrays are rebuilt on demand
+		return {"tokens": self.tokens}
+
+	def __setstate__(self, state):
+		self.__init__()
+		self.tokens = state["tokens"]
+
+	def lines(self, key):
+		return np.unique(np.frombuffer(self.tokens.get(key, array('i')), dtype=np.int32))
+
+	def prepare(self, model):
+		# forget the derived arrays when the model has grown since
+		if self.count != model.columns.count:
+			self.count = model.columns.count
+			self.byLine = np.argsort(model.columns.lineNb[:self.count], kind='stable')
+			self.byAxis = {}
+
+	def segmentsOfLines(self, model, lines):
+		"""Segment indices produced by the given (sorted) lines, in order."""
+		self.prepare(model)
+		lineNbs = model.columns.lineNb[:self.count][self.byLine]
+		first = np.searchsorted(lineNbs, lines, side='left')
+		counts = np.searchsorted(lineNbs, lines, side='right') - first
+		# the rows first..first+count of every line, in one go
+		rows = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+		return np.sort(self.byLine[rows])
+
+	def nextSegments(self, model, lines):
+		"""The first segment of every line, or of the next line that has segments (-1 past the end)."""
+		self.prepare(model)
+		if self.count == 0:
+			return np.full(len(lines), -1, dtype=np.int64)
+		lineNbs = model.columns.lineNb[:self.count][self.byLine]
+		at = np.searchsorted(lineNbs, lines, side='left')
+		return np.where(at < self.count, self.byLine[np.minimum(at, self.count - 1)], -1)
+
+	def axisRange(self, model, axis, lo=-np.inf, hi=np.inf):
+		"""Segment indices whose end point lies in [lo, hi] on an axis (program coordinates)."""
+		self.prepare(model)
+		column = AXES.index(axis)
+		values = model.columns.coords[:self.count, column]
+		if axis not in self.byAxis:
+			self.byAxis[axis] = np.argsort(values, kind='stable')
+		order = self.byAxis[axis]
+		sorted_values = values[order]
+		a = np.searchsorted(sorted_values, lo, side='left')
+		b = np.searchsorted(sorted_values, hi, side='right')
+		return np.sort(order[a:b])
+
+	def term(self, model, text):
+		"""(lines, segments) of one query term, segments None when they follow from the lines."""
+		m = RANGE.match(text)
+		if m:
+			axis, op, value = m.group(1), m.group(2) or "=", float(m.group(3))
+			if op == "=":
+				lo, hi = value - EPSILON, value + EPSILON
+			elif op[0] == "<":
+				lo, hi = -np.inf, value if op == "<=" else np.nextafter(value, -np.inf)
+			else:
+				lo, hi = value if op == ">=" else np.nextafter(value, np.inf), np.inf
+			segments = self.axisRange(model, axis, lo, hi)
+			return np.unique(model.columns.lineNb[segments]), segments
+		m = TOOL.match(text)
+		if m:
+			# the lines selecting a tool and every segment cut with it
+			self.prepare(model)
+			number = int(m.group(1))
+			segments = np.flatnonzero(model.columns.tool[:self.count] == number)
+			return np.union1d(self.lines(token("T", number)), model.columns.lineNb[segments]), segments
+		keys = tokens(text)
+		if len(keys) != 1 and not (len(keys) == 2 and keys[1].startswith(keys[0])):
+			raise ValueError("not a search term: %r" % text)
+		return self.lines(keys[-1]), None
+
+	def query(self, model, text):
+		"""Lines and segments matching every term of `text`, e.g. 'G1 Z<-20' or '#814'."""
+		lines, segments = None, None
+		for text in text.upper().split():
+			termLines, termSegments = self.term(model, text)
+			if termSegments is None:
+				termSegments = self.segmentsOfLines(model, termLines)
+			lines = termLines if lines is None else np.intersect1d(lines, termLines)
+			segments = termSegments if segments is None else np.intersect1d(segments, termSegments)
+		if lines is None:
+			return SearchResult(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))
+		# segments of lines left out by another term are not hits either
+		segments = segments[np.isin(model.columns.lineNb[segments], lines)]
+		return SearchResult(lines, segments)
+
+	def __str__(self):
+		return "<SearchIndex: %d tokens>" % len(self.tokens)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+# Cross sections: the segments crossing a plane Z = z or X = x and the points
+# where they cross it. An interval tree per axis over the extents of the
+# segments (from start to end point), built once on the first query, answers
+# every plane in O(log n + k) for k segments crossing it, fast enough to follow
+# a plane dragged through the part.
+
+import numpy as np
+from src.mapped import chunks
+
+# intervals kept unsplit in a leaf, searched by brute force
+LEAF = 256
+AXES = "XYZ"
+
+class IntervalTree:
+	"""Static centered interval tree over intervals [lo, hi].
+
+	Every node holds the intervals containing its center, sorted by lo and
+	by hi, those wholly left and right of it go down. The nodes are flat
+	arrays: per node its center, children and range of the sorted lists.
+	"""
+
+	def __init__(self, lo, hi, leaf=LEAF):
+		self.lo = lo
+		self.hi = hi
+		self.center, self.left, self.right, self.bounds = [], [], [], []
+		byLo, byHi = [], []
+		size = 0
+		# (node, ids) still to be split, children are numbered as they are found
+		pending = [(self.node(), np.arange(len(lo)))]
+		while pending:
+			node, ids = pending.pop()
+			if len(ids) <= leaf:
+				# a leaf: its intervals, unsorted, in the lo list
+				self.center[node] = np.nan
+				here = ids
+				byLo.append(here)
+				byHi.append(here)
+			else:
+				center = np.median((lo[ids] + hi[ids]) / 2)
+				isLeft, isRight = hi[ids] < center, lo[ids] > center
+				here = ids[~isLeft & ~isRight]
+				byLo.append(here[np.argsort(lo[here], kind='stable')])
+				byHi.append(here[np.argsort(hi[here], kind='stable')])
+				self.center[node] = center
+				for side, inSide in ((self.left, isLeft), (self.right, isRight)):
+					if inSide.any():
+						side[node] = self.node()
+						pending.append((side[node], ids[inSide]))
+			self.bounds[node] = (size, size + len(here))
+			size += len(here)
+		self.center = np.array(self.center)
+		self.byLo = np.concatenate(byLo) if byLo else np.zeros(0, dtype=np.int64)
+		self.byHi = np.concatenate(byHi) if byHi else np.zeros(0, dtype=np.int64)
+		# the sorted values, for searchsorted
+		self.loSorted = lo[self.byLo]
+		self.hiSorted = hi[self.byHi]
+
+	def node(self):
+		self.center.append(None)
+		self.left.append(-1)
+		self.right.append(-1)
+		self.bounds.append(None)
+		return len(self.center) - 1
+
+	def stab(self, value):
+		"""Ids of the intervals containing `value`, sorted."""
+		found = []
+		node = 0 if len(self.center) else -1
+		while node >= 0:
+			first, last = self.bounds[node]
+			center = self.center[node]
+			if np.isnan(center):
+				ids = self.byLo[first:last]
+				found.append(ids[(self.lo[ids] <= value) & (self.hi[ids] >= value)])
+				break
+			if value < center:
+				# all of them end right of the value: those starting left of it
+				found.append(self.byLo[first:first + np.searchsorted(self.loSorted[first:last], value, side='right')])
+				node = self.left[node]
+			elif value > center:
+				found.append(self.byHi[first + np.searchsorted(self.hiSorted[first:last], value, side='left'):last])
+				node = self.right[node]
+			else:
+				found.append(self.byLo[first:last])
+				break
+		return np.sort(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+	def __len__(self):
+		return len(self.lo)
+
+	def __str__(self):
+		return "<IntervalTree: %d intervals, %d nodes>" % (len(self.lo), len(self.center))
+
+class Section:
+	"""Segments crossing a plane, sorted, and the points where they cross it (program coordinates).
+
+	A segment lying in the plane is represented by its end point.
+	"""
+
+	def __init__(self, axis, value, segments, points):
+		self.axis = axis
+		self.value = value
+		self.segments = segments
+		self.points = points
+
+	def vertices(self, selected=slice(None)):
+		"""float32 marker positions of the (`selected`) crossings, as drawn: X and Y halved like every vertex."""
+		points = self.points[selected].astype(np.float32)
+		points[:, :2] /= 2
+		return points
+
+	def __len__(self):
+		return len(self.segments)
+
+	def __str__(self):
+		return "<Section: %s=%g, %d segments>" % (self.axis, self.value, len(self.segments))
+
+class SectionIndex:
+	"""Interval trees over the segment extents of a model, one per axis queried, built on first use."""
+
+	def __init__(self, model):
+		self.model = model
+		self.count = model.columns.count
+		self.trees = {}
+
+	def tree(self, axis):
+		if axis not in self.trees:
+			column = AXES.index(axis)
+			lo = np.empty(self.count)
+			hi = np.empty(self.count)
+			for first, last in chunks(0, self.count):
+				ends = self.model.columns.coords[first:last, column]
+				starts = self.model.segmentStarts(first, last)[:, column]
+				lo[first:last] = np.minimum(starts, ends)
+				hi[first:last] = np.maximum(starts, ends)
+			self.trees[axis] = IntervalTree(lo, hi)
+		return self.trees[axis]
+
+	def query(self, axis, value):
+		"""The Section of the plane `axis` = `value` ('Z', -2.5), X as programmed (a diameter)."""
+		axis = axis.upper()
+		if axis not in AXES:
+			raise ValueError("not an axis: %r" % axis)
+		segments = self.tree(axis).stab(value)
+		column = AXES.index(axis)
+		ends = np.asarray(self.model.columns.coords[segments], dtype=float)
+		starts = np.asarray(self.model.segmentStartsAt(segments), dtype=float)
+		delta = ends[:, column] - starts[:, column]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			t = np.where(delta != 0, (value - starts[:, column]) / delta, 1.)
+		points = starts + t[:, None] * (ends - starts)
+		points[:, column] = value
+		return Section(axis, value, segments, points)
+
+	def __str__(self):
+		return "<SectionIndex: %d segments, axes %s>" % (self.count, "".join(sorted(self.trees)))
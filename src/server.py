@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+# Query server: `yagv serve` keeps recently used programs parsed in memory
+# and answers JSON queries about them over localhost HTTP or a Unix socket,
+# so tools asking the same questions again do not parse the program again.
+#
+#   GET /summary?path=P            segment & layer counts, travel, bbox
+#   GET /tools?path=P              segments, travel (cutting/rapid) and time per tool
+#   GET /locate?path=P&x=&y=&z=    the segment closest to a point, with its line
+#   GET /line?path=P&line=N        the segments of a source line
+#   GET /search?path=P&q=Q         lines & segments matching a search, e.g. q=G1 Z<-20
+#   GET /stats                     cached programs, hits & misses
+
+import os
+import json
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+from src.gcodeParser import GcodeParser, tool_name
+from src.channels import ChannelProgram
+from src.cycletime import CycleTime
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE = 8
+# lines & segments listed per search answer at most
+SEARCH_LIMIT = 1000
+
+RAPID = 0
+
+class QueryError(Exception):
+	"""A malformed query, answered with HTTP 400."""
+
+class CachedModel:
+	"""A parsed program and the query results computed from it so far."""
+
+	def __init__(self, path):
+		self.path = path
+		self.model = ChannelProgram(GcodeParser().file_to_lines_array(path)).merged()
+		self.memo = {}
+		self.lock = threading.Lock()
+
+	def get(self, name, compute):
+		# derived arrays & answers that do not depend on query arguments
+		with self.lock:
+			if name not in self.memo:
+				self.memo[name] = compute(self.model)
+			return self.memo[name]
+
+class ModelCache:
+	"""The `size` most recently used programs, keyed by path and file version.
+
+	A program is parsed once: requests for it while it is being parsed wait
+	for that parse (`pending`) and count as hits.
+	"""
+
+	def __init__(self, size=DEFAULT_CACHE):
+		self.size = size
+		self.entries = OrderedDict()
+		self.pending = {}
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def get(self, path):
+		path = os.path.realpath(path)
+		try:
+			info = os.stat(path)
+		except OSError:
+			raise QueryError("no such file: %s" % path)
+		# an edited file is parsed again
+		key = (path, info.st_mtime_ns, info.st_size)
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return entry
+			parsing = self.pending.get(key)
+			if parsing is not None:
+				self.hits += 1
+			else:
+				self.misses += 1
+				self.pending[key] = Future()
+		if parsing is not None:
+			# parsed by another request
+			return parsing.result()
+		try:
+			entry = CachedModel(path)
+		except BaseException as e:
+			with self.lock:
+				self.pending.pop(key).set_exception(e)
+			raise
+		with self.lock:
+			for old in [k for k in self.entries if k[0] == path]:
+				del self.entries[old]
+			self.entries[key] = entry
+			while len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+			self.pending.pop(key).set_result(entry)
+		return entry
+
+def summary(model):
+	bbox = model.bbox
+	return {
+		"segments": int(model.columns.count),
+		"layers": len(model.layers),
+		"distance": model.distance,
+		"bbox": None if bbox is None else {"min": [bbox.xmin, bbox.ymin, bbox.zmin], "max": [bbox.xmax, bbox.ymax, bbox.zmax]},
+		"warnings": model.diagnostics.total,
+		"cycle_time": CycleTime(model).total,
+	}
+
+def tools(model):
+	n = model.columns.count
+	if n == 0:
+		return []
+	numbers, which = np.unique(model.columns.tool[:n], return_inverse=True)
+	rapid = model.columns.type[:n] == RAPID
+	distances = model.distances
+	counts = np.bincount(which, minlength=len(numbers))
+	cutting = np.bincount(which, weights=np.where(rapid, 0., distances), minlength=len(numbers))
+	rapids = np.bincount(which, weights=np.where(rapid, distances, 0.), minlength=len(numbers))
+	times = CycleTime(model).tools
+	return [{"tool": tool_name(int(number)), "segments": int(counts[i]),
+			"cutting": float(cutting[i]), "rapid": float(rapids[i]), "time": times[tool_name(int(number))]}
+		for i, number in enumerate(numbers)]
+
+def segment_info(model, index):
+	segment = model.segments[index]
+	return {"index": index, "lineNb": segment.lineNb, "line": segment.line.strip(),
+		"type": segment.type, "tool": segment.tool, "coords": segment.coords}
+
+def locate(model, starts, point):
+	"""The segment closest to `point` (program coordinates)."""
+	n = model.columns.count
+	if n == 0:
+		return None
+	ends = model.columns.coords[:n]
+	d = ends - starts
+	with np.errstate(divide='ignore', invalid='ignore'):
+		t = np.clip(((point - starts) * d).sum(axis=1) / (d*d).sum(axis=1), 0, 1)
+	t = np.nan_to_num(t)
+	distances = np.sqrt(((starts + d*t[:, None] - point)**2).sum(axis=1))
+	index = int(distances.argmin())
+	return dict(segment_info(model, index), distance=float(distances[index]))
+
+def line_segments(model, lineNb):
+	n = model.columns.count
+	return [segment_info(model, int(i)) for i in np.flatnonzero(model.columns.lineNb[:n] == lineNb)]
+
+def search(model, query, limit=SEARCH_LIMIT):
+	result = model.search(query)
+	return {"query": query, "lines": result.lines[:limit].tolist(), "segments": result.segments[:limit].tolist(),
+		"count": {"lines": len(result.lines), "segments": len(result.segments)}}
+
+class QueryHandler(BaseHTTPRequestHandler):
+	"""Answers GET queries with JSON, the model cache is the server's."""
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+		try:
+			answer = self.answer(url.path.rstrip("/"), args)
+		except QueryError as e:
+			return self.reply(400, {"error": str(e)})
+		except Exception as e:
+			return self.reply(500, {"error": "%s: %s" % (type(e).__name__, e)})
+		if answer is None:
+			return self.reply(404, {"error": "unknown query %s" % url.path})
+		self.reply(200, answer)
+
+	def answer(self, query, args):
+		cache = self.server.cache
+		if query == "/stats":
+			return {"cached": [key[0] for key in cache.entries], "hits": cache.hits, "misses": cache.misses}
+		if query not in ("/summary", "/tools", "/locate", "/line", "/search"):
+			return None
+		if "path" not in args:
+			raise QueryError("missing 'path'")
+		entry = cache.get(args["path"])
+		if query == "/summary":
+			return dict(entry.get("summary", summary), path=entry.path)
+		if query == "/tools":
+			return {"path": entry.path, "tools": entry.get("tools", tools)}
+		try:
+			if query == "/locate":
+				point = np.array([float(args.get(axis, 0)) for axis in "xyz"])
+				return locate(entry.model, entry.get("starts", lambda model: model.segmentStarts()), point)
+			if query == "/search":
+				with entry.lock:
+					return dict(search(entry.model, args.get("q", ""), int(args.get("limit", SEARCH_LIMIT))), path=entry.path)
+			return {"segments": line_segments(entry.model, int(args.get("line", "")))}
+		except ValueError as e:
+			raise QueryError(str(e))
+
+	def reply(self, status, answer):
+		body = json.dumps(answer).encode()
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def address_string(self):
+		# Unix sockets have no client address
+		return self.client_address[0] if self.client_address else "unix"
+
+	def log_message(self, format, *args):
+		if self.server.verbose:
+			BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class QueryServer(ThreadingHTTPServer):
+	def __init__(self, address, cache, verbose=False):
+		self.cache = cache
+		self.verbose = verbose
+		ThreadingHTTPServer.__init__(self, address, QueryHandler)
+
+class UnixQueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, path, cache, verbose=False):
+		self.cache = cache
+		self.verbose = verbose
+		if os.path.exists(path):
+			os.unlink(path)
+		socketserver.UnixStreamServer.__init__(self, path, QueryHandler)
+
+def make_server(conf):
+	"""A query server on localhost:--port, or on the Unix socket --socket."""
+	cache = ModelCache(int(conf.get('cache', DEFAULT_CACHE)))
+	verbose = bool(conf.get('verbose'))
+	if 'socket' in conf:
+		return UnixQueryServer(conf['socket'], cache, verbose)
+	return QueryServer(("127.0.0.1", int(conf.get('port', DEFAULT_PORT))), cache, verbose)
+
+def serve(conf):
+	server = make_server(conf)
+	where = server.server_address if isinstance(server.server_address, str) else "http://%s:%d" % server.server_address[:2]
+	print("yagv serving queries on %s (cache of %d programs)" % (where, server.cache.size))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+# Stock removal for turned parts. The bar is held as radial dexels: for every
+# Z slice the material lies between an inner radius (axial holes) and an
+# outer radius (turned contour). The spindle turns under the tool, so a tool
+# tip at radius r removes everything outside r in its slice. Cutting is a
+# minimum (outer) or maximum (inner), so a batch of moves is applied at once
+# with NumPy, in any order.
+#
+# Radii and Z are in the viewer's scale, X (programmed as a diameter) and Y
+# halved, which makes X a radius.
+
+import math
+import numpy as np
+
+RAPID = 0
+
+# at most this many Z slices, unless a finer resolution is asked for
+MAX_SLICES = 4096
+# radius of a drill whose size is not known, and how close to the axis its moves run
+DRILL_RADIUS = 1.
+ON_AXIS = 1e-6
+
+class Stock:
+	"""Radial dexels of a bar from `zmin` to `zmax`, one slice every `dz`.
+
+	`tool_radii` maps tool numbers to the radius of axial tools (drills):
+	a tip closer to the axis than its tool radius bores the slice out to
+	r + radius instead of turning it down to r. Moves along the axis are
+	drilling whatever the tool, with `drill_radius` for tools not listed.
+	"""
+
+	def __init__(self, diameter, zmin, zmax, dz=None, tool_radii=None, drill_radius=DRILL_RADIUS):
+		self.radius = diameter / 2
+		self.zmin = zmin
+		self.dz = dz or max((zmax - zmin) / MAX_SLICES, 1e-3)
+		self.slices = max(int(math.ceil((zmax - zmin) / self.dz)), 1)
+		self.zmax = zmin + self.slices * self.dz
+		self.tool_radii = tool_radii or {}
+		self.drill_radius = drill_radius
+		self.reset()
+
+	@classmethod
+	def fromModel(cls, model, diameter=None, dz=None, tool_radii=None):
+		"""A bar around the cutting moves of a model, from start to end, as thick as its largest X unless given."""
+		n = model.columns.count
+		cutting = model.columns.type[:n] != RAPID
+		if cutting.any():
+			rows = np.flatnonzero(cutting)
+			coords = np.vstack((model.columns.coords[rows], model.segmentStartsAt(rows)))
+		else:
+			coords = model.columns.coords[:n]
+		if diameter is None:
+			diameter = float(np.abs(coords[:, 0]).max()) if len(coords) else 1.
+		zmin, zmax = (float(coords[:, 2].min()), float(coords[:, 2].max())) if len(coords) else (0., 1.)
+		return cls(diameter, zmin, max(zmax, zmin + 1e-3), dz, tool_radii)
+
+	def reset(self):
+		self.outer = np.full(self.slices, self.radius)
+		self.inner = np.zeros(self.slices)
+
+	def state(self):
+		return self.outer.copy(), self.inner.copy()
+
+	def restore(self, state):
+		self.outer[:], self.inner[:] = state
+
+	def cut(self, starts, ends, tools=None):
+		"""Removes the material swept by the tool tip moving along the given segments (program coordinates)."""
+		p = np.array(starts, dtype=float).reshape(-1, 3)
+		q = np.array(ends, dtype=float).reshape(-1, 3)
+		p[:, :2] /= 2
+		q[:, :2] /= 2
+
+		# slices every segment crosses
+		za, zb = np.minimum(p[:, 2], q[:, 2]), np.maximum(p[:, 2], q[:, 2])
+		first = np.floor((za - self.zmin) / self.dz).astype(np.int64)
+		# a move ending on a slice boundary does not reach into the next slice
+		last = np.maximum(np.ceil((zb - self.zmin) / self.dz).astype(np.int64) - 1, first)
+		inside = (last >= 0) & (first < self.slices)
+		first = np.clip(first[inside], 0, self.slices - 1)
+		last = np.clip(last[inside], 0, self.slices - 1)
+		p, q = p[inside], q[inside]
+		tools = np.zeros(len(p), dtype=np.int64) if tools is None else np.asarray(tools)[inside]
+		counts = last - first + 1
+		seg = np.repeat(np.arange(len(p)), counts)
+		slices = np.repeat(first, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+		# part of the segment within its slice, as parameters along the segment
+		d = q[seg] - p[seg]
+		lo = self.zmin + slices * self.dz
+		with np.errstate(divide='ignore', invalid='ignore'):
+			t0 = np.where(d[:, 2] != 0, (lo - p[seg, 2]) / d[:, 2], 0.)
+			t1 = np.where(d[:, 2] != 0, (lo + self.dz - p[seg, 2]) / d[:, 2], 1.)
+			tlo = np.clip(np.minimum(t0, t1), 0, 1)
+			thi = np.clip(np.maximum(t0, t1), 0, 1)
+			# the tip is closest to the axis there: its radius along a line is convex
+			dxy = (d[:, :2]**2).sum(axis=1)
+			t = np.where(dxy > 0, -(p[seg, :2] * d[:, :2]).sum(axis=1) / dxy, 0.)
+		t = np.clip(t, tlo, thi)
+		r = np.sqrt(((p[seg, :2] + d[:, :2] * t[:, None])**2).sum(axis=1))
+
+		radii = np.zeros(len(p))
+		if self.tool_radii:
+			numbers, which = np.unique(tools, return_inverse=True)
+			radii = np.array([self.tool_radii.get(int(tool), 0.) for tool in numbers])[which]
+		# a move along the axis drills, a turning tool never runs there
+		onAxis = ((p[:, :2]**2).sum(axis=1) < ON_AXIS**2) & ((q[:, :2]**2).sum(axis=1) < ON_AXIS**2)
+		radii = np.where(onAxis & (radii == 0), self.drill_radius, radii)
+		toolRadius = radii[seg]
+		axial = r < toolRadius
+		np.minimum.at(self.outer, slices[~axial], r[~axial])
+		np.maximum.at(self.inner, slices[axial], r[axial] + toolRadius[axial])
+
+	def mesh(self, sectors=32):
+		"""Triangle mesh of the remaining material: vertices (n,3), shades (n,) and triangle indices."""
+		z = self.zmin + (np.arange(self.slices) + .5) * self.dz
+		solid = self.outer > self.inner + 1e-9
+		angles = np.arange(sectors) * 2 * math.pi / sectors
+		ring = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+
+		vertices, shades, triangles = [], [], []
+		count = 0
+		runs = np.flatnonzero(np.diff(np.concatenate(([0], solid.astype(np.int8), [0]))))
+		for a, b in zip(runs[::2], runs[1::2]):
+			# one tube per run of solid slices: outer & inner surfaces, annular ends
+			surfaces = [self.outer[a:b]]
+			if self.inner[a:b].max() > 0:
+				surfaces.append(self.inner[a:b])
+			for radius in surfaces:
+				points = np.empty((b - a, sectors, 3))
+				points[:, :, :2] = radius[:, None, None] * ring[None, :, :]
+				points[:, :, 2] = z[a:b, None]
+				vertices.append(points.reshape(-1, 3))
+				# light from the side, fading around the bar
+				shades.append(np.tile(.55 + .45 * np.abs(ring[:, 0]), b - a))
+				triangles.append(count + self.tube(b - a, sectors))
+				count += (b - a) * sectors
+			for end in (a, b - 1):
+				triangles.append(count + self.annulus(sectors))
+				points = np.empty((2*sectors, 3))
+				points[:sectors, :2] = self.outer[end] * ring
+				points[sectors:, :2] = self.inner[end] * ring
+				points[:, 2] = z[end] + (self.dz / 2 if end == b - 1 else -self.dz / 2)
+				vertices.append(points)
+				shades.append(np.full(2*sectors, .8))
+				count += 2*sectors
+		if not vertices:
+			return np.zeros((0, 3)), np.zeros(0), np.zeros(0, dtype=np.uint32)
+		return np.vstack(vertices), np.concatenate(shades), np.concatenate(triangles).astype(np.uint32)
+
+	@staticmethod
+	def tube(rows, sectors):
+		# two triangles between every pair of neighbouring vertices of consecutive rings
+		i, j = np.meshgrid(np.arange(rows - 1), np.arange(sectors), indexing='ij')
+		a = i*sectors + j
+		b = i*sectors + (j + 1) % sectors
+		return np.stack((a, b, a + sectors, b, b + sectors, a + sectors), axis=-1).ravel()
+
+	@staticmethod
+	def annulus(sectors):
+		j = np.arange(sectors)
+		a, b = j, (j + 1) % sectors
+		return np.stack((a, b, a + sectors, b, b + sectors, a + sectors), axis=-1).ravel()
+
+	def __str__(self):
+		return "<Stock: d=%g, z=%g..%g, %d slices>" % (self.radius*2, self.zmin, self.zmax, self.slices)
+
+class StockSimulation:
+	"""Replays the cutting moves of segments [first, last) of a model on a stock.
+
+	`seek(index)` brings the stock to its state after every cutting move
+	before segment `index`. Moving forward only applies the new moves;
+	moving back restarts from the nearest snapshot, taken every
+	`checkpoint` segments.
+	"""
+
+	def __init__(self, model, stock, first=0, last=None, checkpoint=1 << 14):
+		self.model = model
+		self.stock = stock
+		self.first = first
+		self.last = model.columns.count if last is None else last
+		self.checkpoint = checkpoint
+		self.starts = model.segmentStarts()
+		self.position = first
+		self.snapshots = {first: stock.state()}
+
+	def seek(self, index):
+		index = max(self.first, min(index, self.last))
+		if index < self.position:
+			at = max(i for i in self.snapshots if i <= index)
+			self.stock.restore(self.snapshots[at])
+			self.position = at
+		while self.position < index:
+			# advance to the next snapshot boundary at most, to take it there
+			step = min(index, (self.position - self.first) // self.checkpoint * self.checkpoint + self.first + self.checkpoint)
+			self.apply(self.position, step)
+			self.position = step
+			if (step - self.first) % self.checkpoint == 0 and step not in self.snapshots:
+				self.snapshots[step] = self.stock.state()
+
+	def apply(self, first, last):
+		columns = self.model.columns
+		cutting = np.flatnonzero(columns.type[first:last] != RAPID) + first
+		self.stock.cut(self.starts[cutting], columns.coords[cutting], columns.tool[cutting])
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+# Tool visibility: which tools' moves are drawn. Every tool layer is a range of
+# the model's segments with a vertex buffer of its own, so the moves of a tool
+# are the index ranges of its layers. Showing or hiding tools only changes which
+# of these ranges are drawn; nothing is parsed, rendered or uploaded again.
+
+import re
+
+import numpy as np
+from src.gcodeParser import tool_number
+
+def tool_sort_key(tool):
+	# by number, layers without a tool last
+	return tool_number(tool) if tool else float("inf")
+
+class ToolFilter:
+	"""The visible tools of a model, selected by name ('T31', '-' for no tool), range ('T31-T34') or group.
+
+	Groups are those of `model.tool_dict` ('gang', 'sub', 'back'), and 'all';
+	`hidden` tools not in the model are ignored.
+	`visible` holds a flag per tool layer, `ranges` the (layer index, first,
+	last) segment ranges of every tool.
+	"""
+
+	def __init__(self, model, hidden=()):
+		self.model = model
+		self.ranges = {}
+		for i, layer in enumerate(model.layers):
+			self.ranges.setdefault(layer.tool, []).append((i, layer.first, layer.first + layer.count))
+		self.tools = sorted(self.ranges, key=tool_sort_key)
+		self.groups = {group: [] for group in model.tool_dict.values()}
+		for tool in self.tools:
+			if tool in model.tool_dict:
+				self.groups[model.tool_dict[tool]].append(tool)
+		self.layerTools = [layer.tool for layer in model.layers]
+		self.hidden = set(hidden) & set(self.tools)
+		self.visible = np.ones(len(model.layers), dtype=bool)
+		self.update()
+
+	def select(self, spec):
+		"""The tools of the program named by `spec`, e.g. 'T1,T31-T34,sub'; ValueError for unknown names."""
+		selected = []
+		for item in filter(None, (item.strip() for item in spec.split(","))):
+			m = re.match(r"^[Tt](\d+)\s*-\s*[Tt]?(\d+)$", item)
+			if item.lower() == "all":
+				tools = self.tools
+			elif item.lower() in self.groups:
+				tools = self.groups[item.lower()]
+			elif m:
+				lo, hi = sorted((int(m.group(1)), int(m.group(2))))
+				tools = [tool for tool in self.tools if tool and lo <= tool_number(tool) <= hi]
+			elif item == "-" and None in self.ranges:
+				# the moves before the first tool change
+				tools = [None]
+			elif item.upper() in self.ranges:
+				tools = [item.upper()]
+			else:
+				raise ValueError("unknown tool or group '%s'" % item)
+			selected.extend(tool for tool in tools if tool not in selected)
+		return selected
+
+	def update(self):
+		self.visible[:] = [tool not in self.hidden for tool in self.layerTools]
+
+	def show(self, spec):
+		self.hidden.difference_update(self.select(spec))
+		self.update()
+
+	def hide(self, spec):
+		self.hidden.update(self.select(spec))
+		self.update()
+
+	def only(self, spec):
+		"""Shows the tools of `spec` and hides all others."""
+		selected = self.select(spec)
+		self.hidden = set(self.tools) - set(selected)
+		self.update()
+
+	def toggle(self, spec):
+		"""Hides the tools of `spec` if all of them are shown, shows them otherwise."""
+		selected = self.select(spec)
+		if self.hidden.isdisjoint(selected):
+			self.hidden.update(selected)
+		else:
+			self.hidden.difference_update(selected)
+		self.update()
+
+	def show_all(self):
+		self.hidden = set()
+		self.update()
+
+	def visible_ranges(self):
+		"""(first, last) segment ranges drawn, adjacent ones merged."""
+		result = []
+		for i in np.flatnonzero(self.visible):
+			layer = self.model.layers[i]
+			if result and result[-1][1] == layer.first:
+				result[-1] = (result[-1][0], layer.first + layer.count)
+			else:
+				result.append((layer.first, layer.first + layer.count))
+		return result
+
+	def summary(self):
+		# 'tools: T1 T2 T21 (hidden: T31 T32)'
+		shown = [tool or "-" for tool in self.tools if tool not in self.hidden]
+		hidden = [tool or "-" for tool in self.tools if tool in self.hidden]
+		return "tools: %s%s" % (" ".join(shown) or "none", " (hidden: %s)" % " ".join(hidden) if hidden else "")
+
+	def __str__(self):
+		return "<ToolFilter: %d of %d tools shown>" % (len(self.tools) - len(self.hidden), len(self.tools))
@@ -0,0 +1,1551 @@
+#!/usr/bin/env python
+
+# The OpenGL viewer. Importing this module pulls in pyglet and its GL bindings,
+# so it is only imported once a window is about to be created (see yagv.py).
+
+import pyglet
+import math
+import numpy as np
+
+# Disable error checking for increased performance
+pyglet.options['debug_gl'] = False
+
+from pyglet import clock
+from pyglet.gl import *
+from pyglet.window import key
+from pyglet.window import mouse
+
+from src import YAGV_VERSION
+from src.gcodeParser import *
+from src.workspace import Workspace
+from src.programDiff import ProgramDiff, BlockCache
+from src.residency import ResidencyManager
+from src.clearance import ClearanceCheck, Cylinder
+from src.stock import Stock, StockSimulation
+from src.memory import MemoryProfile, choose_representation, footprint, model_footprint
+from src.benchmark import DEFAULT_FRAMES, FrameStats, camera_script
+from src.playback import DEFAULT_SPEED, Playback
+from src.mapped import chunk_rows, chunks
+from src.cycletime import MachineProfile
+from src.compaction import DEFAULT_TOLERANCE, compact_rows
+from src.toolfilter import ToolFilter
+from src.fixedpoint import DEFAULT_SCALE
+import os.path
+import tempfile
+import time
+from ctypes import byref
+
+colorMap = {
+	# Misc:
+	"background": [ 1,1,1, 1. ],
+	"grid": [ .2,.2,.2, 1. ],
+	"text": [ 0,0,0, 1. ],
+
+   # Gcode:
+	"extrude": [ 0.,.8,0. ],
+	"extrude_active": [ .8,0.,0. ],
+	"extrude_wall": [ .2,.9,0. ],
+	"extrude_wall_active": [ .8,.5,0. ],
+	"extrude_support": [ .8,.8,0. ],
+	"extrude_support_active": [ 1,.9,0. ],
+	"retract": [ .8,.8,0. ],
+	"unretract": [ .8,0.,.8 ],
+	"motion": [ 0.,0.,1. ],
+
+   # Diff:
+	"diff_unchanged": [ .6,.6,.6 ],
+	"diff_added": [ 0.,.7,0. ],
+	"diff_changed": [ 1.,.5,0. ],
+	"diff_removed": [ .9,0.,0. ],
+
+   # Clearance:
+	"clearance_violation": [ 1.,0.,.5 ],
+
+   # Stock simulation:
+	"stock": [ .7,.72,.78 ],
+
+   # Playback:
+	"playback_tool": [ 1.,0.,1., 1. ],
+
+   # Cross section:
+	"section": [ .9,.1,.1, 1. ]
+}
+
+# bytes of layer buffers uploaded per frame at most, the rest follows next frames
+UPLOAD_PER_FRAME = 16 << 20
+
+# frames the frame-time overlay summarizes, frames drawn before a benchmark is timed
+OVERLAY_FRAMES = 120
+WARMUP_FRAMES = 10
+
+class App:
+	def __init__(self, conf={}):
+		self.conf = { }
+		self.conf['bed_size'] = [ 200, 200 ]
+		self.conf['gpu_budget'] = 512
+		self.conf.update(conf)
+		# parsed tool blocks, reused when a diff is reloaded
+		self.block_cache = BlockCache()
+		# frame timing, for --frame-times and --benchmark
+		self.frame_stats = None
+		self.gpu_timer = None
+		# the search or tool selection being typed (None when the prompt is closed)
+		self.search_prompt = None
+		self.tool_prompt = None
+		# programs open in tabs: parsed through one worker pool & cache, drawn
+		# under one GPU budget (see layer_buffer()), the state of the others kept
+		self.workspace = None
+		self.paths = []
+		self.tab = 0
+		self.tabs = {}
+		self.reset_program()
+
+	# what belongs to the program shown, see reset_program() & tab_switch()
+	PROGRAM_STATE = ("path", "model", "program", "diff", "clearance", "stock", "stock_graphics",
+		"lod", "compact", "drawn_rows", "vertices", "vertex_indexed_colors", "vertex_colors",
+		"removed_graphics", "visible_layers", "RX", "RZ", "PX", "PY", "zoom",
+		"focus_segment", "focus_text", "focus_vertices", "layerIdx", "time", "time_text", "time_vertices",
+		"playback", "playback_text", "playback_marker", "search_query", "search_hits", "search_hit", "search_text",
+		"tool_filter", "tool_text", "section_axis", "section_value", "section", "section_graphics", "section_text")
+
+	def reset_program(self):
+		# the state of a program before it is loaded
+		self.RX = 0.0
+		self.RZ = 0.0
+		self.PX = 0.0
+		self.PY = 0.0
+		self.zoom = 1.0
+		self.visible_layers = set()
+		self.focus_segment = 0
+		self.focus_text = ""
+		self.focus_vertices = []
+		self.layerIdx = 0
+		self.time = 0.0
+		self.time_text = ""
+		self.time_vertices = None
+		self.program = None
+		self.diff = None
+		self.clearance = None
+		self.stock = None
+		self.stock_graphics = None
+		# every lod-th segment end is drawn, see layer_rows()
+		self.lod = 1
+		# compaction tolerance in mm (None: every segment is drawn) and the
+		# rows drawn per layer, by first segment
+		self.compact = None
+		self.drawn_rows = {}
+		# toolpath playback, see playback_toggle()
+		self.playback = None
+		self.playback_text = ""
+		self.playback_marker = None
+		# search: the query and its hits
+		self.search_query = ""
+		self.search_hits = None
+		self.search_hit = 0
+		self.search_text = ""
+		# tools drawn and the error of the last tool selection
+		self.tool_filter = None
+		self.tool_text = ""
+		# cross section: the plane's axis ('Z', 'X', None when off) and value, and what it cuts
+		self.section_axis = None
+		self.section_value = None
+		self.section = None
+		self.section_graphics = None
+		self.section_text = ""
+		if 'section' in self.conf:
+			# 'Z-2.5', 'X12' or just the Z plane in the middle of the part
+			plane = "Z" if self.conf['section'] == 1 else self.conf['section'].upper()
+			if plane[0] in "XZ":
+				self.section_axis = plane[0]
+				self.section_value = float(plane[1:]) if len(plane) > 1 else None
+			else:
+				print("[SECTION] not a Z or X plane: %s" % plane)
+	
+	def main(self, path, others=()):
+		
+		if 'dark' in self.conf and self.conf['dark']:
+			colorMap['background'] = [ 0,0,0, 1 ]
+			colorMap['grid'] = [ 1,1,1, 0.1 ]
+			colorMap['text'] = [ 1,1,1, 0.7 ]
+
+		if type(self.conf['bed_size'])==str:
+			self.conf['bed_size'] = list(map(lambda x: int(x),self.conf['bed_size'].split('x')))
+			print(self.conf['bed_size'])
+
+		self.residency = ResidencyManager(int(float(self.conf['gpu_budget']) * (1 << 20)),
+			self.upload_layer, LayerBuffer.delete)
+		self.visible_layers = set()
+		self.frame_uploads = 0
+
+		self.path = "loading ..."
+		self.paths = [path] + list(others)
+		self.workspace = Workspace()
+
+		# -- create window soon, before loading ...
+		self.window = MyWindow(self, caption=self.caption(), resizable=True, width=1024, height=768)
+		pyglet.gl.glClearColor(colorMap['background'][0],colorMap['background'][1],colorMap['background'][2],1)
+
+		# debug: log all events
+		# self.window.push_handlers(pyglet.window.event.WindowEventLogger())
+
+		if 'frame_times' in self.conf or 'benchmark' in self.conf:
+			self.frame_stats = FrameStats(None if 'benchmark' in self.conf else OVERLAY_FRAMES)
+			self.gpu_timer = GpuTimer.create()
+
+		self.load(path)
+		# the other programs are parsed meanwhile, in the background
+		for other in self.paths[1:]:
+			self.workspace.submit(self.prefetch, other)
+
+		# default to the first layer
+		self.layerIdx = 0
+		self.window.hud()
+
+		#img = pyglet.resource.image("icon.png")
+		#img = pyglet.image.load("/usr/local/share/yagv/icon.png")
+		#self.window.set_icon(img)
+
+		if 'benchmark' in self.conf:
+			frames = self.conf['benchmark']
+			self.benchmark(DEFAULT_FRAMES if frames == 1 else int(frames))
+			return
+
+		if 'playback' in self.conf:
+			self.playback_toggle()
+
+		pyglet.app.run()
+
+	def benchmark(self, frames):
+		# draw the scripted frames back to back, without waiting for vsync,
+		# after a few frames that are not counted (first uploads, driver warm-up)
+		self.window.set_vsync(False)
+		script = camera_script(frames, len(self.model.layers))
+		for i in range(WARMUP_FRAMES):
+			self.window.switch_to()
+			self.window.on_draw()
+			self.window.flip()
+		if self.gpu_timer is not None:
+			self.gpu_timer.flush()
+		self.frame_stats = FrameStats()
+		for self.RX, self.RZ, self.zoom, layerIdx in script:
+			if layerIdx != self.layerIdx:
+				self.layerIdx = layerIdx
+				self.layer_update()
+			self.window.switch_to()
+			self.window.dispatch_events()
+			self.window.on_draw()
+			self.window.flip()
+		if self.gpu_timer is not None:
+			for gpu in self.gpu_timer.flush():
+				self.frame_stats.add_gpu(gpu)
+
+		print("benchmark: %s, %d frames, %s" % (self.path, frames, gl_info.get_renderer()))
+		for line in self.frame_stats.report():
+			print(line)
+		if 'benchmark_out' in self.conf:
+			self.frame_stats.write(self.conf['benchmark_out'], program=self.path, renderer=gl_info.get_renderer(),
+				segments=int(self.model.columns.count), lod=self.lod)
+		self.window.close()
+
+	def reload(self):
+		self.load(self.path)
+
+	def parse_options(self, code):
+		# parser options from the command line: (options, lod, warnings)
+		options, lod, warnings = {}, 1, []
+		if 'memory_budget' in self.conf:
+			# cheaper representations when the program would not fit
+			options, warnings = choose_representation(code, float(self.conf['memory_budget']) * (1 << 20),
+				mapped='out_of_core' in self.conf)
+			lod = options.pop('lod')
+		if 'fixed_point' in self.conf:
+			# int32 coordinates in machine units, exact where float32 would round
+			options['coords_dtype'] = np.int32
+			options['coords_scale'] = DEFAULT_SCALE if self.conf['fixed_point'] == 1 else int(self.conf['fixed_point'])
+		if 'out_of_core' in self.conf:
+			# segments, metrics & vertex buffers in memory-mapped files
+			directory = self.conf['out_of_core']
+			options['mapped_dir'] = tempfile.gettempdir() if directory == 1 else directory
+		return options, lod, warnings
+
+	def envelopes(self):
+		# solids rapids must keep off: the bar behind the deepest cut (--stock), whose
+		# face the tool reaches by design, and the guide bushing
+		result = []
+		if 'stock' in self.conf:
+			bar = Stock.fromModel(self.model, None if self.conf['stock'] == 1 else float(self.conf['stock']))
+			result.append(Cylinder(bar.radius * 2, -np.inf, bar.zmin - float(self.conf['clearance'])))
+		profile = self.machine_profile()
+		if profile is not None and profile.guide_bushing is not None:
+			diameter, face = profile.guide_bushing
+			result.append(Cylinder(diameter, -np.inf, face))
+		return result
+
+	def machine_profile(self):
+		return MachineProfile.load(self.conf['machine']) if 'machine' in self.conf else None
+
+	def prefetch(self, path):
+		# parses a program into the workspace's cache, where parse() finds it
+		code = GcodeParser().file_to_lines_array(path)
+		self.workspace.program(code, self.machine_profile(), **self.parse_options(code)[0])
+
+	def parse(self, path):
+		print("Parsing '%s'..." % path)
+		
+		self.path = path
+
+		code = GcodeParser().file_to_lines_array(path)
+		if 'diff' in self.conf and path == self.paths[0]:
+			# parse only the tool blocks that are not cached yet
+			old_code = GcodeParser().file_to_lines_array(self.conf['diff'])
+			self.diff = ProgramDiff(old_code, code, self.block_cache)
+			self.model = self.diff.model
+			print("diff: %d blocks reused, %d parsed" % (self.block_cache.hits, self.block_cache.misses))
+		else:
+			options, self.lod, warnings = self.parse_options(code)
+			for warning in warnings:
+				print("[MEMORY] %s" % warning)
+			# parse every channel on its own, then view them together
+			self.program = self.workspace.program(code, self.machine_profile(), **options)
+			self.model = self.program.merged()
+			print("line cache: %(hits)d hits, %(misses)d misses, %(replays)d argument replays" % self.program.line_cache_stats())
+			print("parse cache: %(cached)d channels, %(hits)d hits, %(misses)d misses" % self.workspace.cache.stats())
+
+		print("Done! %s" % self.model)
+		self.model.diagnostics.report()
+
+		if self.tool_filter is None:
+			self.tool_filter = ToolFilter(self.model)
+			if 'tools' in self.conf:
+				self.tools_apply(self.tool_filter.only, self.conf['tools'])
+				print(self.tool_text or self.tool_filter.summary())
+		else:
+			# tools hidden before a reload stay hidden
+			self.tool_filter = ToolFilter(self.model, self.tool_filter.hidden)
+
+		if 'clearance' in self.conf:
+			# rapids closer than the given distance to the cutting moves
+			self.clearance = ClearanceCheck(self.model, float(self.conf['clearance']), self.envelopes())
+			print(self.clearance)
+			for line in self.clearance.summary():
+				print("  %s" % line)
+
+		if 'stock' in self.conf:
+			# material removal of the main channel, replayed along the timeline
+			diameter = None if self.conf['stock'] == 1 else float(self.conf['stock'])
+			first, last = 0, None
+			if self.program is not None:
+				main = self.program.channels[0]
+				first = self.program.offsets[main]
+				later = [offset for offset in self.program.offsets.values() if offset > first]
+				last = min(later) if later else None
+			profile = self.machine_profile() or MachineProfile()
+			self.stock = StockSimulation(self.model, Stock.fromModel(self.model, diameter, tool_radii=profile.tool_radii), first, last)
+			print(self.stock.stock)
+			# show the finished part first
+			self.time = float('inf')
+
+	def load(self, path):
+		
+		print("loading file %s ..." % repr(path))
+		t1 = time.time()
+		profile = MemoryProfile() if 'memory_profile' in self.conf else None
+		
+		self.stage(profile, "parse", self.parse, path)
+		
+		self.drawn_rows = {}
+		if 'compact' in self.conf:
+			print("compacting polylines...")
+			self.compact = DEFAULT_TOLERANCE if self.conf['compact'] == 1 else float(self.conf['compact'])
+			self.stage(profile, "compact", self.compactLayers)
+
+		# render the model
+		print("rendering vertices...")
+		self.stage(profile, "renderVertices", self.renderVertices)
+		print("rendering indexed colors...")
+		self.stage(profile, "renderIndexedColors", self.renderIndexedColors)
+		print("rendering true colors...")
+		self.stage(profile, "renderColors", self.renderColors)
+		print("generating graphics...")
+		self.stage(profile, "generateGraphics", self.generateGraphics)
+		print("Done")
+		
+		t2 = time.time()
+		print("loaded file in %0.3f ms" % ((t2-t1)*1000.0 ))
+
+		if profile is not None:
+			profile.stop()
+			for line in profile.report(self.model.columns.count, self.memory_structures()):
+				print(line)
+
+	def stage(self, profile, name, function, *args):
+		if profile is None:
+			return function(*args)
+		with profile.stage(name):
+			return function(*args)
+
+	def memory_structures(self):
+		# bytes held by the model and by the viewer's copies of it
+		structures = model_footprint(self.model)
+		structures["vertices"] = footprint(self.vertices)
+		structures["vertex_indexed_colors"] = footprint(self.vertex_indexed_colors)
+		for display_type, colors in enumerate(self.vertex_colors):
+			structures["vertex_colors[%d]" % display_type] = footprint(colors)
+		return structures
+
+	def layer_rows(self, layer):
+		# the segments whose end points are drawn: all of them, or those kept by
+		# compaction, and every lod-th one of these (and the last) when the
+		# view is decimated
+		if self.lod == 1 and self.compact is None:
+			return slice(layer.first, layer.first + layer.count)
+		rows = self.drawn_rows.get(layer.first)
+		if rows is None:
+			rows = self.drawn_rows[layer.first] = self.select_rows(layer)
+		return rows
+
+	def select_rows(self, layer):
+		last = layer.first + layer.count
+		if self.compact is None:
+			rows = np.arange(layer.first, last)
+		else:
+			# segments merge only with segments of the same type (and diff status)
+			keys = self.model.columns.type
+			if self.diff is not None:
+				keys = keys[:self.model.columns.count] * 4 + self.diff.status
+			rows = compact_rows(self.model.columns.coords, keys, (layer.start["X"], layer.start["Y"], layer.start["Z"]),
+				layer.first, last, self.compact)
+		if self.lod > 1:
+			decimated = rows[self.lod - 1::self.lod]
+			rows = decimated if len(decimated) and decimated[-1] == last - 1 else np.append(decimated, last - 1)
+		return rows
+
+	def compactLayers(self):
+		t1 = time.time()
+		drawn = sum(len(self.layer_rows(layer)) for layer in self.model.layers)
+		t2 = time.time()
+		print("end compactLayers in %0.3f ms: %d of %d segments drawn" % ((t2-t1)*1000.0, drawn, self.model.columns.count))
+
+	def drawn_index(self, layer_idx, segment):
+		# index within its layer's strip of the line drawn for a segment, which
+		# ends at vertex drawn_index() + 1
+		layer = self.model.layers[layer_idx]
+		if self.lod == 1 and self.compact is None:
+			return segment - layer.first
+		return np.searchsorted(self.layer_rows(layer), segment)
+
+	def segment_vertices(self, index):
+		# start & end of a segment as drawn, X and Y halved
+		segment = self.model.segments[index]
+		layer = self.model.layers[segment.layerIdx]
+		coords = self.model.columns.coords
+		start = (layer.start["X"], layer.start["Y"], layer.start["Z"]) if index == layer.first else coords[index - 1]
+		vertices = np.array([start, coords[index]], dtype=float)
+		vertices[:, :2] /= 2
+		return vertices.ravel().tolist()
+	
+	def drawn_segments(self, layer):
+		# number of segments drawn for a layer, see layer_rows()
+		rows = self.layer_rows(layer)
+		return layer.count if isinstance(rows, slice) else len(rows)
+
+	def layer_arrays(self, shape, dtype):
+		# one array for the vertex data of all layers, memory-mapped with the
+		# model's columns, and a view of it per layer; `shape` per vertex of
+		# the layer's line strip, one more than the segments drawn
+		counts = [self.drawn_segments(layer) + 1 for layer in self.model.layers]
+		data = self.model.columns.allocate((sum(counts),) + shape, dtype)
+		bounds = np.cumsum([0] + counts)
+		return [data[first:last] for first, last in zip(bounds[:-1], bounds[1:])]
+
+	def renderVertices(self):
+		t1 = time.time()
+		
+		self.vertices = []
+
+		coords = self.model.columns.coords
+		for layer, layer_vertices in zip(self.model.layers, self.layer_arrays((3,), np.float32)):
+			
+			# a float32 line strip per layer: the layer start, then the end point of every
+			# segment drawn, a chunk at a time so that mapped layers are never copied whole
+			rows = self.layer_rows(layer)
+			layer_vertices[0] = (layer.start["X"], layer.start["Y"], layer.start["Z"])
+			layer_vertices[0, :2] /= 2
+			for lo, hi in chunks(0, len(layer_vertices) - 1):
+				vertices = layer_vertices[1 + lo:1 + hi]
+				vertices[:] = coords[chunk_rows(rows, lo, hi)]
+				vertices[:, :2] /= 2
+
+			self.vertices.append(layer_vertices.reshape(-1))
+			
+		t2 = time.time()
+		print("end renderVertices in %0.3f ms" % ((t2-t1)*1000.0, ))
+	
+	def renderIndexedColors(self):
+		t1 = time.time()
+		
+		# all the styles for all layers
+		self.vertex_indexed_colors = []
+		
+		# for all layers
+		for layer, layer_vertex_indexed_colors in zip(self.model.layers, self.layer_arrays((), np.int16)):
+			
+			# index for this layer, per vertex: a line is drawn in the color of its end
+			rows = self.layer_rows(layer)
+			layer_vertex_indexed_colors[0] = self.model.columns.tool[layer.first]
+			for lo, hi in chunks(0, len(layer_vertex_indexed_colors) - 1):
+				layer_vertex_indexed_colors[1 + lo:1 + hi] = self.model.columns.tool[chunk_rows(rows, lo, hi)]
+		
+			# append layer to all layers
+			self.vertex_indexed_colors.append(layer_vertex_indexed_colors)
+		t2 = time.time()
+		print("end renderIndexedColors in %0.3f ms" % ((t2-t1)*1000.0, ))
+	
+	def renderColors(self):
+		t1 = time.time()
+		
+		self.vertex_colors = [[],[],[]]
+		
+		# render color index to real colors
+		cm = [ 
+			# 0: old layer
+			[ colorMap['extrude'].copy(),        colorMap['motion'].copy(), colorMap['retract'].copy(), colorMap['unretract'].copy(), colorMap['extrude_wall'].copy(), colorMap['extrude_support'].copy() ],
+			# 1: current layer
+			[ colorMap['extrude_active'].copy(), colorMap['motion'].copy(), colorMap['retract'].copy(), colorMap['unretract'].copy(), colorMap['extrude_wall_active'].copy(), colorMap['extrude_support_active'].copy() ],
+			# 2: limbo layer
+			[ colorMap['extrude'].copy(),        colorMap['motion'].copy(), colorMap['retract'].copy(), colorMap['unretract'].copy(), colorMap['extrude_wall'].copy(), colorMap['extrude_support'].copy() ]
+		]
+		for i in range(6):         # -- add per type the alpha
+			cm[0][i].append(.2 if i==1 or i==5 else .7)    # -- old
+			cm[1][i].append(.2 if i==1 else 1.)    # -- current
+			cm[2][i].append(.1)    # -- limbo
+		
+		# for all 3 types
+		for display_type in range(3):
+			
+			#type_color_map = cm[display_type]
+
+			# -- float -> int color
+			type_color_map = (np.array(cm[display_type])*255).astype(np.uint8)
+
+			# for all preindexed layer colors
+			for indexes, colors in zip(self.vertex_indexed_colors, self.layer_arrays((4,), np.uint8)):
+				
+				# render color indexes to colors, flattened for the vertex list
+				for lo, hi in chunks(0, len(colors)):
+					colors[lo:hi] = type_color_map[indexes[lo:hi] % len(type_color_map)]
+				self.vertex_colors[display_type].append(colors.reshape(-1))
+				
+		if self.diff is not None:
+			self.renderDiffColors()
+		if self.clearance is not None:
+			self.renderClearanceColors()
+
+		t2 = time.time()
+		print("end renderColors in %0.3f ms" % ((t2-t1)*1000.0, ))
+
+	def renderDiffColors(self):
+		# color by diff status instead of tool, alpha still by display type
+		status_colors = np.array([colorMap['diff_unchanged'], colorMap['diff_added'], colorMap['diff_changed']])
+		for display_type, alpha in enumerate((.7, 1., .4)):
+			type_color_map = (np.hstack((status_colors, np.full((3, 1), alpha)))*255).astype(np.uint8)
+			self.vertex_colors[display_type] = [
+				type_color_map[np.concatenate(([self.diff.status[layer.first]], self.diff.status[self.layer_rows(layer)]))].ravel()
+				for layer in self.model.layers ]
+	
+	def renderClearanceColors(self):
+		# rapids violating the clearance in full color, whatever the layer
+		color = (np.array(colorMap['clearance_violation'] + [1.])*255).astype(np.uint8)
+		violations = self.clearance.violations
+		for layerIdx, layer in enumerate(self.model.layers):
+			inLayer = violations[(violations >= layer.first) & (violations < layer.first + layer.count)]
+			if not len(inLayer):
+				continue
+			# the end vertex of the line drawn for a segment gives its color
+			vertices = np.array([self.drawn_index(layerIdx, segment) for segment in inLayer]) + 1
+			for display_type in range(3):
+				colors = self.vertex_colors[display_type][layerIdx].reshape(-1, 4)
+				colors[vertices] = color
+	
+	def generateGraphics(self):
+		t1 = time.time()
+		
+		# layer buffers are uploaded lazily while drawing, see layer_buffer();
+		# those of the other programs stay
+		for key in [key for key in self.residency.entries if key[0] == self.tab]:
+			self.residency.evict(key)
+		self.update_residency()
+		
+		self.set_focus_segment()
+		self.set_time(self.time)
+		if self.stock is not None and self.program is None:
+			self.set_stock(self.stock.last)
+
+		# old segments that are gone in this revision
+		self.removed_graphics = None
+		if self.diff is not None and len(self.diff.removed):
+			removed = self.diff.removed.reshape(-1, 3).copy()
+			removed[:, :2] /= 2
+			color = [int(c*255) for c in colorMap['diff_removed']] + [255]
+			self.removed_graphics = pyglet.graphics.vertex_list(len(removed),
+				('v3f/static', removed.ravel().tolist()),
+				('c4B/static', color*len(removed))
+			)
+
+		self.section_update()
+
+		t2 = time.time()
+		print("end generateGraphics in %0.3f ms" % ((t2-t1)*1000.0, ))
+	
+
+	# layer buffers are resident by (tab, layer index), the budget covers all programs open;
+	# only the program shown uploads
+	def layer_buffer_size(self, key):
+		# float32 positions plus the colors of the 3 display types
+		return len(self.vertices[key[1]])//3 * (12 + 3*4)
+
+	def upload_layer(self, key):
+		colors = [self.vertex_colors[display_type][key[1]] for display_type in range(3)]
+		return LayerBuffer(self.vertices[key[1]], colors)
+
+	def update_residency(self):
+		# layers closest to the active one are kept on the GPU, as far as the budget goes
+		order = sorted(range(len(self.vertices)), key=lambda idx: (abs(idx - self.layerIdx), idx))
+		self.visible_layers = set(self.residency.select([(self.tab, idx) for idx in order], self.layer_buffer_size))
+
+	def layer_buffer(self, layer_idx):
+		# the layer's buffer, uploaded now if the per-frame upload allowance is not used up
+		key = (self.tab, layer_idx)
+		if key not in self.visible_layers:
+			return None
+		buffer = self.residency.get(key)
+		if buffer is None and self.frame_uploads < UPLOAD_PER_FRAME:
+			size = self.layer_buffer_size(key)
+			buffer = self.residency.require(key, size, pinned=self.visible_layers)
+			self.frame_uploads += size
+		return buffer
+
+	# -- programs open in tabs
+	def tab_switch(self, direction):
+		if len(self.paths) < 2:
+			return
+		self.playback_stop()
+		self.tabs[self.tab] = {name: getattr(self, name) for name in self.PROGRAM_STATE}
+		self.tab = (self.tab + direction) % len(self.paths)
+		state = self.tabs.get(self.tab)
+		if state is None:
+			# opened now, parsed in the background already or being so
+			self.reset_program()
+			self.load(self.paths[self.tab])
+		else:
+			for name, value in state.items():
+				setattr(self, name, value)
+			self.update_residency()
+		self.window.set_caption(self.caption())
+		self.window.hud()
+
+	def caption(self):
+		tab = " [%d/%d]" % (self.tab + 1, len(self.paths)) if len(self.paths) > 1 else ""
+		return "Yet Another GCode Viewer v%s: %s%s" % (YAGV_VERSION, os.path.basename(self.paths[self.tab]), tab)
+
+	def set_focus_segment(self):
+		# print(self.layerIdx, self.focus_segment)
+		segment = self.model.layers[self.layerIdx].segments[self.focus_segment]
+		self.focus_text = segment.line
+		focus_vertices = self.segment_vertices(segment.index)
+		focus_colors = [0,0,0,255,0,0,0,255]
+		self.focus_vertices = pyglet.graphics.vertex_list(2,
+				('v3f/static', focus_vertices),
+				('c4B/static', focus_colors)
+			)
+
+
+	def set_time(self, t):
+		# mark the segment every channel executes at time t
+		if self.program is None:
+			return
+		timeline = self.program.timeline
+		self.time = max(0.0, min(t, timeline.duration))
+		vertices = []
+		texts = []
+		for ch, idx in timeline.segmentsAt(self.time).items():
+			if idx < 0:
+				continue
+			segment = self.model.segments[self.program.offsets[ch] + idx]
+			vertices.extend(self.segment_vertices(segment.index))
+			texts.append("$%d: %s" % (ch, segment.line))
+		self.time_text = "t=%.1f/%.1f  %s" % (self.time, timeline.duration, "  ".join(texts))
+		self.time_vertices = pyglet.graphics.vertex_list(len(vertices)//3,
+				('v3f/static', vertices),
+				('c4B/static', [255,0,255,255]*(len(vertices)//3))
+			)
+		if self.stock is not None:
+			active = timeline.segmentsAt(self.time).get(self.program.channels[0], -1)
+			self.set_stock(self.stock.first + active + 1)
+
+	def set_stock(self, index):
+		# the stock after the cutting moves before segment `index`, as a shaded mesh
+		self.stock.seek(index)
+		vertices, shades, triangles = self.stock.stock.mesh()
+		if self.stock_graphics is not None:
+			self.stock_graphics.delete()
+		self.stock_graphics = None
+		if len(triangles):
+			color = np.array(colorMap['stock'])
+			colors = np.empty((len(vertices), 4), dtype=np.uint8)
+			colors[:, :3] = np.outer(shades, color) * 255
+			colors[:, 3] = 160
+			self.stock_graphics = pyglet.graphics.vertex_list_indexed(len(vertices), triangles.tolist(),
+				('v3f/stream', vertices.ravel().tolist()),
+				('c4B/stream', colors.ravel().tolist())
+			)
+
+	def drawn_count(self, layer_idx, index):
+		# vertices of a layer's buffer drawn for the segments before `index`, None for all
+		layer = self.model.layers[layer_idx]
+		if index <= layer.first:
+			return 0
+		if index >= layer.first + layer.count:
+			return None
+		rows = int(self.drawn_index(layer_idx, index))
+		return rows + 1 if rows else 0
+
+	# -- playback
+	def playback_toggle(self):
+		if self.playback is None:
+			speed = self.conf.get('playback', 1)
+			self.playback = Playback(self.model.columns.count, DEFAULT_SPEED if speed == 1 else float(speed))
+			pyglet.clock.schedule_interval(self.playback_tick, 1/60.)
+		self.playback.toggle()
+		self.playback_update()
+
+	def playback_stop(self):
+		if self.playback is None:
+			return
+		pyglet.clock.unschedule(self.playback_tick)
+		self.playback = None
+		self.playback_text = ""
+		self.playback_marker = None
+		self.set_focus_segment()
+
+	def playback_seek(self, direction):
+		# seek by a 20th of the program
+		if self.playback is not None:
+			self.playback.seek(self.playback.cursor + direction * self.playback.count / 20)
+			self.playback_update()
+
+	def playback_speed(self, factor):
+		if self.playback is not None:
+			self.playback.faster(factor)
+			self.playback_update()
+
+	def playback_tick(self, dt):
+		if self.playback.advance(dt):
+			self.playback_update()
+
+	def playback_update(self):
+		# the active layer follows the tool, the drawn ranges are worked out in on_draw
+		if not self.playback.count:
+			return
+		index = self.playback.segment
+		layerIdx = int(self.model.columns.layerIdx[index])
+		if layerIdx != self.layerIdx:
+			self.layerIdx = layerIdx
+			self.layer_update()
+		segment = self.model.segments[index]
+		vertices = np.array(self.segment_vertices(index)).reshape(2, 3)
+		self.playback_marker = (vertices[0], self.playback.position(*vertices))
+		self.focus_text = segment.line
+		self.playback_text = "playback %d/%d at %g segments/s%s" % (index + 1, self.playback.count,
+			self.playback.speed, "" if self.playback.playing else " (paused)")
+
+	# -- search
+	def search_open(self):
+		# no prompt without an index to search
+		if self.model.index is not None and self.model.index.tokens:
+			self.search_prompt = ""
+
+	def search_cancel(self):
+		self.search_prompt = None
+
+	def search_run(self):
+		self.search_query, self.search_prompt = self.search_prompt, None
+		try:
+			result = self.model.search(self.search_query)
+		except ValueError as e:
+			self.search_hits = None
+			self.search_text = str(e)
+			return
+		# lines without segments of their own (e.g. '#814=2.') show the next segment
+		lines = np.setdiff1d(result.lines, self.model.columns.lineNb[result.segments])
+		hits = np.union1d(result.segments, self.model.index.nextSegments(self.model, lines))
+		self.search_hits = hits[hits >= 0]
+		self.search_hit = 0
+		if not len(self.search_hits):
+			self.search_text = "%s: no hits" % self.search_query
+			return
+		self.search_jump()
+
+	def search_step(self, direction):
+		if self.search_hits is not None and len(self.search_hits):
+			self.search_hit = (self.search_hit + direction) % len(self.search_hits)
+			self.search_jump()
+
+	def search_jump(self):
+		# activate the layer of the hit and focus its segment
+		index = int(self.search_hits[self.search_hit])
+		layerIdx = int(self.model.columns.layerIdx[index])
+		if layerIdx != self.layerIdx:
+			self.layerIdx = layerIdx
+			self.layer_update()
+		self.focus_segment = index - self.model.layers[layerIdx].first
+		self.set_focus_segment()
+		if self.playback is not None:
+			self.playback.seek(index)
+			self.playback_update()
+		self.search_text = "%s: hit %d/%d, line %d" % (self.search_query, self.search_hit + 1,
+			len(self.search_hits), self.model.columns.lineNb[index])
+
+	# -- tool visibility
+	def tools_open(self):
+		self.tool_prompt = ""
+
+	def tools_cancel(self):
+		self.tool_prompt = None
+
+	def tools_run(self):
+		# toggles the tools typed, e.g. 'T31-T34' or 'gang'; nothing shows all
+		spec, self.tool_prompt = self.tool_prompt, None
+		if spec.strip():
+			self.tools_apply(self.tool_filter.toggle, spec)
+		else:
+			self.tools_apply(self.tool_filter.show_all)
+
+	def tools_toggle(self, number):
+		# the number-th tool of the list, 0 shows all
+		if number == 0:
+			self.tools_apply(self.tool_filter.show_all)
+		elif number <= len(self.tool_filter.tools):
+			self.tools_apply(self.tool_filter.toggle, self.tool_filter.tools[number - 1] or "-")
+
+	def tools_apply(self, change, *args):
+		# only the layers drawn change, their buffers stay as they are
+		try:
+			change(*args)
+		except ValueError as e:
+			self.tool_text = str(e)
+			return
+		self.tool_text = ""
+		self.section_update()
+
+	# -- cross section
+	def section_cycle(self):
+		# no plane, a Z plane, an X plane; a new plane starts in the middle of the part
+		axes = [None, "Z", "X"]
+		self.section_axis = axes[(axes.index(self.section_axis) + 1) % len(axes)]
+		self.section_value = None
+		self.section_update()
+
+	def section_range(self):
+		bbox = self.model.bbox
+		return (bbox.zmin, bbox.zmax) if self.section_axis == "Z" else (bbox.xmin, bbox.xmax)
+
+	def section_move(self, fraction):
+		# by a fraction of the part's extent along the axis
+		if self.section_axis is not None:
+			lo, hi = self.section_range()
+			self.section_value = min(max(self.section_value + fraction * (hi - lo), lo), hi)
+			self.section_update()
+
+	def section_update(self):
+		self.section = self.section_graphics = None
+		self.section_text = ""
+		if self.section_axis is None:
+			return
+		if self.section_value is None:
+			self.section_value = sum(self.section_range()) / 2
+		t1 = time.time()
+		section = self.model.section(self.section_axis, self.section_value)
+		# segments of hidden tools are not cut
+		visible = self.tool_filter.visible[self.model.columns.layerIdx[section.segments]]
+		self.section = section
+		points = section.vertices(visible)
+		if len(points):
+			color = [int(c*255) for c in colorMap['section']]
+			self.section_graphics = pyglet.graphics.vertex_list(len(points),
+				('v3f/static', points.ravel().tolist()),
+				('c4B/static', color*len(points))
+			)
+		self.section_text = "section %s=%.3f: %d segments cut (%.1f ms)" % (self.section_axis, self.section_value,
+			len(points), (time.time() - t1) * 1000.)
+
+	def section_plane(self):
+		# the clip plane equation keeping the side below the plane, in vertex coordinates (X halved)
+		if self.section_axis == "Z":
+			return (0., 0., -1., self.section_value)
+		return (-1., 0., 0., self.section_value / 2)
+
+	def time_step(self, direction):
+		# diffs have no channel timeline
+		if self.program is None:
+			return
+		self.set_time(self.time + direction * self.program.timeline.duration / 200)
+
+	# -- rotate		
+	def rotate_drag_start(self, x, y, button, modifiers):
+		self.rotateDragStartRX = self.RX
+		self.rotateDragStartRZ = self.RZ
+		self.rotateDragStartX = x
+		self.rotateDragStartY = y
+
+	def rotate_drag_do(self, x, y, dx, dy, buttons, modifiers):
+		# deltas
+		deltaX = x - self.rotateDragStartX
+		deltaY = y - self.rotateDragStartY
+		# rotate!
+		self.RZ = self.rotateDragStartRZ + deltaX/5.0 # mouse X bound to model Z
+		self.RX = self.rotateDragStartRX + deltaY/5.0 # mouse Y bound to model X
+
+	def rotate_drag_end(self, x, y, button, modifiers):
+		self.rotateDragStartRX = None
+		self.rotateDragStartRZ = None
+		self.rotateDragStartX = None
+		self.rotateDragStartY = None
+
+	def layer_drag_start(self, x, y, button, modifiers):
+		self.layerDragStartLayer = self.layerIdx
+		self.layerDragStartX = x
+		self.layerDragStartY = y
+
+	def layer_drag_do(self, x, y, dx, dy, buttons, modifiers):
+		# sum x & y
+		delta = x - self.layerDragStartX + y - self.layerDragStartY
+		# new theoretical layer
+		self.layerIdx = int(self.layerDragStartLayer + delta//5)
+		# clamp layer to 0-max
+		self.layerIdx = max(min(self.layerIdx, self.model.topLayer), 0)
+		self.layer_update()
+		
+	#	# clamp layer to 0-max, with origin slip
+	#	if (self.layerIdx < 0):
+	#		self.layerIdx = 0
+	#		self.layerDragStartLayer = 0
+	#		self.layerDragStartX = x
+	#		self.layerDragStartY = y
+	#	if (self.layerIdx > len(self.model.layers)-1):
+	#		self.layerIdx = len(self.model.layers)-1
+	#		self.layerDragStartLayer = len(self.model.layers)-1
+	#		self.layerDragStartX = x
+	#		self.layerDragStartY = y
+
+	# -- layer select		
+	def layer_update(self):
+		#self.window.layerLabel.text = "layer %d (z=%.2f)" % (self.layerIdx,self.model.layers[self.layerIdx].start['Z'])
+		if self.model.layers[self.layerIdx].bbox.zmin != self.model.layers[self.layerIdx].bbox.zmax:
+			self.window.layerLabel.text = "layer %d (%s..%s)" % (self.layerIdx,self.model.layers[self.layerIdx].tool,self.model.layers[self.layerIdx].tool)
+		else:
+			self.window.layerLabel.text = "layer %d (%s)" % (self.layerIdx,self.model.layers[self.layerIdx].tool)
+		self.focus_segment = 0
+		self.set_focus_segment()
+		self.update_residency()
+		#print(self.model.layers[self.layerIdx].bbox.zmin)
+
+	def layer_up(self):
+		self.layerIdx = max(min(self.layerIdx+1, self.model.topLayer), 0)
+		self.layer_update()
+
+	def layer_down(self):
+		self.layerIdx = max(min(self.layerIdx-1, self.model.topLayer), 0)
+		self.layer_update()
+
+	def layer_bottom(self):
+		self.layerIdx = min(1, self.model.topLayer)
+		self.layer_update()
+
+	def layer_top(self):
+		self.layerIdx = self.model.topLayer
+		self.layer_update()
+
+	def layer_drag_end(self, x, y, button, modifiers):
+		self.layerDragStartLayer = None
+		self.layerDragStartX = None
+		self.layerDragStartY = None
+
+	def focus_up(self):
+		self.focus_segment= max(min(self.focus_segment+1, len(self.model.layers[self.layerIdx].segments)-1), 0)	
+		self.set_focus_segment()
+
+	def focus_down(self):
+		self.focus_segment = max(min(self.focus_segment-1, len(self.model.layers[self.layerIdx].segments)-1), 0)
+		self.set_focus_segment()
+
+	# -- panning
+	def panning_start(self, x, y, button, modifiers):
+		self.panningStartPX = self.PX
+		self.panningStartPY = self.PY
+		self.panningStartX = x
+		self.panningStartY = y
+
+	def panning_do(self, x, y, dx, dy, buttons, modifiers):
+		# deltas
+		#deltaX = x - self.panningStartX
+		#deltaY = y - self.panningStartY
+		# -- panning done with proper rotation
+		deltaX = math.cos(-self.RZ/180*math.pi) * (x - self.panningStartX) + math.sin(self.RZ/180*math.pi) * (y - self.panningStartY)
+		deltaY = math.sin(-self.RZ/180*math.pi) * (x - self.panningStartX) + math.cos(self.RZ/180*math.pi) * (y - self.panningStartY)
+		# pan!
+		f = 5
+		self.PX = self.panningStartPX + deltaX/f # mouse X bound to model X
+		self.PY = self.panningStartPY + deltaY/f # mouse Y bound to model Y
+
+	def panning_end(self, x, y, button, modifiers):
+		self.panningStartX = None
+		self.panningStartY = None
+
+
+class LayerBuffer:
+	"""Vertex buffer of one layer's line strip: float32 positions, then the colors of the 3 display types."""
+
+	def __init__(self, vertices, colors):
+		positions = np.ascontiguousarray(vertices, dtype=np.float32)
+		self.count = len(positions)//3
+		data = np.concatenate([positions.view(np.uint8)] + [np.ascontiguousarray(c, dtype=np.uint8) for c in colors])
+		self.vbo = GLuint()
+		glGenBuffers(1, byref(self.vbo))
+		glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+		glBufferData(GL_ARRAY_BUFFER, data.nbytes, data.ctypes.data, GL_STATIC_DRAW)
+		glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+	def draw(self, display_type, mode=GL_LINE_STRIP, first=0, count=None):
+		# returns the number of vertices drawn
+		count = self.count if count is None else count
+		glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+		glEnableClientState(GL_VERTEX_ARRAY)
+		glEnableClientState(GL_COLOR_ARRAY)
+		glVertexPointer(3, GL_FLOAT, 0, 0)
+		glColorPointer(4, GL_UNSIGNED_BYTE, 0, self.count*12 + display_type*self.count*4)
+		glDrawArrays(mode, first, count)
+		glDisableClientState(GL_COLOR_ARRAY)
+		glDisableClientState(GL_VERTEX_ARRAY)
+		glBindBuffer(GL_ARRAY_BUFFER, 0)
+		return count
+
+	def delete(self):
+		glDeleteBuffers(1, byref(self.vbo))
+
+class GpuTimer:
+	"""GPU milliseconds of every frame from GL_TIME_ELAPSED queries.
+
+	A query is read back `depth` frames after it was issued, when the GPU is
+	done with it, so that measuring does not make the CPU wait for the GPU.
+	"""
+
+	def __init__(self, depth=4):
+		self.depth = depth
+		self.queries = (GLuint * depth)()
+		glGenQueries(depth, self.queries)
+		self.frame = 0
+
+	@classmethod
+	def create(cls):
+		# timer queries are core since OpenGL 3.3
+		if gl_info.have_version(3, 3) or gl_info.have_extension('GL_ARB_timer_query'):
+			return cls()
+		return None
+
+	def result(self, slot):
+		elapsed = GLuint64()
+		glGetQueryObjectui64v(self.queries[slot], GL_QUERY_RESULT, byref(elapsed))
+		return elapsed.value / 1e6
+
+	def begin(self):
+		# returns the time of the frame that used this query before, if any
+		slot = self.frame % self.depth
+		done = self.result(slot) if self.frame >= self.depth else None
+		glBeginQuery(GL_TIME_ELAPSED, self.queries[slot])
+		return done
+
+	def end(self):
+		glEndQuery(GL_TIME_ELAPSED)
+		self.frame += 1
+
+	def flush(self):
+		# the times of the frames still in flight, oldest first, and start over
+		times = [self.result(i % self.depth) for i in range(max(self.frame - self.depth, 0), self.frame)]
+		self.frame = 0
+		return times
+
+def glLine(p1,p2,c):
+	glBegin(GL_LINES)
+	glColor4f(c[0],c[1],c[2],c[3])
+	glVertex3f(p1[0],p1[1],p1[2])
+	glVertex3f(p2[0],p2[1],p2[2])
+	glEnd()
+	
+class MyWindow(pyglet.window.Window):
+
+	# constructor
+	def __init__(self, app, **kwargs):
+		pyglet.window.Window.__init__(self, **kwargs)
+		self.app = app
+		#self.hud()
+	
+	# hud info
+	def hud(self):
+		
+		# HUD labels
+		self.blLabels = []
+		self.brLabels = []
+		self.tlLabels = []
+		self.trLabels = []
+
+		c_texti = list(map(lambda x: int(x*255), colorMap['text']))
+		#self.brLabels.append(pyglet.text.Label("yagv "+YAGV_VERSION,font_size=10,color=c_texti,anchor_x='right', anchor_y='bottom'))
+		self.gpuLabel = pyglet.text.Label("", font_size=10,color=c_texti,anchor_x='right', anchor_y='bottom')
+		self.brLabels.append(self.gpuLabel)
+		## frame times
+		self.frameLabel = pyglet.text.Label("", font_size=10,color=c_texti,anchor_x='right', anchor_y='bottom')
+		if self.app.frame_stats is not None:
+			self.brLabels.append(self.frameLabel)
+      
+		# help
+		self.helpText = [
+						"Left-mouse: rotate | Middle: change layer, Scroll: zoom | Right: panning   Ctrl-R: reload   Left/Right: channel timeline",
+						"Space: play/pause   +/-: playback speed   PgUp/PgDn: seek   Backspace: stop playback",
+						"/: search (e.g. #814, G1 Z<-20, T21), Enter: go, N/Shift-N: next/previous hit",
+						"1-9: show/hide the n-th tool, 0: all   T: show/hide tools (e.g. T31-T34, gang, sub, back)",
+						"C: section at Z/X/off   [/]: move the section plane (Shift: finer), Ctrl-Left-mouse: drag it",
+						"Tab/Shift-Tab: next/previous program (yagv a.prg b.prg ...)"]
+		for txt in self.helpText:
+			self.blLabels.append(
+				pyglet.text.Label(	txt,
+									font_size=10,color=c_texti) )
+
+		# statistics
+		## model stats
+		self.statsLabel = pyglet.text.Label(	"",
+										font_size=10,color=c_texti,
+										anchor_y='top')
+		filename = os.path.basename(self.app.path)
+		self.statsLabel.text = "%s: %d layers (%d segments)" % (filename, len(self.app.model.layers), len(self.app.model.segments))
+		
+		## focused segment's line
+		self.focusLabel = pyglet.text.Label(	"",
+										font_size=10,color=c_texti,
+										anchor_y='top')
+		## channel timeline
+		self.timeLabel = pyglet.text.Label(	"",
+										font_size=10,color=c_texti,
+										anchor_y='top')
+		## parser warnings, the most frequent kind first
+		self.diagnosticsLabel = pyglet.text.Label(	"",
+										font_size=10,color=c_texti,
+										anchor_y='top')
+		diagnostics = self.app.model.diagnostics
+		if diagnostics.total:
+			self.diagnosticsLabel.text = "%d warnings, %s" % (diagnostics.total, diagnostics.summary()[0])
+		self.tlLabels.append(self.statsLabel)
+		self.tlLabels.append(self.focusLabel)
+		self.tlLabels.append(self.timeLabel)
+		self.tlLabels.append(self.diagnosticsLabel)
+		## search prompt & hits
+		self.searchLabel = pyglet.text.Label(	"",
+										font_size=10,color=c_texti,
+										anchor_y='top')
+		self.tlLabels.append(self.searchLabel)
+		## cross section
+		self.sectionLabel = pyglet.text.Label(	"",
+										font_size=10,color=c_texti,
+										anchor_y='top')
+		self.tlLabels.append(self.sectionLabel)
+		if self.app.clearance is not None:
+			self.tlLabels.append(pyglet.text.Label("clearance %g: %d of %d rapids too close" % (
+				self.app.clearance.threshold, len(self.app.clearance.violations), len(self.app.clearance.rapids)),
+				font_size=10,color=c_texti,anchor_y='top'))
+
+		# status
+		## current Layer
+		self.layerLabel = pyglet.text.Label(	"layer %d (%s)" % (
+			self.app.layerIdx,
+			self.app.model.layers[self.app.layerIdx].tool,
+			#self.app.model.layers[self.app.layerIdx].end['Z']
+			#self.app.model.layers[self.app.layerIdx].bbox.zmin,
+			#self.app.model.layers[self.app.layerIdx].bbox.zmax
+			), font_size=10,color=c_texti,anchor_x='right', anchor_y='top')
+		self.trLabels.append(self.layerLabel)
+		## playback position
+		self.playbackLabel = pyglet.text.Label("", font_size=10,color=c_texti,anchor_x='right', anchor_y='top')
+		self.trLabels.append(self.playbackLabel)
+		## tools shown
+		self.toolsLabel = pyglet.text.Label("", font_size=10,color=c_texti,anchor_x='right', anchor_y='top')
+		self.trLabels.append(self.toolsLabel)
+
+		# layout the labels in the window's corners
+		self.placeLabels(self.width, self.height)
+	
+	
+	# events
+	def on_resize(self, width, height):
+		glViewport(0, 0, width, height)
+		self.placeLabels(width, height)
+		#self.render(width, height)
+		
+		return pyglet.event.EVENT_HANDLED
+
+	def on_mouse_press(self, x, y, button, modifiers):
+		#print("on_mouse_press(x=%d, y=%d, button=%s, modifiers=%s)"%(x, y, button, modifiers))
+		if button & mouse.LEFT:
+			self.app.rotate_drag_start(x, y, button, modifiers)
+			
+		if button & mouse.MIDDLE:
+			self.app.layer_drag_start(x, y, button, modifiers)
+
+		if button & mouse.RIGHT:
+			self.app.panning_start(x, y, button, modifiers)
+
+
+	def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
+		#print("on_mouse_drag(x=%d, y=%d, dx=%d, dy=%d, buttons=%s, modifiers=%s)"%(x, y, dx, dy, buttons, modifiers))
+		if buttons & mouse.LEFT and modifiers & pyglet.window.key.MOD_CTRL and self.app.section_axis is not None:
+			# Ctrl-drag moves the section plane, the window's height across the part
+			self.app.section_move(dy / self.height)
+		elif buttons & mouse.LEFT:
+			self.app.rotate_drag_do(x, y, dx, dy, buttons, modifiers)
+			
+		if buttons & mouse.MIDDLE:
+			self.app.layer_drag_do(x, y, dx, dy, buttons, modifiers)
+
+		if buttons & mouse.RIGHT:
+			self.app.panning_do(x, y, dx, dy, buttons, modifiers)
+
+
+	def on_mouse_release(self, x, y, button, modifiers):
+		#print("on_mouse_release(x=%d, y=%d, button=%s, modifiers=%s)"%(x, y, button, modifiers))
+		if button & mouse.LEFT:
+			self.app.rotate_drag_end(x, y, button, modifiers)
+			
+		if button & mouse.MIDDLE:
+			self.app.layer_drag_end(x, y, button, modifiers)
+
+		if button & mouse.RIGHT:
+			self.app.panning_end(x, y, button, modifiers)
+
+	def on_key_press(self, symbol, modifiers):
+		# Escape closes the search or tool prompt rather than the window
+		if symbol==pyglet.window.key.ESCAPE and self.app.search_prompt is not None:
+			self.app.search_cancel()
+			return pyglet.event.EVENT_HANDLED
+		if symbol==pyglet.window.key.ESCAPE and self.app.tool_prompt is not None:
+			self.app.tools_cancel()
+			return pyglet.event.EVENT_HANDLED
+		return pyglet.window.Window.on_key_press(self, symbol, modifiers)
+
+	def on_text(self, text):
+		if self.app.search_prompt is not None and text.isprintable():
+			self.app.search_prompt += text
+		elif self.app.tool_prompt is not None and text.isprintable():
+			self.app.tool_prompt += text
+
+	def on_text_motion(self, motion):
+		if self.app.search_prompt is not None and motion==pyglet.window.key.MOTION_BACKSPACE:
+			self.app.search_prompt = self.app.search_prompt[:-1]
+		elif self.app.tool_prompt is not None and motion==pyglet.window.key.MOTION_BACKSPACE:
+			self.app.tool_prompt = self.app.tool_prompt[:-1]
+
+	def on_key_release(self, symbol, modifiers):
+		#print("pressed key: %s, mod: %s"%(symbol, modifiers))
+		#print("pressed key: %s, mod: %s"%(pyglet.window.key.R, pyglet.window.key.MOD_CTRL))
+
+		# typing a search query
+		if self.app.search_prompt is not None:
+			if symbol in (pyglet.window.key.RETURN, pyglet.window.key.ENTER):
+				self.app.search_run()
+			return
+		# typing a tool selection
+		if self.app.tool_prompt is not None:
+			if symbol in (pyglet.window.key.RETURN, pyglet.window.key.ENTER):
+				self.app.tools_run()
+			return
+
+		if symbol==pyglet.window.key.R and modifiers & pyglet.window.key.MOD_CTRL:
+			self.app.reload()
+		elif symbol==pyglet.window.key.UP:
+			self.app.layer_up()
+		elif symbol==pyglet.window.key.DOWN:
+			self.app.layer_down()
+		elif symbol==pyglet.window.key.HOME:
+			self.app.layer_bottom()
+		elif symbol==pyglet.window.key.END:
+			self.app.layer_top()
+		elif symbol==pyglet.window.key.W:
+			self.app.focus_up()
+		elif symbol==pyglet.window.key.S:
+			self.app.focus_down()
+		elif symbol==pyglet.window.key.RIGHT:
+			self.app.time_step(1)
+		elif symbol==pyglet.window.key.LEFT:
+			self.app.time_step(-1)
+		elif symbol==pyglet.window.key.SLASH or (symbol==pyglet.window.key.F and modifiers & pyglet.window.key.MOD_CTRL):
+			self.app.search_open()
+		elif symbol==pyglet.window.key.T:
+			self.app.tools_open()
+		elif symbol==pyglet.window.key.TAB:
+			self.app.tab_switch(-1 if modifiers & pyglet.window.key.MOD_SHIFT else 1)
+		elif symbol==pyglet.window.key.C:
+			self.app.section_cycle()
+		elif symbol in (pyglet.window.key.BRACKETLEFT, pyglet.window.key.BRACKETRIGHT):
+			step = .002 if modifiers & pyglet.window.key.MOD_SHIFT else .02
+			self.app.section_move(step if symbol==pyglet.window.key.BRACKETRIGHT else -step)
+		elif pyglet.window.key._0 <= symbol <= pyglet.window.key._9:
+			self.app.tools_toggle(symbol - pyglet.window.key._0)
+		elif symbol==pyglet.window.key.N:
+			self.app.search_step(-1 if modifiers & pyglet.window.key.MOD_SHIFT else 1)
+		elif symbol==pyglet.window.key.SPACE:
+			self.app.playback_toggle()
+		elif symbol==pyglet.window.key.BACKSPACE:
+			self.app.playback_stop()
+		elif symbol==pyglet.window.key.PAGEUP:
+			self.app.playback_seek(1)
+		elif symbol==pyglet.window.key.PAGEDOWN:
+			self.app.playback_seek(-1)
+		elif symbol in (pyglet.window.key.PLUS, pyglet.window.key.EQUAL, pyglet.window.key.NUM_ADD):
+			self.app.playback_speed(2)
+		elif symbol in (pyglet.window.key.MINUS, pyglet.window.key.NUM_SUBTRACT):
+			self.app.playback_speed(.5)
+		else:
+			print("pressed key: %s, mod: %s"%(symbol, modifiers))
+		
+	def placeLabels(self, width, height):
+		x = 5
+		y = 5
+		for label in self.blLabels:
+			label.x = x
+			label.y = y
+			y += 20
+			
+		x = width - 5
+		y = 5
+		for label in self.brLabels:
+			label.x = x
+			label.y = y
+			y += 20
+			
+		x = 5
+		y = height - 5
+		for label in self.tlLabels:
+			label.x = x
+			label.y = y
+			y -= 20
+			
+		x = width - 5
+		y = height - 5
+		for label in self.trLabels:
+			label.x = x
+			label.y = y
+			y -= 20
+
+
+	def on_mouse_scroll(self, x, y, dx, dy):
+		# zoom on mouse scroll
+		delta = dx + dy
+		if delta == 0:
+			return
+		z = 1.2 if delta>0 else 1/1.2
+		self.app.zoom = max(1.0, self.app.zoom * z)
+		#print('mouse scroll:', `x, y, dx, dy`, `z, self.app.zoom`)
+
+	def on_draw(self):
+		#print("draw")
+		stats = self.app.frame_stats
+		if stats is not None:
+			t0 = time.perf_counter()
+			if self.app.gpu_timer is not None:
+				gpu = self.app.gpu_timer.begin()
+				if gpu is not None:
+					stats.add_gpu(gpu)
+		self.frame_draws = 0
+		self.frame_vertices = 0
+		
+		# Clear buffers
+		glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+		
+		# setup projection
+		glMatrixMode(GL_PROJECTION)
+		glLoadIdentity()
+		gluPerspective(65, self.width / float(self.height), 0.1, 1000)
+		
+		# setup camera
+		glMatrixMode(GL_MODELVIEW)
+		glLoadIdentity()
+		gluLookAt(0,1.5,2,0,0,0,0,1,0)
+		
+		# enable alpha blending
+		glEnable(GL_BLEND)
+		glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+		
+		# rotate axes to match machine
+		glRotated(90, 0,0,1)
+		glRotated(90, 1,0,0)
+		
+		# user rotate model
+		glRotated(-self.app.RX, 1,0,0)
+		glRotated(self.app.RZ, 0,0,1)
+		#print(self.app.RX, self.app.RZ)
+		# Todo check this
+		glTranslated(0,0,-0.5)
+		
+		# fit & user zoom model
+		max_width = max(
+			self.app.model.bbox.dx(),
+			self.app.model.bbox.dy(),
+			self.app.model.bbox.dz()
+		)
+		scale = self.app.zoom / max_width
+		glScaled(scale, scale, scale)
+		
+		# user pan model
+		glTranslated(self.app.PX,self.app.PY,0)
+
+		glTranslated(-self.app.model.bbox.cx(), -self.app.model.bbox.cy(), -self.app.model.bbox.cz())
+		
+		# draw axes
+		glLineWidth(1)
+		glBegin(GL_LINES)
+		glColor3f(1,0,0)
+		glVertex3f(0,0,0); glVertex3f(1,0,0); glVertex3f(1,0,0); glVertex3f(1,0.1,0)
+		glVertex3f(1,0,0); glVertex3f(self.app.model.bbox.xmax,0,0)
+		glColor3f(0,1,0)
+		glVertex3f(0,0,0); glVertex3f(0,1,0); glVertex3f(0,1,0); glVertex3f(0,1,0.1)
+		glVertex3f(0,1,0); glVertex3f(0,self.app.model.bbox.ymax,0)
+		glColor3f(0,0,1)
+		glVertex3f(0,0,0); glVertex3f(0,0,1); glVertex3f(0,0,1); glVertex3f(0.1,0,1)
+		glVertex3f(0,0,1); glVertex3f(0,0,self.app.model.bbox.zmax)
+		glEnd()
+		
+		# # draw bed grid
+		# for y in range(0,self.app.conf['bed_size'][1]+1):
+		# 	glLine([0,y,0],[self.app.conf['bed_size'][0],y,0],[colorMap['grid'][0],colorMap['grid'][1],colorMap['grid'][2],0.3 if y%10 == 0 else 0.1])
+		# for x in range(0,self.app.conf['bed_size'][0]+1):
+		# 	glLine([x,0,0],[x,self.app.conf['bed_size'][1],0],[colorMap['grid'][0],colorMap['grid'][1],colorMap['grid'][2],0.3 if x%10 == 0 else 0.1])
+
+		# -- draw the model layers: lower (0), highlighted (1) and limbo (2) layers,
+		#    skipping those not resident under the GPU budget and those of hidden tools,
+		#    and during playback only up to the tool
+		# a layer is a line strip whose lines take the color of their end vertex
+		glLineWidth(2)
+		glShadeModel(GL_FLAT)
+		if self.app.section_axis is not None:
+			# the layers are clipped at the section plane
+			glClipPlane(GL_CLIP_PLANE0, (GLdouble * 4)(*self.app.section_plane()))
+			glEnable(GL_CLIP_PLANE0)
+		self.app.frame_uploads = 0
+		playback = self.app.playback
+		for layer_idx in np.flatnonzero(self.app.tool_filter.visible).tolist():
+			count = None
+			if playback is not None:
+				count = self.app.drawn_count(layer_idx, playback.segment)
+				if count == 0:
+					continue
+			buffer = self.app.layer_buffer(layer_idx)
+			if buffer is not None:
+				display_type = 0 if layer_idx < self.app.layerIdx else 1 if layer_idx == self.app.layerIdx else 2
+				self.count_draw(buffer.draw(display_type, count=count))
+		glShadeModel(GL_SMOOTH)
+		glDisable(GL_CLIP_PLANE0)
+
+		# where the section plane cuts the toolpaths
+		if self.app.section_graphics is not None:
+			glPointSize(6)
+			self.draw_list(self.app.section_graphics, GL_POINTS)
+			glPointSize(1)
+		
+		# Focus line, or the tool during playback: the part of its segment done and a cross
+		glLineWidth(4)
+		if self.app.playback_marker is None:
+			self.draw_list(self.app.focus_vertices, GL_LINES)
+		else:
+			start, tool = self.app.playback_marker
+			size = max_width / 50
+			glBegin(GL_LINES)
+			glColor4f(*colorMap['playback_tool'])
+			glVertex3f(*start); glVertex3f(*tool)
+			for axis in np.eye(3) * size:
+				glVertex3f(*(tool - axis)); glVertex3f(*(tool + axis))
+			glEnd()
+			self.count_draw(8)
+
+		# channel positions on the timeline
+		if self.app.time_vertices is not None:
+			self.draw_list(self.app.time_vertices, GL_LINES)
+
+		# removed segments of a diff
+		if self.app.removed_graphics is not None:
+			glLineWidth(2)
+			self.draw_list(self.app.removed_graphics, GL_LINES)
+
+		# simulated stock, translucent over the toolpaths
+		if self.app.stock_graphics is not None:
+			glDepthMask(0)
+			self.draw_list(self.app.stock_graphics, GL_TRIANGLES)
+			glDepthMask(1)
+
+		# disable depth for HUD
+		glDisable(GL_DEPTH_TEST)
+		glDepthMask(0)
+		
+		# Set your camera up for 2d, draw 2d scene
+		glMatrixMode(GL_PROJECTION)
+		glLoadIdentity();
+		glOrtho(0, self.width, 0, self.height, -1, 1)
+		glMatrixMode(GL_MODELVIEW)
+		glLoadIdentity()
+		
+		self.focusLabel.text = self.app.focus_text
+		self.playbackLabel.text = self.app.playback_text
+		self.searchLabel.text = self.app.search_text if self.app.search_prompt is None else "search: %s_" % self.app.search_prompt
+		if stats is not None:
+			self.frameLabel.text = stats.overlay()
+		resident = sum(1 for key in self.app.residency.entries if key[0] == self.app.tab)
+		others = len(self.app.residency.entries) - resident
+		# layers of shown tools that do not fit the budget are not drawn, say so
+		visible = self.app.tool_filter.visible
+		hidden = sum(1 for tab, idx in self.app.residency.left_out if tab == self.app.tab and idx < len(visible) and visible[idx])
+		self.gpuLabel.text = "gpu: %d/%d layers%s, %.1f/%.0f MB%s" % (resident, len(self.app.vertices),
+			" (+%d of other programs)" % others if others else "",
+			self.app.residency.used / (1 << 20), self.app.residency.budget / (1 << 20),
+			", %d layers hidden by the GPU budget (--gpu-budget)" % hidden if hidden else "")
+		self.timeLabel.text = self.app.time_text
+		self.sectionLabel.text = self.app.section_text
+		if self.app.tool_prompt is not None:
+			self.toolsLabel.text = "tools: %s_" % self.app.tool_prompt
+		else:
+			self.toolsLabel.text = self.app.tool_text or self.app.tool_filter.summary()
+		
+		for label in self.blLabels:
+			label.draw()
+		for label in self.brLabels:
+			label.draw()
+		for label in self.tlLabels:
+			label.draw()
+		for label in self.trLabels:
+			label.draw()
+	
+
+		# reenable depth for next model display
+		glEnable(GL_DEPTH_TEST)
+		glDepthMask(1)
+
+		if stats is not None:
+			if self.app.gpu_timer is not None:
+				self.app.gpu_timer.end()
+			stats.add((time.perf_counter() - t0) * 1000, self.frame_draws, self.frame_vertices)
+
+	def draw_list(self, vertex_list, mode):
+		vertex_list.draw(mode)
+		self.count_draw(vertex_list.get_size())
+
+	def count_draw(self, vertices):
+		# draw calls & vertices of the scene this frame, the HUD aside
+		self.frame_draws += 1
+		self.frame_vertices += vertices
+
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# Workspaces: several programs open at once, e.g. the main program next to
+# its sub-spindle and bar-feeder programs. They share one pool of parse worker
+# processes, started once, and one cache of parsed channels keyed by their
+# content, so a program opened again, or a channel two programs have in
+# common, is parsed only once. Programs are opened in background threads while
+# the first one is shown.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from src.gcodeParser import GcodeParser
+from src.channels import ChannelProgram
+
+# parsed channels kept
+DEFAULT_CACHE = 16
+
+class ParseCache:
+	"""The `size` most recently used parsed channels, keyed by text, line numbers and parse options.
+
+	Entries are futures: a channel still being parsed for one program is
+	waited for by the others rather than parsed again.
+	"""
+
+	def __init__(self, size=DEFAULT_CACHE):
+		self.size = size
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	@staticmethod
+	def key(lines, lineNbs, options={}):
+		digest = hashlib.sha1("\n".join(lines).encode("utf-8", "surrogatepass"))
+		digest.update(np.asarray(lineNbs, dtype=np.int64).tobytes())
+		digest.update(repr(sorted(options.items())).encode())
+		return digest.hexdigest()
+
+	def claim(self, key):
+		"""(future, owner) of a key; the owner (on a miss) must set the future's result."""
+		with self.lock:
+			future = self.entries.get(key)
+			if future is not None:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return future, False
+			self.misses += 1
+			future = self.entries[key] = Future()
+			while len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+			return future, True
+
+	def discard(self, key):
+		with self.lock:
+			self.entries.pop(key, None)
+
+	def stats(self):
+		return {"cached": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+	def __str__(self):
+		return "<ParseCache: %d of %d channels, %d hits, %d misses>" % (len(self.entries), self.size, self.hits, self.misses)
+
+class Workspace:
+	"""Programs open together, parsed by one worker pool through one ParseCache."""
+
+	def __init__(self, workers=None, cache_size=DEFAULT_CACHE):
+		self.workers = workers or os.cpu_count() or 1
+		self.cache = ParseCache(cache_size)
+		self.pool = None
+		self.threads = None
+		self.lock = threading.Lock()
+
+	def executor(self):
+		# worker processes start with the first program large enough to need them;
+		# a single one would only add the copying of its models
+		if self.workers < 2:
+			return None
+		with self.lock:
+			if self.pool is None:
+				self.pool = ProcessPoolExecutor(max_workers=self.workers)
+			return self.pool
+
+	def program(self, code, profile=None, **options):
+		"""The ChannelProgram of `code`, see ChannelProgram for the options."""
+		return ChannelProgram(code, profile=profile, pool=self.executor(), cache=self.cache, **options)
+
+	def submit(self, function, *args):
+		"""A future of `function(*args)` run in a background thread, e.g. to open a program."""
+		with self.lock:
+			if self.threads is None:
+				self.threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="yagv-open")
+		return self.threads.submit(function, *args)
+
+	def open(self, path, profile=None, **options):
+		"""A future of the ChannelProgram of a file, parsed in the background."""
+		return self.submit(lambda: self.program(GcodeParser().file_to_lines_array(path), profile, **options))
+
+	def close(self):
+		for executor in (self.threads, self.pool):
+			if executor is not None:
+				executor.shutdown(wait=True)
+		self.pool = self.threads = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __str__(self):
+		return "<Workspace: %d workers, %s>" % (self.workers, self.cache)
@@ -0,0 +1,40 @@
+import json
+from src.benchmark import FrameStats, camera_script, distribution
+
+class Test_benchmark:
+    def test_script_sweeps_every_layer_once(self):
+        script = camera_script(100, 7)
+        assert len(script) == 100
+        layers = [layerIdx for _, _, _, layerIdx in script]
+        assert layers[0] == 0 and layers[-1] == 6
+        assert layers == sorted(layers) and set(layers) == set(range(7))
+        assert script[0][2] == script[-1][2] == 1.
+        assert max(zoom for _, _, zoom, _ in script) > 3.9
+        assert camera_script(100, 7) == script
+
+    def test_percentiles(self):
+        values = distribution(range(1, 101))
+        assert values["p50"] == 50.5 and values["max"] == 100.
+        assert abs(values["p99"] - 99.01) < 1e-9
+        assert distribution([]) is None
+
+    def test_stats_without_gpu_times(self, tmp_path):
+        stats = FrameStats()
+        for i in range(20):
+            stats.add(float(i), draws=3, vertices=1000)
+        summary = stats.summary()
+        assert summary["frames"] == 20 and summary["gpu_ms"] is None
+        assert summary["draw_calls"]["max"] == 3
+        assert stats.report()[2].split() == ["gpu_ms", "n/a"]
+        stats.write(str(tmp_path / "bench.json"), program="part.prg")
+        written = json.load(open(str(tmp_path / "bench.json")))
+        assert written["program"] == "part.prg" and written["cpu_ms"]["p95"] == summary["cpu_ms"]["p95"]
+
+    def test_overlay_keeps_the_last_frames(self):
+        stats = FrameStats(window=10)
+        assert stats.overlay() == ""
+        for i in range(100):
+            stats.add(100. if i < 90 else 2., draws=5, vertices=40)
+            stats.add_gpu(1.)
+        assert len(stats) == 10
+        assert stats.overlay() == "frame cpu 2.0 ms (p95 2.0), gpu 1.0 ms (p95 1.0), 5 draws, 40 vertices"
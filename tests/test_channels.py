@@ -0,0 +1,68 @@
+import pytest
+from src.channels import ChannelProgram, split_channels
+from src.gcodeParser import GcodeParser
+
+PROGRAM = ["$0", "#510=20000", "$1", "T100", "G1X0.Y0.Z0.", "G1Z10.", "!2L1", "G1X#510",
+           "$2", "T3100", "G1X0.Y0.Z0.", "G1Z1.", "!1L1", "G1Z3."]
+
+class Test_split_channels:
+    def test_common_section_is_prepended(self):
+        sections = split_channels(PROGRAM)
+        assert sorted(sections) == [1, 2]
+        lines, lineNbs = sections[2]
+        assert lines[:2] == ["$0", "#510=20000"]
+        assert lineNbs[:3] == [1, 2, 9]
+
+    def test_program_without_headers_is_channel_1(self):
+        sections = split_channels(["G1X1."])
+        assert list(sections) == [1]
+
+class Test_channel_program:
+    def test_channels_parse_into_own_models(self):
+        program = ChannelProgram(PROGRAM, parallel=False)
+        assert len(program.models[1].segments) == 3
+        assert len(program.models[2].segments) == 3
+        assert program.models[1].position['X'] == 2.0
+        assert program.models[2].segments[0].lineNb == 11
+
+    def test_parallel_parse_matches_sequential(self):
+        parallel = ChannelProgram(PROGRAM, parallel=True)
+        sequential = ChannelProgram(PROGRAM, parallel=False)
+        for ch in (1, 2):
+            assert (parallel.models[ch].columns.coords[:3] == sequential.models[ch].columns.coords[:3]).all()
+        assert parallel.timeline.duration == sequential.timeline.duration
+
+    def test_wait_synchronises_channels(self):
+        timeline = ChannelProgram(PROGRAM, parallel=False).timeline
+        # $1 reaches the wait after 2 + 10, $2 after 0.5 + 1 and idles until then
+        assert timeline.starts[1][2] == pytest.approx(12.0)
+        assert timeline.starts[2][2] == pytest.approx(12.0)
+        assert timeline.duration == pytest.approx(14.0)
+        assert timeline.unmatched == []
+
+    def test_segments_at_time(self):
+        timeline = ChannelProgram(PROGRAM, parallel=False).timeline
+        assert timeline.segmentsAt(5.0) == {1: 1, 2: 2}
+
+    def test_unmatched_wait_is_reported(self):
+        timeline = ChannelProgram(["$1", "G1X1.", "!2L5", "G1X2.", "$2", "G1X1."], parallel=False).timeline
+        assert timeline.unmatched == [(1, 2, 5)]
+
+    def test_line_cache_stats_are_summed(self):
+        program = ChannelProgram(PROGRAM + ["G1Z3."], parallel=True)
+        assert program.line_cache_stats() == {"hits": 1, "misses": 16, "replays": 1}
+
+    def test_merged_model_keeps_line_numbers(self):
+        program = ChannelProgram(PROGRAM, parallel=False)
+        model = program.merged()
+        assert len(model.segments) == 6
+        assert program.offsets == {1: 0, 2: 3}
+        assert [layer.tool for layer in model.layers] == ["T1", "T31"]
+        assert model.segments[3].line == "G1X0.Y0.Z0."
+
+class Test_sync_statements:
+    def test_wait_does_not_create_moves(self):
+        parser = GcodeParser()
+        parser.parseCode(["G1X1.", "!2L3", "G1X2."])
+        assert len(parser.model.segments) == 2
+        assert parser.model.syncs == [(2, 3, 1)]
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.clearance import ClearanceCheck, Cylinder, segment_distances, split_segments
+
+def brute_force(model, check):
+    # minimum distance of every checked rapid to all cutting moves except its neighbours
+    n = model.columns.count
+    types = model.columns.type[:n]
+    starts, ends = model.segmentStarts(), model.columns.coords[:n].copy()
+    starts[:, 0] /= 2
+    ends[:, 0] /= 2
+    result = []
+    for r in check.rapids:
+        a, b = starts[r], ends[r]
+        before = max([j for j in range(r) if types[j]], default=-1)
+        after = min([j for j in range(r, n) if types[j]], default=n)
+        cut = [j for j in range(n) if types[j] and j not in (before, after)]
+        d = segment_distances(np.tile(a, (len(cut), 1)), np.tile(b, (len(cut), 1)), starts[cut], ends[cut])
+        result.append(d.min() if len(d) else np.inf)
+    return np.array(result)
+
+class Test_segment_distances:
+    def test_crossing_parallel_and_apart(self):
+        p1 = np.array([[0., 0, 0], [0, 0, 0], [0, 0, 0]])
+        q1 = np.array([[2., 0, 0], [2, 0, 0], [1, 0, 0]])
+        p2 = np.array([[1., -1, 0], [0, 1, 0], [3, 0, 4]])
+        q2 = np.array([[1., 1, 0], [2, 1, 0], [3, 0, 5]])
+        assert segment_distances(p1, q1, p2, q2) == pytest.approx([0, 1, np.sqrt(4 + 16)])
+
+    def test_split_segments(self):
+        starts, ends, idx = split_segments(np.array([[0., 0, 0]]), np.array([[0., 0, 2.5]]), 1.)
+        assert idx.tolist() == [0, 0, 0]
+        assert ends[-1].tolist() == [0, 0, 2.5]
+
+class Test_clearance:
+    def test_rapid_through_cut_is_flagged(self):
+        model = GcodeParser().parseCode(["T100", "G0X20.Z-1.", "G1X10.", "G1Z-10.", "G0X30.", "G0Z5.", "G0X10.2Z-5.", "G0X40.", "G1Z-20."])
+        model.postProcess()
+        check = ClearanceCheck(model, threshold=0.5)
+        assert model.segments[int(check.violations[0])].lineNb == 7
+        assert model.columns.lineNb[check.nearest[check.rapids == check.violations[0]][0]] == 3
+
+    def test_short_plunge_is_flagged(self):
+        # 0.8 mm down to 0.36 mm off the start of the first cut
+        model = GcodeParser().parseCode(["T100", "G0X20.Z1.", "G1Z-10.", "G1X30.", "G0Z2.", "G0X20.6", "G0Z1.2"])
+        model.postProcess()
+        check = ClearanceCheck(model, threshold=0.5)
+        assert [model.segments[int(i)].lineNb for i in check.violations] == [7]
+        assert check.distances[check.rapids == check.violations[0]][0] == pytest.approx(np.hypot(.3, .2))
+
+    def test_retract_through_own_hole_is_not_flagged(self):
+        model = GcodeParser().parseCode(["T100", "G0X0.Z1.", "G1Z-5.", "G0Z1.", "G0X10."])
+        model.postProcess()
+        assert len(ClearanceCheck(model, threshold=0.5).violations) == 0
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        lines = ["T100"] + ["%sX%.3fY%.3fZ%.3f" % (("G0" if rng.random() < 0.3 else "G1",) + tuple(rng.uniform(-10, 10, 3)))
+            for _ in range(300)]
+        model = GcodeParser().parseCode(lines)
+        model.postProcess()
+        check = ClearanceCheck(model, threshold=1.0)
+        expected = brute_force(model, check)
+        near = expected < check.threshold
+        assert (check.distances < check.threshold).tolist() == near.tolist()
+        assert check.distances[near] == pytest.approx(expected[near])
+
+    def test_y_is_not_a_diameter(self):
+        model = GcodeParser().parseCode(["T100", "G0X20.Y0.Z1.", "G1Z-10.", "G1X50.", "G0Z-5.", "G0Y.8", "G0X0.", "G0Y4.",
+                                     "G0X20.8Y0.", "G0Z-8.", "G0X60."])
+        model.postProcess()
+        check = ClearanceCheck(model, threshold=0.5)
+        distance = {model.segments[int(i)].lineNb: d for i, d in zip(check.rapids, check.distances)}
+        # passing the cut at line 3 0.8 mm away in Y, then 0.4 mm in X (0.8 on the diameter)
+        assert distance[7] >= .5
+        assert distance[10] == pytest.approx(.4)
+
+    def test_envelope(self):
+        model = GcodeParser().parseCode(["T100", "G0X10.Z2.", "G0Z-10.", "G0X20.", "G0Z2."])
+        model.postProcess()
+        # rapids at diameter 10 and out of it, inside a 12 mm bushing behind Z-5
+        check = ClearanceCheck(model, threshold=0.5, envelopes=[Cylinder(12, -100, -5)])
+        assert [model.segments[int(i)].lineNb for i in check.violations] == [3, 4]
+        assert check.nearest[check.rapids == check.violations[0]][0] == -1
+
+    def test_bar_behind_the_part(self):
+        model = GcodeParser().parseCode(["T100", "G0X22.Z1.", "G1X16.", "G1Z-10.", "G0X22.", "G0X19.Z-12.", "G0X30."])
+        model.postProcess()
+        # the uncut bar, 20 mm, goes on behind the deepest cut
+        check = ClearanceCheck(model, threshold=0.5, envelopes=[Cylinder(20, -np.inf, -10.5)])
+        flagged = [model.segments[int(i)].lineNb for i in check.violations]
+        # the retract along the face at Z-10 is clear, the rapid into the bar is not
+        assert 5 not in flagged and 6 in flagged
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import src.mapped
+from src.compaction import compact_chunk, compact_rows, covered, covering, line_distance
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(src.mapped, "CHUNK", 4)
+
+def polyline(*points):
+    return np.array(points, dtype=float)
+
+def max_deviation(points, start, rows):
+    # largest distance of a point from the drawn line covering it
+    anchors = np.concatenate(([start], points[rows]))
+    worst = 0.
+    for index in range(len(rows)):
+        segments = covered(rows, index, 0)
+        inner = points[segments.start:segments.stop]
+        a = np.repeat(anchors[index:index + 1], len(inner), axis=0)
+        b = np.repeat(anchors[index + 1:index + 2], len(inner), axis=0)
+        worst = max(worst, line_distance(inner, a, b).max())
+    return worst
+
+class Test_compaction:
+    def test_zero_length_segments_are_dropped(self):
+        points = polyline((1, 0, 0), (1, 0, 0), (1, 0, 1), (1, 0, 1), (1, 0, 1))
+        rows = compact_chunk(points, np.zeros(5), (0, 0, 0), 1e-3)
+        # the trailing ones are covered by the last row
+        assert list(rows) == [0, 4]
+
+    def test_collinear_runs_merge(self):
+        points = polyline((1, 0, 0), (2, 0, 0), (3, 0, 0), (3, 0, 1), (3, 0, 2), (3, 0, 3))
+        assert list(compact_chunk(points, np.zeros(6), (0, 0, 0), 1e-3)) == [2, 5]
+
+    def test_turning_back_is_kept(self):
+        points = polyline((2, 0, 0), (1, 0, 0), (3, 0, 0))
+        assert list(compact_chunk(points, np.zeros(3), (0, 0, 0), 1e-3)) == [0, 1, 2]
+
+    def test_types_do_not_merge(self):
+        points = polyline((1, 0, 0), (2, 0, 0), (3, 0, 0), (4, 0, 0))
+        types = np.array([0, 0, 1, 1])
+        assert list(compact_chunk(points, types, (0, 0, 0), 1e-3)) == [1, 3]
+
+    def test_arcs_stay_within_the_tolerance(self):
+        angles = np.linspace(0, np.pi / 2, 2000)[1:]
+        points = np.stack((10 * np.cos(angles), 10 * np.sin(angles), np.zeros(len(angles))), axis=1)
+        for tolerance in (1e-3, 0.05):
+            rows = compact_chunk(points, np.zeros(len(points)), (10, 0, 0), tolerance)
+            assert rows[-1] == len(points) - 1 and len(rows) < len(points) / 10
+            assert max_deviation(points, (10, 0, 0), rows) <= tolerance
+
+    def test_chunks_keep_their_last_row(self, small_chunks):
+        points = np.stack((np.arange(1, 11), np.zeros(10), np.zeros(10)), axis=1).astype(float)
+        rows = compact_rows(points, np.zeros(10), (0, 0, 0), 0, 10)
+        assert list(rows) == [3, 7, 9]
+        assert list(compact_rows(points, np.zeros(10), (0, 0, 0), 2, 10)) == [5, 9]
+
+    def test_drawn_lines_map_back_to_segments(self):
+        rows = np.array([2, 5, 9])
+        assert [covering(rows, segment) for segment in (0, 2, 3, 5, 9)] == [0, 0, 1, 1, 2]
+        assert list(covered(rows, 0, 0)) == [0, 1, 2]
+        assert list(covered(rows, 2, 0)) == [6, 7, 8, 9]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from src.cycles import peck_drill, RAPID, FEED
+from src.gcodeParser import GcodeParser
+
+class Test_peck_drill:
+    def test_single_peck_when_peck_exceeds_depth(self):
+        points, types = peck_drill([0., 0., 0.], 2, -1., 3., 10., .2)
+        assert list(points[:, 2]) == [-1., 3., -1., 0.]
+        assert list(types) == [RAPID, FEED, RAPID, RAPID]
+
+    def test_pecks_retract_and_reapproach(self):
+        points, types = peck_drill([0., 0., 0.], 2, 0., 5., 2., .2)
+        assert list(points[:, 2]) == pytest.approx([0., 2., 0., 1.8, 4., 0., 3.8, 5., 0., 0.])
+        assert list(types) == [RAPID, FEED, RAPID, RAPID, FEED, RAPID, RAPID, FEED, RAPID, RAPID]
+
+    def test_other_axes_stay_at_start(self):
+        points, _ = peck_drill([4., 1., 2.], 0, 3., -1., .5, .1)
+        assert np.all(points[:, 1] == 1.)
+        assert np.all(points[:, 2] == 2.)
+        assert points[:, 0].min() == -1.
+
+class Test_canned_cycles:
+    def test_g83_expands_into_segments(self):
+        parser = GcodeParser()
+        lines = ["T100", "G0X0.Z-1.", "G83Z5.R-.5Q2000F.05"]
+        parser.parseCode(lines)
+        segments = parser.model.segments
+        assert len(segments) == 15
+        assert max(s.coords['Z'] for s in segments) == 5.0
+        assert segments[-1].coords['Z'] == -1.0
+        assert all(s.tool == "T1" for s in segments)
+
+    def test_g83_is_modal_until_g80(self):
+        parser = GcodeParser()
+        lines = ["T100", "G0X0.Z-1.", "G83Z5.R-.5Q2.5", "X4.", "G80", "G0X10."]
+        parser.parseCode(lines)
+        drilled = [s.coords['X'] for s in parser.model.segments if s.type == "G1"]
+        assert drilled == [0., 0., 0., 4., 4., 4.]
+        assert parser.model.position['X'] == 10.0
+
+    def test_g87_drills_along_x(self):
+        parser = GcodeParser()
+        lines = ["T3100", "G0X10.Z2.", "G87X2.R-.5Q1."]
+        parser.parseCode(lines)
+        feeds = [s.coords for s in parser.model.segments if s.type == "G1"]
+        assert feeds[-1]['X'] == 2.0
+        assert all(c['Z'] == 2.0 for c in feeds)
+
+    def test_g32_is_a_thread_move(self):
+        parser = GcodeParser()
+        parser.parseCode(["T100", "G32X1.Z-10."])
+        segment = parser.model.segments[0]
+        assert segment.type == "G32"
+        assert segment.coords['Z'] == -10.0
@@ -0,0 +1,75 @@
+import json
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.channels import ChannelProgram
+from src.cycletime import CycleTime, MachineProfile, segment_times
+
+class Test_feed_state:
+    def test_feed_words_are_modal_state(self):
+        parser = GcodeParser()
+        model = parser.parseCode(["G97S2000", "G1X20.F0.1", "G98G1Z-5.F300", "F0.2"])
+        assert len(model.segments) == 2
+        assert model.feeds == [(0, .1, True, 2000., False), (1, 300., False, 2000., False), (2, .2, False, 2000., False)]
+        assert (parser.feed, parser.per_rev, parser.spindle) == (.2, False, 2000.)
+        assert parser.diagnostics.total == 0
+
+    def test_speed_limit_is_not_a_speed(self):
+        parser = GcodeParser()
+        parser.parseCode(["G97S1000", "G50S4000", "S1=1500"])
+        assert parser.spindle == 1500.
+
+class Test_cycle_time:
+    def test_feed_per_revolution_and_per_minute(self):
+        model = GcodeParser().parseCode(["T0101", "G97S1000", "G99", "G0X10.Z0.", "G1Z-10.F0.1", "G98G1X20.F50"])
+        model.postProcess()
+        times = segment_times(model)
+        # 10 mm at 0.1 mm/rev & 1000 rpm, then 5 mm radially at 50 mm/min
+        assert times[1] == pytest.approx(6.)
+        assert times[2] == pytest.approx(6.)
+        # the rapid from the tool's start point (X2) runs at 24 m/min
+        assert times[0] == pytest.approx(60. * 4. / 24000)
+
+    def test_constant_surface_speed(self):
+        model = GcodeParser().parseCode(["G96S100", "G99G1X20.F0.1", "G1Z-10.", "G97S2000", "G50S500", "G1Z-20."])
+        model.postProcess()
+        times = segment_times(model, MachineProfile(max_rpm=1800.))
+        rpm = 100 * 1000. / (np.pi * 20.)
+        assert times[1] == pytest.approx(60. * 10. / (.1 * rpm))
+        # the profile limits the spindle speed
+        assert times[2] == pytest.approx(60. * 10. / (.1 * 1800.))
+
+    def test_totals_per_layer_and_tool(self, tmp_path):
+        model = GcodeParser().parseCode(["G98", "T0101", "G1X2.Z-6.F60", "G0Z0.", "T0202", "G1Z-1.F60", "T0101", "G1Z-2."])
+        model.postProcess()
+        profile_path = tmp_path / "machine.json"
+        profile_path.write_text(json.dumps({"rapid": [6000, 6000, 6000]}))
+        cycle = CycleTime(model, MachineProfile.load(str(profile_path)))
+        # every tool layer starts at the tool's start point
+        assert cycle.layers.tolist() == pytest.approx([6.06, 1., 2.])
+        assert cycle.tools == pytest.approx({"T1": 8.06, "T2": 1.})
+        assert cycle.rapid == pytest.approx(.06) and cycle.total == pytest.approx(9.06)
+        assert cycle.report()[0] == "cycle time 0:09.1 (cutting 0:09.0, rapid 0:00.1)"
+
+    def test_profile_tools_and_bushing(self, tmp_path):
+        profile_path = tmp_path / "machine.json"
+        profile_path.write_text(json.dumps({"tool_radii": {"T21": 2.5, "22": 3}, "guide_bushing": [20, -40]}))
+        profile = MachineProfile.load(str(profile_path))
+        assert profile.tool_radii == {21: 2.5, 22: 3.}
+        assert profile.guide_bushing == (20., -40.)
+
+    def test_moves_without_feedrate_are_counted(self):
+        model = GcodeParser().parseCode(["G1X10.Z-5.", "G99G1Z-6.F0.1"])
+        model.postProcess()
+        cycle = CycleTime(model)
+        assert cycle.total == 0. and cycle.unknown == 2
+
+    def test_channel_timeline_uses_times(self):
+        code = ["$1", "T0101", "G98", "G1X2.Z-60.F60", "!2L1", "G1Z-61.", "$2", "T0202", "G98", "G1X2.Y0.Z-1.F60", "!1L1", "G1Z-2."]
+        program = ChannelProgram(code, parallel=False)
+        cycles = program.cycle_times()
+        assert cycles[1].total == pytest.approx(61.) and cycles[2].total == pytest.approx(2.)
+        # $2 waits for $1 at the sync
+        assert program.timeline.duration == pytest.approx(61.)
+        merged = program.merged()
+        assert CycleTime(merged).total == pytest.approx(63.)
@@ -0,0 +1,35 @@
+from src.gcodeParser import GcodeParser
+from src.channels import ChannelProgram
+from src.diagnostics import Diagnostics
+
+class Test_diagnostics:
+    def test_counts_and_first_lines(self):
+        diagnostics = Diagnostics(max_lines=2)
+        for lineNb in (3, 5, 9):
+            diagnostics.add("WARN", "Unknown code 'M05'", lineNb, "M05")
+        diagnostics.add("WARN", "G28 unimplemented", 4, "G28")
+        assert diagnostics.total == 4
+        assert len(diagnostics) == 2
+        assert diagnostics.lines[("WARN", "Unknown code 'M05'")] == [(3, "M05"), (5, "M05")]
+        assert diagnostics.summary()[0] == "[WARN] Unknown code 'M05': 3 times (lines 3, 5, ...)"
+
+    def test_merge_shifts_line_numbers(self):
+        block = Diagnostics()
+        block.add("WARN", "G28 unimplemented", 2, "G28")
+        total = Diagnostics()
+        total.merge(block, 100)
+        total.merge(block, 200)
+        assert total.counts[("WARN", "G28 unimplemented")] == 2
+        assert [lineNb for lineNb, _ in total.lines[("WARN", "G28 unimplemented")]] == [102, 202]
+
+    def test_parser_collects_instead_of_printing(self, capsys):
+        parser = GcodeParser()
+        parser.parseCode(["G1X1.", "G28"] * 1000)
+        assert capsys.readouterr().out == ""
+        assert parser.diagnostics.counts[("WARN", "G28 unimplemented")] == 1000
+        assert len(parser.diagnostics.lines[("WARN", "G28 unimplemented")]) == parser.diagnostics.max_lines
+
+    def test_merged_channels_keep_diagnostics(self):
+        program = ChannelProgram(["$1", "G1X1.", "G28", "$2", "G1X2.", "G28"], parallel=False)
+        lines = program.merged().diagnostics.lines[("WARN", "G28 unimplemented")]
+        assert [lineNb for lineNb, _ in lines] == [3, 6]
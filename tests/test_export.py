@@ -0,0 +1,62 @@
+import io
+import json
+import struct
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.export import write_script, write_glb, export_model, read_binary
+
+PROGRAM = ["T100", "G1X0.Y0.Z0.", "G1X1.", "T2100", "G1X2.Y2.Z2.", "G1U1."]
+
+@pytest.fixture
+def model():
+    model = GcodeParser().parseCode(PROGRAM)
+    model.postProcess()
+    return model
+
+class Test_script_export:
+    def test_one_polyline_per_layer(self, model):
+        out = io.StringIO()
+        write_script(model, out)
+        text = out.getvalue()
+        assert text.count("_3DPOLY") == 2
+        assert "-LAYER\nM\nT1_0\n\n_3DPOLY\n2.0000,0.0000,0.0000\n0.0000,0.0000,0.0000\n1.0000,0.0000,0.0000\n\n" in text
+
+class Test_binary_export:
+    def test_round_trip(self, tmp_path, model):
+        path = str(tmp_path / "out.ybin")
+        export_model(model, path)
+        data = read_binary(path)
+        assert data["segments"] == 4
+        assert [layer["tool"] for layer in data["layers"]] == [1, 21]
+        assert data["layers"][1]["coords"].tolist() == [[2., 2., 2.], [3., 2., 2.]]
+        assert data["layers"][1]["lineNb"].tolist() == [5, 6]
+
+    def test_empty_program(self, tmp_path):
+        model = GcodeParser().parseCode(["(NO MOVES)"])
+        model.postProcess()
+        path = str(tmp_path / "empty.ybin")
+        export_model(model, path)
+        data = read_binary(path)
+        assert data["segments"] == 0 and data["layers"] == []
+        assert list(data["bbox"]) == [0.] * 6
+
+class Test_glb_export:
+    def test_valid_container(self, model):
+        out = io.BytesIO()
+        write_glb(model, out)
+        data = out.getvalue()
+        magic, version, length = struct.unpack_from("<4sII", data)
+        assert (magic, version, length) == (b"glTF", 2, len(data))
+        json_length, = struct.unpack_from("<I", data, 12)
+        document = json.loads(data[20:20+json_length])
+        assert len(document["meshes"]) == 2
+        assert document["accessors"][0]["count"] == 3
+        bin_length, = struct.unpack_from("<I", data, 20+json_length)
+        assert bin_length == document["buffers"][0]["byteLength"] == (3 + 3) * 12
+        positions = np.frombuffer(data[28+json_length:], dtype="<f4").reshape(-1, 3)
+        assert positions[:3].tolist() == [[2., 0., 0.], [0., 0., 0.], [1., 0., 0.]]
+
+def test_unknown_format_is_rejected(tmp_path, model):
+    with pytest.raises(ValueError):
+        export_model(model, str(tmp_path / "out.dxf"))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from src.channels import ChannelProgram
+from src.fixedpoint import FixedPointArray, quantize
+from src.gcodeParser import SegmentColumns
+from src.memory import model_footprint
+
+CODE = ["G0X20.Z-1.", "G1X12.3456Z.1F.05", "G1W.1", "G1W.1", "G1W.1", "G1Z.4", "G1U-.0002", "G0X20.Z-1."]
+
+def parse(**options):
+    return ChannelProgram(CODE, parallel=False, **options).merged()
+
+class Test_fixedpoint:
+    def test_round_trip_is_exact(self):
+        values = FixedPointArray(np.zeros((2, 3), dtype=np.int32))
+        values[0] = (12.3456, -0.0001, 1e-5)
+        assert values.raw[0].tolist() == [123456, -1, 0]
+        assert values[0].tolist() == [12.3456, -0.0001, 0.]
+        assert values.dtype == np.float64 and values.shape == (2, 3) and len(values) == 2
+
+    def test_equal_machine_positions_compare_equal(self):
+        values = FixedPointArray(np.zeros((2, 1), dtype=np.int32))
+        values[:, 0] = (0.1 + 0.2, 0.3)
+        assert values[0] == values[1]
+
+    def test_out_of_range(self):
+        with pytest.raises(OverflowError):
+            quantize([300000.], 10000)
+        assert quantize([300000.], 1000)[0] == 300000000
+
+    def test_model_matches_float64(self):
+        exact, fixed = parse(), parse(coords_dtype=np.int32)
+        assert isinstance(fixed.columns.coords, FixedPointArray)
+        assert fixed.distance == pytest.approx(exact.distance, abs=1e-9)
+        assert fixed.bbox.xmin == exact.bbox.xmin and fixed.bbox.zmax == exact.bbox.zmax
+        # Z.1 + 3 * W.1 lands on Z.4 exactly, the next move has no length
+        assert fixed.columns.coords[4, 2] == fixed.columns.coords[5, 2] == .4
+        assert fixed.distances[5] == 0
+        assert fixed.columns.coords[6, 0] == 12.3454
+
+    def test_coarser_units(self):
+        model = parse(coords_dtype=np.int32, coords_scale=1000)
+        assert model.columns.coords.raw[1].tolist() == [12346, 0, 100]
+
+    def test_half_the_memory(self):
+        exact, fixed = parse(), parse(coords_dtype=np.int32)
+        assert model_footprint(fixed)["columns.coords"] * 2 == model_footprint(exact)["columns.coords"]
+
+    def test_columns_grow(self, tmp_path):
+        for directory in (None, tmp_path):
+            columns = SegmentColumns(capacity=2, coords_dtype=np.int32, directory=directory, coords_scale=1000)
+            columns.extend(np.zeros(5, dtype=np.int8), np.arange(15).reshape(5, 3) * .001, np.zeros(5), np.arange(5), 0)
+            assert isinstance(columns.coords, FixedPointArray) and columns.coords.scale == 1000
+            assert columns.coords.raw.dtype == np.int32
+            assert columns.coords[:5].ravel().tolist() == (np.arange(15) / 1000).tolist()
@@ -152,6 +152,13 @@ class Test_G1:
         assert parser.model.segments[0].tool == "T1"
         assert parser.model.segments[1].tool == "T21"
 
+    def test_macro_tool_word_keeps_current_tool(self):
+        parser = GcodeParser()
+        lines = ["T0101", "G1X1.Z1.", "#1=2", "T#1", "G1X2."]
+        parser.parseCode(lines)
+        assert [segment.tool for segment in parser.model.segments] == ["T1", "T1"]
+        assert parser.diagnostics.lines[("WARN", "Tool word is not a tool number, current tool kept")] == [(4, "T#1")]
+
 class Test_variables:
     def test_reads_814_from_lines(self):
         parser = GcodeParser()
@@ -184,6 +191,133 @@ class Test_variables:
         position = parser.model.position
         assert pytest.approx(position['X']) == 1.8
 
+    def test_multiple_variables_in_one_word(self):
+        parser = GcodeParser()
+        lines = ["#1=2.", "#2=3.", "G1X#1+#2Z[#1*#2]"]
+        parser.parseCode(lines)
+        position = parser.model.position
+        assert position['X'] == 5.0
+        assert position['Z'] == 6.0
+
+    def test_variables_are_array_backed(self):
+        parser = GcodeParser()
+        parser.parseCode(["#814=1.5"])
+        assert parser.variables[814] == 1.5
+        assert parser.variables.values[814] == 1.5
+        assert parser.variables[813] == 0.0
+
+    def test_argument_templates_are_compiled_once(self):
+        parser = GcodeParser()
+        lines = ["#1=1.", "G1X#1+.5", "#1=2.", "G1X#1+.5"]
+        parser.parseCode(lines)
+        assert [s.coords['X'] for s in parser.model.segments] == [1.5, 2.5]
+        assert list(parser.templates).count("#1+.5") == 1
+
+class Test_line_cache:
+    def test_repeated_lines_are_compiled_once(self):
+        parser = GcodeParser()
+        lines = ["G0X20.", "G1U-.5", "G1U-.5 (rough)", "N30G1U-.5", "G1U-.5"]
+        parser.parseCode(lines)
+        assert [s.coords['X'] for s in parser.model.segments] == [20., 19.5, 19., 18.5, 18.]
+        cache = parser.line_cache
+        assert (cache.hits, cache.misses) == (3, 2)
+        # the argument values of 'U-.5' are evaluated once and replayed
+        assert cache.replays == 3
+        assert cache.stats()["hit_rate"] == .6
+
+    def test_lines_with_variables_are_evaluated_every_time(self):
+        parser = GcodeParser()
+        parser.parseCode(["#1=1.", "G1X#1", "#1=2.", "G1X#1"])
+        assert [s.coords['X'] for s in parser.model.segments] == [1., 2.]
+        assert parser.line_cache.hits == 1 and parser.line_cache.replays == 0
+
+    def test_cache_is_bounded(self):
+        parser = GcodeParser()
+        parser.line_cache.size = 2
+        parser.parseCode(["G1X1.", "G1X2.", "G1X3.", "G1X1."])
+        assert list(parser.line_cache.commands) == ["G1X3.", "G1X1."]
+        assert parser.line_cache.hits == 0
+
+class Test_control_flow:
+    def test_while_loop_repeats_body(self):
+        parser = GcodeParser()
+        lines = ["#1=0", "WHILE[#1LT5]DO1", "G1X#1", "#1=#1+1", "END1"]
+        parser.parseCode(lines)
+        segments = parser.model.segments
+        assert len(segments) == 5
+        assert [s.coords['X'] for s in segments] == [0.0, 1.0, 2.0, 3.0, 4.0]
+        assert segments[4].lineNb == 3
+
+    def test_nested_loops(self):
+        parser = GcodeParser()
+        lines = ["#1=0", "WHILE[#1LT3]DO1", "#2=0", "WHILE[#2LT2]DO2",
+                 "G1X#1Y#2", "#2=#2+1", "END2", "#1=#1+1", "END1"]
+        parser.parseCode(lines)
+        assert len(parser.model.segments) == 6
+
+    def test_conditional_goto_backwards(self):
+        parser = GcodeParser()
+        lines = ["#1=0", "N10G1X#1", "#1=#1+1", "IF[#1LE2]GOTO10", "G1X9."]
+        parser.parseCode(lines)
+        assert [s.coords['X'] for s in parser.model.segments] == [0.0, 1.0, 2.0, 9.0]
+
+    def test_goto_skips_forward(self):
+        parser = GcodeParser()
+        lines = ["G1X1.", "GOTO20", "G1X2.", "N20G1X3."]
+        parser.parseCode(lines)
+        assert [s.coords['X'] for s in parser.model.segments] == [1.0, 3.0]
+
+    def test_if_then_assignment(self):
+        parser = GcodeParser()
+        lines = ["#1=1", "IF[#1EQ1]THEN#2=5", "G1X#2"]
+        parser.parseCode(lines)
+        assert parser.model.position['X'] == 5.0
+
+    def test_expression_errors_are_reported(self):
+        parser = GcodeParser()
+        lines = ["#1=[1/0]", "G1X#1", "G1Z#20000"]
+        parser.parseCode(lines)
+        # the value stays 1, as before, but not silently
+        assert parser.model.position["X"] == 1.0
+        warnings = {msg: lines for (level, msg), lines in parser.diagnostics.lines.items()}
+        assert [lineNb for msg, lines in warnings.items() if "[1/0]" in msg for lineNb, _ in lines] == [1]
+        assert [lineNb for msg, lines in warnings.items() if "#20000" in msg for lineNb, _ in lines] == [3]
+
+    def test_out_of_range_assignment_warns_once(self):
+        parser = GcodeParser()
+        parser.parseCode(["#10001=5"])
+        assert parser.diagnostics.counts == {("WARN", "Variable #10001 out of range"): 1}
+
+    def test_runaway_loop_is_limited(self):
+        parser = GcodeParser()
+        parser.max_loop_iterations = 10
+        lines = ["WHILE[1EQ1]DO1", "G1X1.", "END1", "G1X2."]
+        parser.parseCode(lines)
+        assert len(parser.model.segments) == 11
+        assert parser.model.position['X'] == 2.0
+
+    def test_malformed_conditions_are_reported(self):
+        parser = GcodeParser()
+        lines = ["WHILE[#1LT]DO1", "G1X1.", "END1", "IF[#1EQ]THEN#2=1", "GOTO[1+]", "G1X2."]
+        parser.parseCode(lines)
+        # the loop is skipped, the IF does not hold, the GOTO does nothing
+        assert [segment.coords["X"] for segment in parser.model.segments] == [2.0]
+        assert sorted(lineNb for lines in parser.diagnostics.lines.values() for lineNb, _ in lines) == [1, 4, 5]
+
+    def test_failing_conditions_are_reported(self):
+        parser = GcodeParser()
+        lines = ["WHILE[1/0]DO1", "G1X1.", "END1", "GOTO[1/0]", "IF[1/0EQ1]GOTO5", "G1X2.", "N5G1X3."]
+        parser.parseCode(lines)
+        assert [segment.coords["X"] for segment in parser.model.segments] == [2.0, 3.0]
+        assert sorted(lineNb for lines in parser.diagnostics.lines.values() for lineNb, _ in lines) == [1, 4, 5]
+
+    def test_conditions_reading_variables_out_of_range(self):
+        parser = GcodeParser()
+        lines = ["WHILE[#1LT#20000]DO1", "G1X1.", "END1", "IF[#20000EQ0]GOTO5", "G1X2.", "N5G1X3."]
+        parser.parseCode(lines)
+        assert [segment.coords["X"] for segment in parser.model.segments] == [2.0, 3.0]
+        assert parser.diagnostics.counts == {("WARN", "Cannot evaluate control statement: array index out of range"): 2}
+
 class Test_Segment_Classification:
     def test_counts_layers(self):
         parser = GcodeParser()
@@ -214,6 +348,3 @@ class Test_Split_Layers:
 
 
 # TODO: Get the G2/G3 working- What does this need to look like for AutoCAD?
-# TODO: Get G32/G83/G87 working
-# TODO: Get while loops working
-# TODO: Get an output utility for AutoCAD LT script language working
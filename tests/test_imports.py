@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# stated in README.md: `yagv --help` and `import yagv` stay under this
+CLI_IMPORT_BUDGET_US = 50000
+
+def run_python(*args):
+    return subprocess.run([sys.executable] + list(args), cwd=ROOT, capture_output=True, text=True, check=True)
+
+def loaded_modules(code):
+    out = run_python("-c", code + "; import sys; print(' '.join(sys.modules))").stdout
+    return set(out.split())
+
+def import_times(*args):
+    # module -> cumulative import time in microseconds, from -X importtime
+    times = {}
+    for line in run_python("-X", "importtime", *args).stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            times[parts[2].strip()] = int(parts[1])
+    return times
+
+class Test_imports:
+    def test_cli_module_has_no_side_effects(self):
+        modules = loaded_modules("import yagv")
+        assert "pyglet" not in modules
+        assert "numpy" not in modules
+
+    def test_core_does_not_import_gui(self):
+        modules = loaded_modules("import src.gcodeParser, src.channels, src.programDiff, src.export")
+        assert "pyglet" not in modules
+        assert "src.viewer" not in modules
+
+    def test_package_exports_are_lazy(self):
+        assert "src.gcodeParser" not in loaded_modules("import src")
+        assert "src.gcodeParser" in loaded_modules("from src import GcodeParser")
+
+    def test_help_import_budget(self):
+        times = import_times("yagv.py", "--help")
+        assert "numpy" not in times and "pyglet" not in times
+        assert times["src"] < CLI_IMPORT_BUDGET_US
@@ -0,0 +1,70 @@
+import os
+import sys
+import numpy as np
+import pytest
+import src.mapped
+from src.mapped import MappedStore, chunk_rows, chunks
+from src.gcodeParser import GcodeParser, SegmentColumns
+from src.channels import ChannelProgram
+from src.memory import choose_representation, estimate, model_footprint
+
+# tool blocks of different lengths, some shorter than a chunk
+PROGRAM = [line for tool, count in ((1, 7), (2, 3), (21, 12), (2, 1), (31, 9))
+           for line in ["T%02d01" % tool] + ["G1X%.2fZ%.2f" % (i * .5, -i * tool * .01) for i in range(count)]]
+
+class Test_mapped:
+    def test_chunks_cover_the_range(self):
+        assert list(chunks(3, 12, 4)) == [(3, 7), (7, 11), (11, 12)]
+        assert list(chunks(5, 5, 4)) == []
+        assert chunk_rows(slice(10, 20), 2, 5) == slice(12, 15)
+        assert list(chunk_rows(np.arange(10, 20, 2), 1, 3)) == [12, 14]
+
+    def test_store_grows_arrays_in_place(self, tmp_path):
+        store = MappedStore(str(tmp_path))
+        array = store.array((5, 3), np.float32)
+        array[:] = 1.
+        grown = store.resize(array, 9)
+        assert isinstance(grown, np.memmap) and grown.shape == (9, 3)
+        assert (grown[:5] == 1.).all() and grown.filename == array.filename
+        assert len(store.array(0, np.int8)) == 0
+        path = store.path
+        del store
+        assert not os.path.exists(path)
+
+    def test_mapped_columns_grow(self, tmp_path):
+        columns = SegmentColumns(capacity=2, directory=str(tmp_path))
+        for i in range(50):
+            columns.append(1, i, 0., -i, 3, i, -1)
+        assert columns.mapped and isinstance(columns.coords, np.memmap)
+        assert columns.coords[49, 2] == -49 and columns.lineNb[:50].tolist() == list(range(50))
+
+    def test_chunked_post_processing_matches(self, tmp_path, monkeypatch):
+        models = []
+        for chunk, options in ((4, {}), (1 << 20, {}), (4, {"mapped_dir": str(tmp_path)})):
+            monkeypatch.setattr(src.mapped, "CHUNK", chunk)
+            model = GcodeParser(**options).parseCode(PROGRAM)
+            model.postProcess()
+            models.append(model)
+        expected, reference, model = models
+        assert isinstance(model.columns.coords, np.memmap) and isinstance(model.distances, np.memmap)
+        for other in (expected, model):
+            assert [(l.first, l.count, l.tool) for l in other.layers] == [(l.first, l.count, l.tool) for l in reference.layers]
+            assert np.array_equal(other.inLayerIdx, reference.inLayerIdx)
+            assert np.allclose(other.distances, reference.distances)
+            assert other.distance == pytest.approx(reference.distance)
+            assert vars(other.bbox) == pytest.approx(vars(reference.bbox))
+            assert np.array_equal(other.segmentStarts(5, 17), reference.segmentStarts()[5:17])
+
+    def test_channel_program_option(self, tmp_path):
+        program = ChannelProgram(PROGRAM, mapped_dir=str(tmp_path))
+        model = program.merged()
+        assert model.columns.mapped and len(model.layers) == 5
+        assert "columns.coords (mapped)" in model_footprint(model)
+
+    def test_budget_does_not_count_mapped_arrays(self):
+        code = PROGRAM * 100
+        budget = estimate(len(code), sum(sys.getsizeof(line) for line in code), mapped=True) + 1
+        options, warnings = choose_representation(code, budget)
+        assert options["coords_dtype"] == np.float32
+        options, warnings = choose_representation(code, budget, mapped=True)
+        assert options["coords_dtype"] == np.float64 and warnings == []
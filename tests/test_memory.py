@@ -0,0 +1,60 @@
+import sys
+import numpy as np
+from src.gcodeParser import GcodeParser
+from src.channels import ChannelProgram
+from src.memory import MB, MemoryProfile, choose_representation, estimate, footprint, model_footprint
+
+CODE = ["G1X%.3fZ%.3f" % (i * .01, i * .02) for i in range(2000)]
+
+class Test_memory:
+    def test_cheaper_representations_estimate_less(self):
+        full = estimate(1000, 20000)
+        assert estimate(1000, 20000, coords_dtype=np.float32) < full
+        assert estimate(1000, 20000, keep_lines=False) < full
+        assert estimate(1000, 20000, lod=4) < full
+
+    def test_budget_picks_float32_then_drops_lines_then_decimates(self):
+        options, warnings = choose_representation(CODE, 1 << 40)
+        assert options == {"coords_dtype": np.float64, "keep_lines": True, "lod": 1} and warnings == []
+        lineBytes = sum(sys.getsizeof(line) for line in CODE)
+        options, warnings = choose_representation(CODE, estimate(len(CODE), lineBytes, np.float32) + 1)
+        assert options["coords_dtype"] == np.float32 and options["keep_lines"] and options["lod"] == 1
+        assert len(warnings) == 2
+        options, _ = choose_representation(CODE, estimate(len(CODE), 0, np.float32, False, 1) + 1)
+        assert not options["keep_lines"] and options["lod"] == 1
+        options, warnings = choose_representation(CODE, estimate(len(CODE), 0, np.float32, False, 4) + 1)
+        assert options["lod"] > 1
+        assert estimate(len(CODE), 0, np.float32, False, options["lod"]) <= estimate(len(CODE), 0, np.float32, False, 4) + 1
+
+    def test_parser_options(self):
+        model = ChannelProgram(CODE, parallel=False, coords_dtype=np.float32, keep_lines=False).merged()
+        assert model.columns.coords.dtype == np.float32
+        assert model.lines == {}
+        assert model.segments[10].line == ""
+        assert model.segments[10].coords["X"] == np.float32(.1)
+
+    def test_parser_drops_number_templates(self):
+        parser = GcodeParser()
+        parser.parseCode(CODE + ["#1=1.", "G1X#1+.5"])
+        assert list(parser.templates) == ["#1+.5"]
+
+    def test_footprint_counts_views_once(self):
+        base = np.zeros(1000)
+        views = [base[:10], base[10:]]
+        assert footprint(views) == sys.getsizeof(views) + base.nbytes
+
+    def test_profile_stages_and_structures(self):
+        profile = MemoryProfile()
+        try:
+            with profile.stage("parse"):
+                model = GcodeParser().parseCode(CODE)
+        finally:
+            profile.stop()
+        name, kept, peak, grown = profile.stages[0]
+        assert name == "parse" and 0 < kept <= peak
+        sizes = model_footprint(model)
+        assert sizes["columns.coords"] >= model.columns.count * 24
+        assert sizes["lines"] > 0
+        report = profile.report(model.columns.count, sizes)
+        assert report[1].startswith("parse") and len(report) == 3 + len(sizes)
+        assert MB == 1 << 20
@@ -0,0 +1,41 @@
+from src.playback import MAX_SPEED, Playback
+
+class Test_playback:
+    def test_advance_only_while_playing(self):
+        playback = Playback(100, speed=10.)
+        assert not playback.advance(1.)
+        playback.play()
+        assert playback.advance(.25)
+        assert playback.cursor == 2.5
+        assert (playback.segment, playback.fraction) == (2, .5)
+
+    def test_stops_at_the_end_and_restarts(self):
+        playback = Playback(10, speed=100.)
+        playback.play()
+        playback.advance(1.)
+        assert playback.cursor == 10 and not playback.playing
+        assert (playback.segment, playback.fraction) == (9, 1.)
+        playback.toggle()
+        assert playback.playing and playback.cursor == 0
+
+    def test_seek_and_speed(self):
+        playback = Playback(50)
+        playback.seek(-5)
+        assert playback.cursor == 0
+        playback.seek(80)
+        assert playback.cursor == 50
+        playback.speed = MAX_SPEED / 2
+        playback.faster(4)
+        assert playback.speed == MAX_SPEED
+        playback.slower()
+        assert playback.speed == MAX_SPEED / 2
+
+    def test_tool_position(self):
+        playback = Playback(4)
+        playback.seek(1.25)
+        assert list(playback.position((0, 0, 0), (4, 0, -8))) == [1., 0., -2.]
+
+    def test_empty_program_does_not_play(self):
+        playback = Playback(0)
+        playback.play()
+        assert not playback.playing
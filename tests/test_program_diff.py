@@ -0,0 +1,58 @@
+from src.programDiff import ProgramDiff, BlockCache, split_blocks, UNCHANGED, ADDED, CHANGED
+
+OLD = ["$1", "T100", "G1X0.Y0.Z0.", "G1X1.", "T200", "G1X2.Y2.Z2.", "G1U1.", "T300", "G1X5.", "T0"]
+
+class Test_split_blocks:
+    def test_splits_at_tools_and_channels(self):
+        blocks = split_blocks(OLD)
+        assert [lines[0] for lines, _ in blocks] == ["$1", "T100", "T200", "T300"]
+        assert blocks[2][1] == [5, 6, 7]
+
+class Test_program_diff:
+    def test_identical_programs_have_no_changes(self):
+        diff = ProgramDiff(OLD, list(OLD))
+        assert (diff.status == UNCHANGED).all()
+        assert len(diff.removed) == 0
+
+    def test_changed_move_is_flagged(self):
+        new = list(OLD)
+        new[6] = "G1U1.Z3."
+        diff = ProgramDiff(OLD, new)
+        assert list(diff.status) == [UNCHANGED, UNCHANGED, UNCHANGED, CHANGED, CHANGED]
+        assert diff.removed.tolist() == [[[2., 2., 2.], [3., 2., 2.]], [[3., 2., 2.], [5., 2., 2.]]]
+
+    def test_inserted_block_is_added(self):
+        new = OLD[:7] + ["T400", "G1X3."] + OLD[7:]
+        diff = ProgramDiff(OLD, new)
+        assert list(diff.status) == [UNCHANGED] * 4 + [ADDED, UNCHANGED]
+        assert len(diff.removed) == 0
+
+    def test_deleted_block_is_removed(self):
+        new = OLD[:7] + OLD[9:]
+        diff = ProgramDiff(OLD, new)
+        assert (diff.status == UNCHANGED).all()
+        assert diff.removed.tolist() == [[[3., 2., 2.], [5., 2., 2.]]]
+
+    def test_model_has_new_line_numbers(self):
+        new = ["(REV B)"] + OLD
+        diff = ProgramDiff(OLD, new)
+        assert [s.lineNb for s in diff.model.segments] == [4, 5, 7, 8, 10]
+        assert diff.model.segments[0].line == "G1X0.Y0.Z0."
+
+    def test_model_is_searchable(self):
+        new = ["(REV B)"] + OLD
+        diff = ProgramDiff(OLD, new)
+        assert list(diff.model.search("G1").lines) == [4, 5, 7, 8, 10]
+        assert list(diff.model.search("T2").lines) == [6, 7, 8]
+        assert list(diff.model.search("X>4").lines) == [10]
+
+    def test_cache_reuses_unchanged_blocks(self):
+        cache = BlockCache()
+        new = list(OLD)
+        new[6] = "G1U2."
+        ProgramDiff(OLD, new, cache)
+        misses = cache.misses
+        ProgramDiff(OLD, new, cache)
+        assert cache.misses == misses
+        # only the changed block & the one entered from its new end point are parsed
+        assert misses == len(split_blocks(OLD)) + 2
@@ -0,0 +1,41 @@
+import gzip
+import lzma
+import pytest
+from src import reader
+from src.gcodeParser import GcodeParser
+
+PROGRAM = "".join("G1X%.3fZ%.3f\n" % (i * .1, -i * .01) for i in range(5000)) + "M30"
+
+def written(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+class Test_reader:
+    def test_compressed_like_plain(self, tmp_path):
+        plain = GcodeParser().file_to_lines_array(written(tmp_path, "part.prg", PROGRAM.encode()))
+        assert len(plain) == 5001 and plain[-1] == "M30"
+        for name, data in (("a.gz", gzip.compress(PROGRAM.encode())), ("b.xz", lzma.compress(PROGRAM.encode())),
+                # recognised by content, not by name
+                ("c.prg", gzip.compress(PROGRAM.encode()))):
+            assert GcodeParser().file_to_lines_array(written(tmp_path, name, data)) == plain
+
+    def test_zstd(self, tmp_path):
+        zstandard = pytest.importorskip("zstandard")
+        data = zstandard.ZstdCompressor().compress(PROGRAM.encode())
+        assert GcodeParser().file_to_lines_array(written(tmp_path, "d.zst", data)) == PROGRAM.splitlines(True)
+
+    def test_lines_across_chunks(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(reader, "CHUNK", 7)
+        text = "G1X1.\r\nG1X2.\rG1X3.\n\nG1X4."
+        lines = reader.program_lines(written(tmp_path, "e.gz", gzip.compress(text.encode())))
+        assert lines == ["G1X1.\n", "G1X2.\n", "G1X3.\n", "\n", "G1X4."]
+
+    def test_magic(self):
+        assert reader.compression(gzip.compress(b"G1")) == "gzip"
+        assert reader.compression(lzma.compress(b"G1")) == "xz"
+        assert reader.compression(b"\x28\xb5\x2f\xfd....") == "zstd"
+        assert reader.compression(b"G1X1.") is None
+
+    def test_missing_file(self, tmp_path):
+        assert GcodeParser().file_to_lines_array(str(tmp_path / "none.prg")).startswith("Error: File not found")
@@ -0,0 +1,55 @@
+from src.residency import ResidencyManager
+
+def make_manager(budget):
+    released = []
+    manager = ResidencyManager(budget, lambda key: "buf%d" % key, released.append)
+    return manager, released
+
+class Test_residency:
+    def test_select_keeps_priority_prefix_within_budget(self):
+        manager, _ = make_manager(100)
+        assert manager.select([3, 2, 4, 1], lambda key: 40) == [3, 2]
+        # the first key is always selected, even when it is larger than the budget
+        assert manager.select([1, 2], lambda key: 500) == [1]
+
+    def test_select_reports_the_keys_left_out(self):
+        manager, _ = make_manager(100)
+        manager.select([3, 2, 4, 1], lambda key: 40)
+        assert manager.left_out == [4, 1]
+        manager.select(iter([1, 2]), lambda key: 40)
+        assert manager.left_out == []
+
+    def test_least_recently_used_is_evicted(self):
+        manager, released = make_manager(100)
+        manager.require(1, 40)
+        manager.require(2, 40)
+        assert manager.get(1) == "buf1"
+        manager.require(3, 40)
+        assert released == ["buf2"]
+        assert 1 in manager and 3 in manager and 2 not in manager
+        assert manager.used == 80
+        assert (manager.uploads, manager.evictions) == (3, 1)
+
+    def test_pinned_keys_stay_resident(self):
+        manager, released = make_manager(100)
+        manager.require(1, 40)
+        manager.require(2, 40)
+        manager.require(3, 40, pinned={1})
+        assert released == ["buf2"]
+        manager.require(4, 40, pinned={1, 3})
+        assert released == ["buf2"]
+        assert manager.used == 120
+
+    def test_resident_key_is_not_uploaded_again(self):
+        manager, _ = make_manager(100)
+        manager.require(1, 40)
+        manager.require(1, 40)
+        assert manager.uploads == 1
+
+    def test_clear_releases_everything(self):
+        manager, released = make_manager(100)
+        manager.require(1, 40)
+        manager.require(2, 40)
+        manager.clear()
+        assert sorted(released) == ["buf1", "buf2"]
+        assert manager.used == 0 and not manager.entries
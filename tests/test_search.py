@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.channels import ChannelProgram
+from src.search import SearchIndex, tokens
+
+PROGRAM = [
+    "T100",            # 1
+    "#814=2.5",        # 2
+    "G0X10.Z1.",       # 3
+    "G1Z-25.",         # 4
+    "N20 G1X#814",     # 5
+    "#2=#814",         # 6
+    "T2100",           # 7
+    "G0X0.Z1.",        # 8
+    "G1Z-3.",          # 9
+    "WHILE[#1LT2]DO1", # 10
+    "#1=#1+1",         # 11
+    "END1",            # 12
+]
+
+@pytest.fixture
+def model():
+    return ChannelProgram(PROGRAM, parallel=False).merged()
+
+class Test_search:
+    def test_tokens(self):
+        assert tokens("G01X10.Z-2.5") == ["G", "G1", "X", "Z"]
+        assert tokens("M05 #3=#814+1") == ["M", "M5", "#3", "#814"]
+        assert tokens("WHILE[#1LT2]DO1") == ["#1"]
+        assert tokens("G92.1") == ["G", "G92.1"]
+
+    def test_codes_letters_variables_labels(self, model):
+        assert list(model.search("G1").lines) == [4, 5, 9]
+        assert list(model.search("g01").lines) == [4, 5, 9]
+        assert list(model.search("#814").lines) == [2, 5, 6]
+        assert list(model.search("N20").lines) == [5]
+        assert list(model.search("#1").lines) == [10, 11]
+
+    def test_segments_follow_lines(self, model):
+        result = model.search("G1")
+        assert list(model.columns.lineNb[result.segments]) == [4, 5, 9]
+        assert len(model.search("#814").segments) == 1
+
+    def test_axis_ranges(self, model):
+        assert list(model.search("Z<-20").lines) == [4, 5]
+        assert list(model.search("Z<=-3").lines) == [4, 5, 9]
+        assert list(model.search("Z>1").lines) == []
+        assert list(model.search("X10").lines) == [3, 4]
+        assert list(model.search("G1 Z<-20").lines) == [4, 5]
+        assert list(model.search("G0 Z<-20").lines) == []
+
+    def test_tools(self, model):
+        result = model.search("T21")
+        assert list(result.lines) == [7, 8, 9]
+        assert (model.columns.tool[result.segments] == 21).all()
+        assert list(model.search("T01").lines) == list(model.search("T1").lines)
+
+    def test_lines_without_segments_point_to_the_next(self, model):
+        index = model.index
+        assert list(model.columns.lineNb[index.nextSegments(model, np.array([2, 6]))]) == [3, 8]
+        assert list(index.nextSegments(model, np.array([99]))) == [-1]
+
+    def test_no_segments(self):
+        model = GcodeParser().parseCode(["G50 S1000", "M3"])
+        assert list(model.index.nextSegments(model, np.array([1]))) == [-1]
+        assert list(model.search("M3").lines) == [2]
+
+    def test_bad_terms(self, model):
+        with pytest.raises(ValueError):
+            model.search("WHILE")
+        assert len(model.search("")) == 0
+
+    def test_channels_are_merged(self):
+        model = ChannelProgram(["$1", "G1X1.", "$2", "G1X2.", "G0X3."], parallel=False).merged()
+        assert list(model.search("G1").lines) == [2, 4]
+        assert list(model.search("X>1.5").lines) == [4, 5]
+
+    def test_moves_are_indexed_under_the_modal_code(self):
+        model = ChannelProgram(["G1X1.Z1.", "Z-25.", "G4X1.", "X5.", "G0X10.", "U1."], parallel=False).merged()
+        assert list(model.search("G1").lines) == [1, 2, 4]
+        assert list(model.search("G1 Z<-20").lines) == [2, 4]
+        assert list(model.search("G0").lines) == [5, 6]
+
+    def test_no_index(self):
+        parser = GcodeParser(index=False)
+        model = parser.parseCode(["G1X1."])
+        assert model.index is None
+        with pytest.raises(ValueError):
+            model.search("G1")
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.section import IntervalTree
+
+# a face, a turned diameter and a groove, over two tools
+PROGRAM = ["T0101", "G0X20Z1", "G1X-1Z0", "G0X18Z1", "G1Z-10", "G1X22",
+           "T0202", "G0X24Z-5", "G1X14", "G1Z-6", "G1X24"]
+
+@pytest.fixture
+def model():
+    model = GcodeParser().parseCode(PROGRAM)
+    model.postProcess()
+    return model
+
+class Test_section:
+    @pytest.mark.parametrize("leaf", [1, 4, 256])
+    def test_tree_matches_brute_force(self, leaf):
+        rng = np.random.default_rng(3)
+        walk = np.cumsum(rng.normal(size=2000))
+        previous = np.concatenate(([0.], walk[:-1]))
+        lo, hi = np.minimum(walk, previous), np.maximum(walk, previous)
+        tree = IntervalTree(lo, hi, leaf)
+        for value in np.concatenate((rng.uniform(lo.min() - 1, hi.max() + 1, 50), lo[:20], hi[:20])):
+            assert list(tree.stab(value)) == list(np.flatnonzero((lo <= value) & (hi >= value)))
+
+    def test_empty_tree(self):
+        assert len(IntervalTree(np.zeros(0), np.zeros(0)).stab(1.)) == 0
+
+    def test_starts_of_some_segments(self, model):
+        indices = np.arange(model.columns.count)[::-1]
+        assert np.array_equal(model.segmentStartsAt(indices), model.segmentStarts()[indices])
+
+    def test_plane_crossings(self, model):
+        section = model.section("z", -5.5)
+        ends = model.columns.coords[section.segments]
+        # the turned diameter and the groove's flank
+        assert [tuple(point) for point in section.points] == [(18., 0., -5.5), (14., 0., -5.5)]
+        assert list(ends[:, 2]) == [-10., -6.]
+
+    def test_segments_in_the_plane(self, model):
+        section = model.section("X", 14)
+        # rapids from the tool start points and the face cross it too
+        assert list(section.segments) == [0, 1, 2, 5, 6, 7, 8]
+        assert (section.points[:, 0] == 14.).all()
+        # the groove's bottom lies in the plane, its end point stands for it
+        assert list(section.points[4:, 2]) == [-5., -6., -6.]
+        with pytest.raises(ValueError):
+            model.section("W", 0)
+
+    def test_markers_on_a_y_move(self):
+        model = GcodeParser().parseCode(["T0101", "G0X20Y0Z1", "G1X10Y6Z-1", "G1Z-4"])
+        model.postProcess()
+        section = model.section("Z", 0)
+        # the feed move, after the rapid from the tool start point
+        assert tuple(section.points[-1]) == (15., 3., 0.)
+        # drawn like the toolpath: X and Y both halved
+        assert tuple(section.vertices()[-1]) == (7.5, 1.5, 0.)
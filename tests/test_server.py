@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+import urllib.error
+import pytest
+import src.server
+from src.server import ModelCache, QueryServer, summary, tools
+
+PROGRAM = ["T100\n", "G0X10.Z1.\n", "G1Z-5.\n", "G0X20.\n", "T2100\n", "G0X0.Z1.\n", "G1Z-3.\n"]
+
+@pytest.fixture
+def program(tmp_path):
+    path = tmp_path / "part.prg"
+    path.write_text("".join(PROGRAM))
+    return str(path)
+
+class Test_model_cache:
+    def test_hits_and_lru(self, tmp_path, program):
+        cache = ModelCache(size=2)
+        entry = cache.get(program)
+        assert cache.get(program) is entry
+        assert (cache.hits, cache.misses) == (1, 1)
+        others = []
+        for name in ("a.prg", "b.prg"):
+            path = tmp_path / name
+            path.write_text("".join(PROGRAM))
+            others.append(cache.get(str(path)))
+        assert len(cache.entries) == 2
+        assert cache.get(program) is not entry
+
+    def test_changed_file_is_parsed_again(self, program):
+        cache = ModelCache()
+        entry = cache.get(program)
+        with open(program, "a") as f:
+            f.write("G1Z-4.\n")
+        os.utime(program, ns=(0, os.stat(program).st_mtime_ns + 1))
+        changed = cache.get(program)
+        assert changed is not entry
+        assert changed.model.columns.count == entry.model.columns.count + 1
+        assert len(cache.entries) == 1
+
+    def test_concurrent_requests_parse_once(self, program, monkeypatch):
+        parses = []
+        class SlowModel(src.server.CachedModel):
+            def __init__(self, path):
+                parses.append(path)
+                time.sleep(.2)
+                super().__init__(path)
+        monkeypatch.setattr(src.server, "CachedModel", SlowModel)
+        cache = ModelCache()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(program))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(parses) == 1
+        assert len(results) == 4 and all(entry is results[0] for entry in results)
+        assert (cache.hits, cache.misses) == (3, 1) and cache.pending == {}
+
+class Test_queries:
+    def test_tools(self, program):
+        model = ModelCache().get(program).model
+        result = {t["tool"]: t for t in tools(model)}
+        assert result["T1"]["segments"] == 3
+        assert result["T1"]["cutting"] == pytest.approx(6)
+        assert result["T21"]["cutting"] == pytest.approx(4)
+        # no feedrate programmed: only the rapid counts
+        assert result["T21"]["time"] == pytest.approx(60. * 1.5 / 32000)
+        assert summary(model)["segments"] == 5
+
+class Test_server:
+    @pytest.fixture
+    def server(self):
+        server = QueryServer(("127.0.0.1", 0), ModelCache())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield "http://127.0.0.1:%d" % server.server_address[1]
+        server.shutdown()
+        server.server_close()
+
+    def get(self, url):
+        with urllib.request.urlopen(url) as response:
+            return json.loads(response.read())
+
+    def test_queries(self, server, program):
+        assert self.get(server + "/summary?path=" + program)["layers"] == 2
+        located = self.get(server + "/locate?path=%s&x=10&z=-2" % program)
+        assert (located["lineNb"], located["distance"]) == (3, 0)
+        assert [s["lineNb"] for s in self.get(server + "/line?path=%s&line=7" % program)["segments"]] == [7]
+        assert self.get(server + "/stats")["hits"] == 2
+        found = self.get(server + "/search?path=%s&q=G1%%20Z%%3C-4" % program)
+        assert (found["lines"], found["count"]["segments"]) == ([3], 1)
+
+    def test_errors(self, server):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            self.get(server + "/summary")
+        assert e.value.code == 400
+        with pytest.raises(urllib.error.HTTPError) as e:
+            self.get(server + "/unknown")
+        assert e.value.code == 404
+
+    def test_bad_search(self, server, program):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            self.get(server + "/search?path=%s&q=WHILE" % program)
+        assert e.value.code == 400
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.stock import DRILL_RADIUS, Stock, StockSimulation
+
+class Test_stock:
+    def test_turning_pass(self):
+        stock = Stock(20, -10, 0, dz=1)
+        # X is a diameter: turn down to 16 from Z-2 to Z-6
+        stock.cut([[16, 0, -2]], [[16, 0, -6]])
+        assert (stock.outer * 2).tolist() == pytest.approx([20, 20, 20, 20, 16, 16, 16, 16, 20, 20])
+
+    def test_plunge_reaches_closest_point_to_axis(self):
+        stock = Stock(20, -10, 0, dz=1)
+        stock.cut([[20, 0, -4.5]], [[6, 0, -4.5]])
+        assert stock.outer[5] * 2 == pytest.approx(6)
+        # a move in Y passes the axis closer than either end point
+        stock.cut([[8, -5, -0.5]], [[8, 5, -0.5]])
+        assert stock.outer[9] == pytest.approx(4)
+
+    def test_axial_tool_bores(self):
+        stock = Stock(20, -10, 0, dz=1, tool_radii={21: 2.5})
+        stock.cut([[0, 0, 1]], [[0, 0, -3]], tools=[21])
+        assert stock.inner.tolist() == [0, 0, 0, 0, 0, 0, 0, 2.5, 2.5, 2.5]
+        assert stock.outer.max() == 10
+
+    def test_moves_along_the_axis_drill(self):
+        stock = Stock(20, -10, 0, dz=1)
+        # no tool radius known: a drill of the default radius, not a turning tool down to 0
+        stock.cut([[0, 0, 1]], [[0, 0, -3]], tools=[21])
+        assert stock.outer.min() == 10
+        assert stock.inner.tolist() == [0] * 7 + [DRILL_RADIUS] * 3
+
+    def test_bar_includes_the_start_of_the_first_cut(self):
+        model = GcodeParser().parseCode(["T100", "G0X22.Z1.", "G1X16.Z1.", "G1Z-10.", "G0X22."])
+        model.postProcess()
+        stock = Stock.fromModel(model, 20)
+        assert (stock.zmin, stock.zmax) == pytest.approx((-10, 1))
+
+    def test_mesh_indices_are_valid(self):
+        stock = Stock(20, -10, 0, dz=1)
+        stock.cut([[0, 0, -5.5]], [[30, 0, -5.5]])
+        vertices, shades, triangles = stock.mesh(sectors=8)
+        assert len(vertices) == len(shades)
+        assert triangles.max() < len(vertices)
+        # parted off in the middle: two tubes with two ends each
+        assert len(triangles) == 3 * 2 * 8 * (4 + 3 + 4)
+
+class Test_stock_simulation:
+    def test_seek_forward_and_back(self):
+        lines = ["T100", "G0X22.Z1."]
+        for k in range(10):
+            lines += ["G1X%d.Z0." % (20 - k), "G1Z-10.", "G0X22.", "G0Z1."]
+        model = GcodeParser().parseCode(lines)
+        model.postProcess()
+        simulation = StockSimulation(model, Stock.fromModel(model, 20, dz=1), checkpoint=8)
+        simulation.seek(model.columns.count)
+        assert simulation.stock.outer.max() * 2 == pytest.approx(11)
+        # back to the end of the third pass
+        simulation.seek(1 + 3*4)
+        assert simulation.stock.outer.max() * 2 == pytest.approx(18)
+        simulation.seek(model.columns.count)
+        assert simulation.stock.outer.max() * 2 == pytest.approx(11)
+
+    def test_turned_and_drilled_part(self):
+        model = GcodeParser().parseCode(["T100", "G0X22.Z1.", "G1X16.Z1.", "G1Z-10.", "G0X22.",
+                                         "T2100", "G0X0Z1.", "G1Z-8.", "G0Z1."])
+        model.postProcess()
+        simulation = StockSimulation(model, Stock.fromModel(model, 20, dz=1, tool_radii={21: 2.5}))
+        simulation.seek(model.columns.count)
+        # Z-10..1: turned down to 16 all along, drilled from Z-8 up
+        assert simulation.stock.outer.tolist() == [8.] * 11
+        assert simulation.stock.inner.tolist() == [0., 0.] + [2.5] * 9
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from src.gcodeParser import GcodeParser
+from src.toolfilter import ToolFilter
+
+# gang, back and sub tools, T1 twice
+PROGRAM = ["G0X10Z0", "T0101", "G1X8Z-1", "G1X8Z-2", "T3131", "G1X6Z-1", "T0202", "G1X4Z-3",
+           "T0101", "G1X2Z-1", "T3232", "G1X1Z-2", "T2121", "G1X0Z-4"]
+
+@pytest.fixture
+def tools():
+    model = GcodeParser().parseCode(PROGRAM)
+    model.postProcess()
+    return ToolFilter(model)
+
+class Test_toolfilter:
+    def test_tools_have_their_layer_ranges(self, tools):
+        assert tools.tools == ["T1", "T2", "T21", "T31", "T32", None]
+        assert [i for i, first, last in tools.ranges["T1"]] == [1, 4]
+        for ranges in tools.ranges.values():
+            for i, first, last in ranges:
+                layer = tools.model.layers[i]
+                assert (first, last) == (layer.first, layer.first + layer.count)
+        assert tools.visible.all()
+
+    def test_names_ranges_and_groups(self, tools):
+        assert tools.select("T31-T34") == ["T31", "T32"]
+        assert tools.select("back, t1") == ["T31", "T32", "T1"]
+        assert tools.select("gang,T2") == ["T1", "T2"]
+        assert tools.select("-") == [None]
+        assert tools.select("Sub") == ["T21"] and tools.select("T11-T20") == []
+        assert len(tools.select("all")) == 6
+        with pytest.raises(ValueError):
+            tools.select("T9")
+
+    def test_toggling_changes_only_the_layers_drawn(self, tools):
+        tools.toggle("T1")
+        assert list(np.flatnonzero(~tools.visible)) == [1, 4]
+        # a group partly hidden is shown first
+        tools.toggle("gang")
+        assert tools.visible.all()
+        tools.toggle("gang")
+        assert list(np.flatnonzero(~tools.visible)) == [1, 3, 4]
+        tools.show("T1,T2")
+        assert tools.visible.all()
+        tools.only("back")
+        assert [tools.model.layers[i].tool for i in np.flatnonzero(tools.visible)] == ["T31", "T32"]
+        assert "hidden: T1 T2 T21 -" in tools.summary()
+        tools.show_all()
+        assert tools.visible.all()
+
+    def test_visible_ranges_merge(self, tools):
+        tools.hide("T32")
+        layers = tools.model.layers
+        assert tools.visible_ranges() == [(0, layers[5].first), (layers[6].first, layers[6].first + layers[6].count)]
+
+    def test_hidden_tools_survive_a_reload(self, tools):
+        tools.hide("T31,T2")
+        reloaded = ToolFilter(tools.model, tools.hidden | {"T7"})
+        assert reloaded.hidden == {"T31", "T2"}
+        assert list(reloaded.visible) == list(tools.visible)
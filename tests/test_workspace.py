@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from src.channels import ChannelProgram
+from src.workspace import ParseCache, Workspace
+
+MAIN = ["$1", "T100", "G1X10.Z0.", "G1Z-5.", "!2L1", "G1X12.", "$2", "T3100", "G1X4.Z-1.", "!1L1", "G1Z-2."]
+# the same back-spindle channel, behind another main channel of the same length
+OTHER = ["$1", "T200", "G1X8.Z0.", "G1Z-3.", "!2L1", "G1X9."] + MAIN[6:]
+
+class Test_workspace:
+    def test_cache_keys(self):
+        lines = ["G1X1.", "G1Z2."]
+        key = ParseCache.key(lines, [1, 2])
+        assert key == ParseCache.key(list(lines), [1, 2])
+        assert key != ParseCache.key(lines, [2, 3])
+        assert key != ParseCache.key(lines, [1, 2], {"keep_lines": False})
+        assert key != ParseCache.key(["G1X1.G1Z2."], [1, 2])
+
+    def test_claims_and_eviction(self):
+        cache = ParseCache(2)
+        future, owner = cache.claim("a")
+        assert owner
+        again, owner = cache.claim("a")
+        assert again is future and not owner
+        cache.claim("b")
+        cache.claim("c")
+        assert list(cache.entries) == ["b", "c"]
+        cache.discard("b")
+        assert cache.stats() == {"cached": 1, "hits": 1, "misses": 3}
+
+    def test_channels_are_shared_between_programs(self):
+        with Workspace(workers=1) as workspace:
+            main = workspace.program(MAIN)
+            other = workspace.program(OTHER)
+            assert workspace.cache.hits == 1 and workspace.cache.misses == 3
+            assert other.models[2] is main.models[2]
+            again = workspace.program(MAIN)
+            assert again.models == main.models
+            assert again.timeline.duration == main.timeline.duration
+
+    def test_programs_open_together(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("src.channels.PARALLEL_MIN_LINES", 0)
+        paths = []
+        for name, code in (("main.prg", MAIN), ("other.prg", OTHER)):
+            paths.append(str(tmp_path / name))
+            with open(paths[-1], "w") as f:
+                f.write("\n".join(code) + "\n")
+        with Workspace(workers=2) as workspace:
+            programs = [future.result() for future in [workspace.open(path) for path in paths]]
+            merged, alone = programs[0].merged(), ChannelProgram(MAIN, parallel=False).merged()
+            assert merged.columns.count == alone.columns.count
+            assert (merged.columns.coords[:merged.columns.count] == alone.columns.coords[:alone.columns.count]).all()
+            assert workspace.cache.misses == 3
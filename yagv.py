@@ -1,39 +1,50 @@
 #!/usr/bin/env python
 
-YAGV_VERSION = "0.7.0"        # -- check Makefile and setup.py too
+# Command line entry point. Options are parsed before anything heavy is
+# imported: --help needs neither numpy nor pyglet, --export only the core, and
+# pyglet is loaded together with src.viewer right before the window opens.
 
-import pyglet
-import math
-
-# Disable error checking for increased performance
-pyglet.options['debug_gl'] = False
-
-from pyglet import clock
-from pyglet.gl import *
-from pyglet.window import key
-from pyglet.window import mouse
-
-from src.gcodeParser import *
+import re
+import sys
 import os.path
-import time
 
-colorMap = {
-	# Misc:
-	"background": [ 1,1,1, 1. ],
-	"grid": [ .2,.2,.2, 1. ],
-	"text": [ 0,0,0, 1. ],
+from src import YAGV_VERSION
 
-   # Gcode:
-	"extrude": [ 0.,.8,0. ],
-	"extrude_active": [ .8,0.,0. ],
-	"extrude_wall": [ .2,.9,0. ],
-	"extrude_wall_active": [ .8,.5,0. ],
-	"extrude_support": [ .8,.8,0. ],
-	"extrude_support_active": [ 1,.9,0. ],
-	"retract": [ .8,.8,0. ],
-	"unretract": [ .8,0.,.8 ],
-	"motion": [ 0.,0.,1. ]
-}
+USAGE = """USAGE yagv %s: [<opts>] file.gcode [more.gcode ...]
+       yagv %s serve [--port=<n>|--socket=<path>] [--cache=<n>]
+   options:
+      --help               display this message
+      --dark               enable dark mode
+      --bed-size=<w>x<h>   set bed size (e.g. 200x240)
+      --diff=<old.gcode>   show what changed since an older revision
+      --export=<file>      write the toolpath to .scr (AutoCAD script), .ybin or .glb and exit
+      --cycle-time         print the estimated cycle time per channel, tool layer and tool and exit
+      --machine=<file>     machine profile (JSON): rapid rates per axis in mm/min, max_rpm,
+                           tool_radii of the drills for --stock, e.g. {"T21": 2.5},
+                           guide_bushing [diameter, Z of its face] for --clearance
+      --gpu-budget=<MB>    video memory for layer buffers (default 512)
+      --clearance=<mm>     highlight rapids closer than this to the cutting moves, the bar
+                           behind the part (with --stock) and the guide bushing (--machine)
+      --tools=<list>       show only these tools, e.g. T1,T31-T34 or gang/sub/back;
+                           1-9 and T toggle tools in the viewer
+      --section[=<plane>]  cut the toolpaths at a plane, e.g. Z-2.5 or X12 (a diameter);
+                           C switches Z/X/off, [ and ] or Ctrl-drag move it
+      --stock[=<diameter>] simulate the turned part, Left/Right replay it
+      --memory-profile     report memory per load stage and per data structure
+      --memory-budget=<MB> use cheaper representations for programs that would not fit
+      --out-of-core[=<dir>] keep segments & vertex buffers in memory-mapped files in <dir>
+                           (default: the temp directory), for programs larger than RAM
+      --fixed-point[=<n>]  store coordinates as int32 in 1/n mm machine units (default 10000),
+                           exact and half the memory of float64
+      --compact[=<mm>]     draw collinear runs as one line and skip zero-length moves,
+                           within <mm> (default 0.001)
+      --playback[=<n/s>]   play the program back at n segments per second (default 100),
+                           Space pauses, +/- change the speed, PgUp/PgDn seek
+      --frame-times        show CPU/GPU frame times in the corner
+      --benchmark[=<n>]    draw n frames (default 300) of a scripted orbit, zoom & layer sweep,
+                           report frame-time percentiles and exit
+      --benchmark-out=<file> also write the benchmark results as JSON
+"""
 
 def preg_match(rex,s,m,opts={}):
 	_m = re.search(rex,s)
@@ -43,658 +54,69 @@ def preg_match(rex,s,m,opts={}):
 		m.extend(_m.groups())
 		return True
 	return False
-                              
-class App:
-	def __init__(self):
-		self.RX = 0.0
-		self.RZ = 0.0
-		self.PX = 0.0
-		self.PY = 0.0
-		self.zoom = 1.0
-		self.conf = { }
-		self.conf['bed_size'] = [ 200, 200 ]
-		self.focus_segment = 0
-		self.focus_text = ""
-		self.focus_vertices = []
-		self.layerIdx = 0
-	
-	def main(self):
-		
-		#### MAIN CODE ####
-		import sys
-
-		path = ''
-
-		i = 1
-		while(i<len(sys.argv)):
-			m = [ ]
-			if preg_match('^--([\w\-]+)=(.*)$',sys.argv[i],m):
-				m[1] = m[1].replace('-','_')
-				self.conf[m[1]] = m[2]
-			elif preg_match('^--([\w\-]+)$',sys.argv[i],m):
-				m[1] = m[1].replace('-','_')
-				self.conf[m[1]] = 1
-			else:
-		 		path = sys.argv[i]
-			i += 1
-
-		if 'help' in self.conf and self.conf['help']:
-			print("""USAGE yagv %s: [<opts>] file.gcode
-   options:
-      --help               display this message
-      --dark               enable dark mode
-      --bed-size=<w>x<h>   set bed size (e.g. 200x240)
-""" % YAGV_VERSION)
-			sys.exit(0)
-		if 'dark' in self.conf and self.conf['dark']:
-			colorMap['background'] = [ 0,0,0, 1 ]
-			colorMap['grid'] = [ 1,1,1, 0.1 ]
-			colorMap['text'] = [ 1,1,1, 0.7 ]
-
-		if type(self.conf['bed_size'])==str:
-			self.conf['bed_size'] = list(map(lambda x: int(x),self.conf['bed_size'].split('x')))
-			print(self.conf['bed_size'])
-
-		if len(path)==0:
-			script_path = os.path.realpath(__file__)
-			script_dir = os.path.dirname(script_path)
-			path = os.path.join(script_dir, "data\\hana_swimsuit_fv_solid_v1.gcode")
-
-		print("Yet Another GCode Viewer v%s"%YAGV_VERSION)
-
-		self.path = "loading ..."
-
-		# -- create window soon, before loading ...
-		self.window = MyWindow(self, caption="Yet Another GCode Viewer v%s: %s" % (YAGV_VERSION,os.path.basename(path)), resizable=True, width=1024, height=768)
-		pyglet.gl.glClearColor(colorMap['background'][0],colorMap['background'][1],colorMap['background'][2],1)
-
-		# debug: log all events
-		# self.window.push_handlers(pyglet.window.event.WindowEventLogger())
-
-		self.load(path)
-
-		# default to the first layer
-		self.layerIdx = 0
-		self.window.hud()
-
-		#img = pyglet.resource.image("icon.png")
-		#img = pyglet.image.load("/usr/local/share/yagv/icon.png")
-		#self.window.set_icon(img)
-
-		pyglet.app.run()
-
-	def reload(self):
-		self.load(self.path)
-			
-	def load(self, path):
-		
-		print("loading file %s ..." % repr(path))
-		t1 = time.time()
-		
-		print("Parsing '%s'..." % path)
-		
-		self.path = path
-
-		parser = GcodeParser()
-		code = parser.file_to_lines_array(path)
-		model = parser.parseCode(code)
-		model.postProcess()
-		self.model = model
-
-		print("Done! %s" % self.model)
-		
-		# render the model
-		print("rendering vertices...")
-		self.renderVertices()
-		print("rendering indexed colors...")
-		self.renderIndexedColors()
-		print("rendering true colors...")
-		self.renderColors()
-		print("generating graphics...")
-		self.generateGraphics()
-		print("Done")
-		
-		t2 = time.time()
-		print("loaded file in %0.3f ms" % ((t2-t1)*1000.0 ))
-	
-	def renderVertices(self):
-		t1 = time.time()
-		
-		self.vertices = []
-
-		for layer in self.model.layers:
-			
-			layer_vertices = []
-			
-			x = layer.start["X"]/2
-			y = layer.start["Y"]/2
-			z = layer.start["Z"]
-			for seg in layer.segments:
-				layer_vertices.append(x)
-				layer_vertices.append(y)
-				layer_vertices.append(z)
-				x = seg.coords["X"]/2
-				y = seg.coords["Y"]/2
-				z = seg.coords["Z"]
-				layer_vertices.append(x)
-				layer_vertices.append(y)
-				layer_vertices.append(z)
-
-			self.vertices.append(layer_vertices)
-			#layer.end['X'] = layer_vertices[:3]
-			#layer.end['Y'] = layer_vertices[:2]
-			#layer.end['Z'] = layer_vertices[:1]
-			
-		t2 = time.time()
-		print("end renderVertices in %0.3f ms" % ((t2-t1)*1000.0, ))
-	
-	def renderIndexedColors(self):
-		t1 = time.time()
-		
-		# all the styles for all layers
-		self.vertex_indexed_colors = []
-		
-		# for all layers
-		for layer in self.model.layers:
-			
-			# index for this layer
-			layer_vertex_indexed_colors = []
-			for seg in layer.segments:
-				tool = seg.tool
-				styleCol = int(tool[1:])
-				# append color twice (once per end)
-				layer_vertex_indexed_colors.extend((styleCol, styleCol))
-		
-			# append layer to all layers
-			self.vertex_indexed_colors.append(layer_vertex_indexed_colors)
-		t2 = time.time()
-		print("end renderIndexedColors in %0.3f ms" % ((t2-t1)*1000.0, ))
-	
-	def renderColors(self):
-		t1 = time.time()
-		
-		self.vertex_colors = [[],[],[]]
-		
-		# render color index to real colors
-		cm = [ 
-			# 0: old layer
-			[ colorMap['extrude'].copy(),        colorMap['motion'].copy(), colorMap['retract'].copy(), colorMap['unretract'].copy(), colorMap['extrude_wall'].copy(), colorMap['extrude_support'].copy() ],
-			# 1: current layer
-			[ colorMap['extrude_active'].copy(), colorMap['motion'].copy(), colorMap['retract'].copy(), colorMap['unretract'].copy(), colorMap['extrude_wall_active'].copy(), colorMap['extrude_support_active'].copy() ],
-			# 2: limbo layer
-			[ colorMap['extrude'].copy(),        colorMap['motion'].copy(), colorMap['retract'].copy(), colorMap['unretract'].copy(), colorMap['extrude_wall'].copy(), colorMap['extrude_support'].copy() ]
-		]
-		for i in range(6):         # -- add per type the alpha
-			cm[0][i].append(.2 if i==1 or i==5 else .7)    # -- old
-			cm[1][i].append(.2 if i==1 else 1.)    # -- current
-			cm[2][i].append(.1)    # -- limbo
-		
-		# for all 3 types
-		for display_type in range(3):
-			
-			#type_color_map = cm[display_type]
-
-			# -- cumbersome float -> int color
-			type_color_map = []
-			n = 0
-			for c in cm[display_type]:
-				type_color_map.append([])
-				for i in range(4):
-					type_color_map[n].append(int(c[i]*255))
-				n += 1
-
-			# for all preindexed layer colors
-			for indexes in self.vertex_indexed_colors:
-				
-				# render color indexes to colors
-				colors = list(map(lambda e: type_color_map[e], indexes))
-				# flatten color values
-				fcolors = []
-				list(map(fcolors.extend, colors))
-				
-				# push colors to vertex list
-				self.vertex_colors[display_type].append(fcolors)
-				
-		t2 = time.time()
-		print("end renderColors in %0.3f ms" % ((t2-t1)*1000.0, ))
-	
-	def generateGraphics(self):
-		t1 = time.time()
-		
-		self.graphics_old = []
-		self.graphics_current = []
-		self.graphics_limbo = []
-		
-		for layer_idx in range(len(self.vertices)):
-			nb_layer_vertices = len(self.vertices[layer_idx])//3
-			vertex_list = pyglet.graphics.vertex_list(nb_layer_vertices,
-				('v3f/static', self.vertices[layer_idx]),
-				('c4B/static', self.vertex_colors[0][layer_idx])
-			)
-			self.graphics_old.append(vertex_list)
-			
-			vertex_list = pyglet.graphics.vertex_list(nb_layer_vertices,
-				('v3f/static', self.vertices[layer_idx]),
-				('c4B/static', self.vertex_colors[1][layer_idx])
-			)
-			self.graphics_current.append(vertex_list)
-			
-			vertex_list = pyglet.graphics.vertex_list(nb_layer_vertices,
-				('v3f/static', self.vertices[layer_idx]),
-				('c4B/static', self.vertex_colors[2][layer_idx])
-			)
-			self.graphics_limbo.append(vertex_list)
-		#	print(nb_layer_vertices, len(self.vertices[layer_idx]), len(self.colors[0][layer_idx]))
-		
-		self.set_focus_segment()
-
-		t2 = time.time()
-		print("end generateGraphics in %0.3f ms" % ((t2-t1)*1000.0, ))
-	
-
-	def set_focus_segment(self):
-		# print(self.layerIdx, self.focus_segment)
-		segment = self.model.layers[self.layerIdx].segments[self.focus_segment]
-		self.focus_text = segment.line
-		start_coord = segment.inLayerIdx*6
-		end_coord = start_coord + 6
-		focus_vertices = self.vertices[self.layerIdx][start_coord:end_coord]
-		focus_colors = [0,0,0,255,0,0,0,255]
-		self.focus_vertices = pyglet.graphics.vertex_list(2,
-				('v3f/static', focus_vertices),
-				('c4B/static', focus_colors)
-			)
-
-
-	# -- rotate		
-	def rotate_drag_start(self, x, y, button, modifiers):
-		self.rotateDragStartRX = self.RX
-		self.rotateDragStartRZ = self.RZ
-		self.rotateDragStartX = x
-		self.rotateDragStartY = y
-
-	def rotate_drag_do(self, x, y, dx, dy, buttons, modifiers):
-		# deltas
-		deltaX = x - self.rotateDragStartX
-		deltaY = y - self.rotateDragStartY
-		# rotate!
-		self.RZ = self.rotateDragStartRZ + deltaX/5.0 # mouse X bound to model Z
-		self.RX = self.rotateDragStartRX + deltaY/5.0 # mouse Y bound to model X
-
-	def rotate_drag_end(self, x, y, button, modifiers):
-		self.rotateDragStartRX = None
-		self.rotateDragStartRZ = None
-		self.rotateDragStartX = None
-		self.rotateDragStartY = None
-
-	def layer_drag_start(self, x, y, button, modifiers):
-		self.layerDragStartLayer = self.layerIdx
-		self.layerDragStartX = x
-		self.layerDragStartY = y
 
-	def layer_drag_do(self, x, y, dx, dy, buttons, modifiers):
-		# sum x & y
-		delta = x - self.layerDragStartX + y - self.layerDragStartY
-		# new theoretical layer
-		self.layerIdx = int(self.layerDragStartLayer + delta//5)
-		# clamp layer to 0-max
-		self.layerIdx = max(min(self.layerIdx, self.model.topLayer), 0)
-		self.layer_update()
-		
-	#	# clamp layer to 0-max, with origin slip
-	#	if (self.layerIdx < 0):
-	#		self.layerIdx = 0
-	#		self.layerDragStartLayer = 0
-	#		self.layerDragStartX = x
-	#		self.layerDragStartY = y
-	#	if (self.layerIdx > len(self.model.layers)-1):
-	#		self.layerIdx = len(self.model.layers)-1
-	#		self.layerDragStartLayer = len(self.model.layers)-1
-	#		self.layerDragStartX = x
-	#		self.layerDragStartY = y
-
-	# -- layer select		
-	def layer_update(self):
-		#self.window.layerLabel.text = "layer %d (z=%.2f)" % (self.layerIdx,self.model.layers[self.layerIdx].start['Z'])
-		if self.model.layers[self.layerIdx].bbox.zmin != self.model.layers[self.layerIdx].bbox.zmax:
-			self.window.layerLabel.text = "layer %d (%s..%s)" % (self.layerIdx,self.model.layers[self.layerIdx].tool,self.model.layers[self.layerIdx].tool)
+def parse_args(argv):
+	"""Splits the command line into a conf dict ('--bed-size=..' -> conf['bed_size']) and the file paths."""
+	conf = { }
+	paths = []
+	for arg in argv:
+		m = [ ]
+		if preg_match(r'^--([\w\-]+)=(.*)$',arg,m):
+			conf[m[1].replace('-','_')] = m[2]
+		elif preg_match(r'^--([\w\-]+)$',arg,m):
+			conf[m[1].replace('-','_')] = 1
 		else:
-			self.window.layerLabel.text = "layer %d (%s)" % (self.layerIdx,self.model.layers[self.layerIdx].tool)
-		self.focus_segment = 0
-		self.set_focus_segment()
-		#print(self.model.layers[self.layerIdx].bbox.zmin)
-
-	def layer_up(self):
-		self.layerIdx = max(min(self.layerIdx+1, self.model.topLayer), 0)
-		self.layer_update()
-
-	def layer_down(self):
-		self.layerIdx = max(min(self.layerIdx-1, self.model.topLayer), 0)
-		self.layer_update()
-
-	def layer_bottom(self):
-		self.layerIdx = min(1, self.model.topLayer)
-		self.layer_update()
-
-	def layer_top(self):
-		self.layerIdx = self.model.topLayer
-		self.layer_update()
-
-	def layer_drag_end(self, x, y, button, modifiers):
-		self.layerDragStartLayer = None
-		self.layerDragStartX = None
-		self.layerDragStartY = None
-
-	def focus_up(self):
-		self.focus_segment= max(min(self.focus_segment+1, len(self.model.layers[self.layerIdx].segments)-1), 0)	
-		self.set_focus_segment()
-
-	def focus_down(self):
-		self.focus_segment = max(min(self.focus_segment-1, len(self.model.layers[self.layerIdx].segments)-1), 0)
-		self.set_focus_segment()
-
-	# -- panning
-	def panning_start(self, x, y, button, modifiers):
-		self.panningStartPX = self.PX
-		self.panningStartPY = self.PY
-		self.panningStartX = x
-		self.panningStartY = y
-
-	def panning_do(self, x, y, dx, dy, buttons, modifiers):
-		# deltas
-		#deltaX = x - self.panningStartX
-		#deltaY = y - self.panningStartY
-		# -- panning done with proper rotation
-		deltaX = math.cos(-self.RZ/180*math.pi) * (x - self.panningStartX) + math.sin(self.RZ/180*math.pi) * (y - self.panningStartY)
-		deltaY = math.sin(-self.RZ/180*math.pi) * (x - self.panningStartX) + math.cos(self.RZ/180*math.pi) * (y - self.panningStartY)
-		# pan!
-		f = 5
-		self.PX = self.panningStartPX + deltaX/f # mouse X bound to model X
-		self.PY = self.panningStartPY + deltaY/f # mouse Y bound to model Y
-
-	def panning_end(self, x, y, button, modifiers):
-		self.panningStartX = None
-		self.panningStartY = None
-
-
-def glLine(p1,p2,c):
-	glBegin(GL_LINES)
-	glColor4f(c[0],c[1],c[2],c[3])
-	glVertex3f(p1[0],p1[1],p1[2])
-	glVertex3f(p2[0],p2[1],p2[2])
-	glEnd()
-	
-class MyWindow(pyglet.window.Window):
-
-	# constructor
-	def __init__(self, app, **kwargs):
-		pyglet.window.Window.__init__(self, **kwargs)
-		self.app = app
-		#self.hud()
-	
-	# hud info
-	def hud(self):
-		
-		# HUD labels
-		self.blLabels = []
-		self.brLabels = []
-		self.tlLabels = []
-		self.trLabels = []
-
-		c_texti = list(map(lambda x: int(x*255), colorMap['text']))
-		#self.brLabels.append(pyglet.text.Label("yagv "+YAGV_VERSION,font_size=10,color=c_texti,anchor_x='right', anchor_y='bottom'))
-      
-		# help
-		self.helpText = [
-						"Left-mouse: rotate | Middle: change layer, Scroll: zoom | Right: panning   Ctrl-R: reload"]
-		for txt in self.helpText:
-			self.blLabels.append(
-				pyglet.text.Label(	txt,
-									font_size=10,color=c_texti) )
-
-		# statistics
-		## model stats
-		self.statsLabel = pyglet.text.Label(	"",
-										font_size=10,color=c_texti,
-										anchor_y='top')
-		filename = os.path.basename(self.app.path)
-		self.statsLabel.text = "%s: %d layers (%d segments)" % (filename, len(self.app.model.layers), len(self.app.model.segments))
-		
-		## fps counter
-		self.fpsLabel = pyglet.text.Label(	"",
-										font_size=10,color=c_texti,
-										anchor_y='top')
-		self.tlLabels.append(self.statsLabel)
-		self.tlLabels.append(self.fpsLabel)
-
-		# status
-		## current Layer
-		self.layerLabel = pyglet.text.Label(	"layer %d (%s)" % (
-			self.app.layerIdx,
-			self.app.model.layers[self.app.layerIdx].tool,
-			#self.app.model.layers[self.app.layerIdx].end['Z']
-			#self.app.model.layers[self.app.layerIdx].bbox.zmin,
-			#self.app.model.layers[self.app.layerIdx].bbox.zmax
-			), font_size=10,color=c_texti,anchor_x='right', anchor_y='top')
-		self.trLabels.append(self.layerLabel)
-
-		# layout the labels in the window's corners
-		self.placeLabels(self.width, self.height)
-	
-	
-	# events
-	def on_resize(self, width, height):
-		glViewport(0, 0, width, height)
-		self.placeLabels(width, height)
-		#self.render(width, height)
-		
-		return pyglet.event.EVENT_HANDLED
-
-	def on_mouse_press(self, x, y, button, modifiers):
-		#print("on_mouse_press(x=%d, y=%d, button=%s, modifiers=%s)"%(x, y, button, modifiers))
-		if button & mouse.LEFT:
-			self.app.rotate_drag_start(x, y, button, modifiers)
-			
-		if button & mouse.MIDDLE:
-			self.app.layer_drag_start(x, y, button, modifiers)
-
-		if button & mouse.RIGHT:
-			self.app.panning_start(x, y, button, modifiers)
-
-
-	def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
-		#print("on_mouse_drag(x=%d, y=%d, dx=%d, dy=%d, buttons=%s, modifiers=%s)"%(x, y, dx, dy, buttons, modifiers))
-		if buttons & mouse.LEFT:
-			self.app.rotate_drag_do(x, y, dx, dy, buttons, modifiers)
-			
-		if buttons & mouse.MIDDLE:
-			self.app.layer_drag_do(x, y, dx, dy, buttons, modifiers)
-
-		if buttons & mouse.RIGHT:
-			self.app.panning_do(x, y, dx, dy, buttons, modifiers)
-
-
-	def on_mouse_release(self, x, y, button, modifiers):
-		#print("on_mouse_release(x=%d, y=%d, button=%s, modifiers=%s)"%(x, y, button, modifiers))
-		if button & mouse.LEFT:
-			self.app.rotate_drag_end(x, y, button, modifiers)
-			
-		if button & mouse.MIDDLE:
-			self.app.layer_drag_end(x, y, button, modifiers)
-
-		if button & mouse.RIGHT:
-			self.app.panning_end(x, y, button, modifiers)
-
-	def on_key_release(self, symbol, modifiers):
-		#print("pressed key: %s, mod: %s"%(symbol, modifiers))
-		#print("pressed key: %s, mod: %s"%(pyglet.window.key.R, pyglet.window.key.MOD_CTRL))
-
-		if symbol==pyglet.window.key.R and modifiers & pyglet.window.key.MOD_CTRL:
-			self.app.reload()
-		elif symbol==pyglet.window.key.UP:
-			self.app.layer_up()
-		elif symbol==pyglet.window.key.DOWN:
-			self.app.layer_down()
-		elif symbol==pyglet.window.key.HOME:
-			self.app.layer_bottom()
-		elif symbol==pyglet.window.key.END:
-			self.app.layer_top()
-		elif symbol==pyglet.window.key.W:
-			self.app.focus_up()
-		elif symbol==pyglet.window.key.S:
-			self.app.focus_down()
-		else:
-			print("pressed key: %s, mod: %s"%(symbol, modifiers))
-		
-	def placeLabels(self, width, height):
-		x = 5
-		y = 5
-		for label in self.blLabels:
-			label.x = x
-			label.y = y
-			y += 20
-			
-		x = width - 5
-		y = 5
-		for label in self.brLabels:
-			label.x = x
-			label.y = y
-			y += 20
-			
-		x = 5
-		y = height - 5
-		for label in self.tlLabels:
-			label.x = x
-			label.y = y
-			y -= 20
-			
-		x = width - 5
-		y = height - 5
-		for label in self.trLabels:
-			label.x = x
-			label.y = y
-			y -= 20
-
-
-	def on_mouse_scroll(self, x, y, dx, dy):
-		# zoom on mouse scroll
-		delta = dx + dy
-		if delta == 0:
-			return
-		z = 1.2 if delta>0 else 1/1.2
-		self.app.zoom = max(1.0, self.app.zoom * z)
-		#print('mouse scroll:', `x, y, dx, dy`, `z, self.app.zoom`)
-
-	def on_draw(self):
-		#print("draw")
-		
-		# Clear buffers
-		glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-		
-		# setup projection
-		glMatrixMode(GL_PROJECTION)
-		glLoadIdentity()
-		gluPerspective(65, self.width / float(self.height), 0.1, 1000)
-		
-		# setup camera
-		glMatrixMode(GL_MODELVIEW)
-		glLoadIdentity()
-		gluLookAt(0,1.5,2,0,0,0,0,1,0)
-		
-		# enable alpha blending
-		glEnable(GL_BLEND)
-		glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-		
-		# rotate axes to match machine
-		glRotated(90, 0,0,1)
-		glRotated(90, 1,0,0)
-		
-		# user rotate model
-		glRotated(-self.app.RX, 1,0,0)
-		glRotated(self.app.RZ, 0,0,1)
-		#print(self.app.RX, self.app.RZ)
-		# Todo check this
-		glTranslated(0,0,-0.5)
-		
-		# fit & user zoom model
-		max_width = max(
-			self.app.model.bbox.dx(),
-			self.app.model.bbox.dy(),
-			self.app.model.bbox.dz()
-		)
-		scale = self.app.zoom / max_width
-		glScaled(scale, scale, scale)
-		
-		# user pan model
-		glTranslated(self.app.PX,self.app.PY,0)
-
-		glTranslated(-self.app.model.bbox.cx(), -self.app.model.bbox.cy(), -self.app.model.bbox.cz())
-		
-		# draw axes
-		glLineWidth(1)
-		glBegin(GL_LINES)
-		glColor3f(1,0,0)
-		glVertex3f(0,0,0); glVertex3f(1,0,0); glVertex3f(1,0,0); glVertex3f(1,0.1,0)
-		glVertex3f(1,0,0); glVertex3f(self.app.model.bbox.xmax,0,0)
-		glColor3f(0,1,0)
-		glVertex3f(0,0,0); glVertex3f(0,1,0); glVertex3f(0,1,0); glVertex3f(0,1,0.1)
-		glVertex3f(0,1,0); glVertex3f(0,self.app.model.bbox.ymax,0)
-		glColor3f(0,0,1)
-		glVertex3f(0,0,0); glVertex3f(0,0,1); glVertex3f(0,0,1); glVertex3f(0.1,0,1)
-		glVertex3f(0,0,1); glVertex3f(0,0,self.app.model.bbox.zmax)
-		glEnd()
-		
-		# # draw bed grid
-		# for y in range(0,self.app.conf['bed_size'][1]+1):
-		# 	glLine([0,y,0],[self.app.conf['bed_size'][0],y,0],[colorMap['grid'][0],colorMap['grid'][1],colorMap['grid'][2],0.3 if y%10 == 0 else 0.1])
-		# for x in range(0,self.app.conf['bed_size'][0]+1):
-		# 	glLine([x,0,0],[x,self.app.conf['bed_size'][1],0],[colorMap['grid'][0],colorMap['grid'][1],colorMap['grid'][2],0.3 if x%10 == 0 else 0.1])
-
-		# -- draw the model layers
-		#    lower layers
-		glLineWidth(2)
-		for graphic in self.app.graphics_old[0:self.app.layerIdx]:
-			graphic.draw(GL_LINES)
-		
-		#    highlighted layer
-		glLineWidth(2)
-		graphic = self.app.graphics_current[self.app.layerIdx]
-		graphic.draw(GL_LINES)
-		
-		#    limbo layers
-		glLineWidth(2)
-		for graphic in self.app.graphics_limbo[self.app.layerIdx+1:]:
-			graphic.draw(GL_LINES)
-		
-		# Focus line
-		glLineWidth(4)
-		self.app.focus_vertices.draw(GL_LINES)
-
-		# disable depth for HUD
-		glDisable(GL_DEPTH_TEST)
-		glDepthMask(0)
-		
-		# Set your camera up for 2d, draw 2d scene
-		glMatrixMode(GL_PROJECTION)
-		glLoadIdentity();
-		glOrtho(0, self.width, 0, self.height, -1, 1)
-		glMatrixMode(GL_MODELVIEW)
-		glLoadIdentity()
-		
-		self.fpsLabel.text = self.app.focus_text
-		
-		for label in self.blLabels:
-			label.draw()
-		for label in self.brLabels:
-			label.draw()
-		for label in self.tlLabels:
-			label.draw()
-		for label in self.trLabels:
-			label.draw()
-	
-
-		# reenable depth for next model display
-		glEnable(GL_DEPTH_TEST)
-		glDepthMask(1)
-
-App().main()
+			paths.append(arg)
+	return conf, paths
+
+def main(argv=None):
+	conf, paths = parse_args(sys.argv[1:] if argv is None else argv)
+	# the first program, the others open in tabs of the viewer
+	path = paths[0] if paths else ''
+
+	if 'help' in conf and conf['help']:
+		print(USAGE % (YAGV_VERSION, YAGV_VERSION))
+		sys.exit(0)
+
+	if path == 'serve':
+		# answer queries about programs kept parsed in memory
+		from src.server import serve
+		serve(conf)
+		return
+
+	if len(path)==0:
+		script_dir = os.path.dirname(os.path.realpath(__file__))
+		path = os.path.join(script_dir, "data", "hana_swimsuit_fv_solid_v1.gcode")
+
+	print("Yet Another GCode Viewer v%s"%YAGV_VERSION)
+
+	if 'export' in conf:
+		from src.gcodeParser import GcodeParser
+		from src.channels import ChannelProgram
+		from src.export import export_model
+		print("Parsing '%s'..." % path)
+		model = ChannelProgram(GcodeParser().file_to_lines_array(path)).merged()
+		model.diagnostics.report()
+		print("exporting to %s ..." % conf['export'])
+		export_model(model, conf['export'])
+		sys.exit(0)
+
+	if 'cycle_time' in conf:
+		from src.gcodeParser import GcodeParser
+		from src.channels import ChannelProgram
+		from src.cycletime import MachineProfile, clock
+		profile = MachineProfile.load(conf['machine']) if 'machine' in conf else None
+		print("Parsing '%s'..." % path)
+		program = ChannelProgram(GcodeParser().file_to_lines_array(path), profile=profile)
+		for ch, cycle in program.cycle_times().items():
+			print("$%d %s" % (ch, "\n   ".join(cycle.report())))
+		if any(model.feeds for model in program.models.values()):
+			# the channels wait for each other
+			print("program cycle time %s" % clock(program.timeline.duration))
+		sys.exit(0)
+
+	from src.viewer import App
+	App(conf).main(path, paths[1:])
+
+if __name__ == "__main__":
+	main()